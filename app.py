@@ -1,107 +1,266 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, Response, request, jsonify, send_from_directory, stream_with_context, url_for
+import json
 import os
 import pathlib
 import logging
-from datetime import datetime
-import frontmatter
-import win32com.client
-from config import BASE_DIR
+from werkzeug.exceptions import RequestEntityTooLarge
+import config
+import journal_api
+from calendar_provider import get_default_calendar
+from journal_api import ERROR_MESSAGES, HISTORY_STREAM_BATCH, HISTORY_SYNC_MAX_AGE, MAX_BODY_SIZE, encode_cursor, \
+    outlook_events, parse_calendar_args, parse_date_arg, parse_history_args, project_row, wants_ndjson
+from memory_cache import memory_cache
+from metadata_index import content_hash, get_index
+from http_cache import conditional_response, send_versioned_file, versioned_listing
+from obsidian_daily import FIELDS, calendar_payload
+import metrics
+import search_index
+import stats
+from vault_watcher import start_watcher
+from vault_layout import years_between
+from vaults import current_vault, load_registry, register_vault_blueprint
 
 app = Flask(__name__)
+# Same /save_diary body limit as asgi.py
+app.config["MAX_CONTENT_LENGTH"] = MAX_BODY_SIZE
 
 # Constants
 logging.basicConfig(level=logging.INFO)
 
-# Ensure the base directory exists
-BASE_DIR.mkdir(parents=True, exist_ok=True)
+# Request timings, stage spans and counters, exposed in Prometheus text format at /metrics.
+# Set METRICS_LOG = True in config.py to also log every span as one JSON line.
+metrics.instrument_app(app)
+if getattr(config, "METRICS_LOG", False):
+    metrics.enable_json_log()
 
-@app.route('/get_outlook', methods=['GET'])
+# Journals served by this process: config.BASE_DIR is the default vault at "/", and the optional
+# VAULTS = {"alice": pathlib.Path(...), ...} in config.py adds more, each under /v/<id>/.
+# Every vault keeps its own index, render cache and heatmaps inside its directory.
+vaults = load_registry(config)
+for _, vault_dir in vaults.items():
+    vault_dir.mkdir(parents=True, exist_ok=True)
+
+# Parsed entries, calendar payloads and heatmap matrices of all vaults share one LRU memory budget
+# (CACHE_BUDGET_MB in config.py); a single vault may use at most half of it.
+if getattr(config, "CACHE_BUDGET_MB", None):
+    memory_cache.configure(budget=config.CACHE_BUDGET_MB * 1024 * 1024)
+
+# Routes are registered on a blueprint that is mounted once per URL scheme (see vaults.py)
+journal = Blueprint("journal", __name__)
+
+# Shared calendar source: Outlook, or a local .ics file when CALENDAR_ICS is set in config.py.
+# The connection is reused across requests and results are cached per day.
+calendar = get_default_calendar(getattr(config, "CALENDAR_ICS", None))
+
+@journal.route('/get_outlook', methods=['GET'])
 def get_outlook():
-    try:
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        ns = outlook.GetNamespace("MAPI")
-        calendar = ns.GetDefaultFolder(9)  # olFolderCalendar
-        items = calendar.Items
-        items.IncludeRecurrences = True
-        items.Sort("[Start]")
-        today = datetime.now()
-        start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-        end = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        restr = f"[Start] >= '{start.strftime('%m/%d/%Y %I:%M %p')}' AND [Start] <= '{end.strftime('%m/%d/%Y %I:%M %p')}'"
-        restricted = items.Restrict(restr)
-        events = []
-        for item in restricted:
-            events.append({
-                "subject": item.Subject,
-                "start": item.Start.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": item.End.strftime('%Y-%m-%d %H:%M:%S')
-            })
-        return jsonify(events)
-    except Exception as e:
-        logging.error(f"Error fetching Outlook events: {e}")
-        return jsonify({"error": "Failed to fetch Outlook events."}), 500
+    # Without parameters returns today's events as a list. With from/to (YYYY-MM-DD) the whole
+    # range is fetched in one query and returned as {"YYYY-MM-DD": [events]} (see journal_api)
+    status, payload = outlook_events(calendar, request.args)
+    return jsonify(payload), status
 
-@app.route('/save_diary', methods=['POST'])
+@journal.route('/save_diary', methods=['POST'])
 def save_diary():
-    data = request.json
-    if not data:
-        return jsonify({"error": "No data provided."}), 400
-
     try:
-        today = datetime.now()
-        filename = BASE_DIR / f"{today.strftime('%Y%m%d')}.md"
-        if filename.exists():
-            return jsonify({"error": "Diary already exists."}), 409
-
-        # Build the diary content
-        meta = {
-            "Date": today.isoformat(),
-            "Location": data.get("location", "东涌镇,中国,广东省,广州市 南沙区"),
-            "Emotion": data.get("emotion"),
-            "Confidence": data.get("confidence"),
-            "Appetite": data.get("appetite")
-        }
-        body = "\n".join([
-            "## 今日日程",
-            "",
-            *[f"- {event['start']} - {event['end']}: {event['subject']}" for event in data.get("events", [])],
-            "",
-            "## 随笔",
-            "",
-            data.get("diary", "")
-        ])
-        post = frontmatter.Post(body, **meta)
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(frontmatter.dumps(post))
-        return jsonify({"message": "Diary saved successfully."})
-    except Exception as e:
-        logging.error(f"Error saving diary: {e}")
-        return jsonify({"error": "Failed to save diary."}), 500
+        body = request.get_data(cache=False)
+    except RequestEntityTooLarge:
+        return jsonify({"error": ERROR_MESSAGES[413]}), 413
+    status, payload = journal_api.save_diary(current_vault(), request.content_type, body)
+    return jsonify(payload), status
 
-@app.route('/get_history', methods=['GET'])
+@journal.route('/get_history', methods=['GET'])
 def get_history():
+    # Query parameters (all optional):
+    #   from / to   inclusive YYYY-MM-DD range
+    #   limit       page size; the next page's cursor is returned in the X-Next-Cursor header
+    #   cursor      value of X-Next-Cursor from the previous page
+    #   fields      comma-separated projection of date,day,emotion,appetite,confidence
+    #   format      "ndjson" (or Accept: application/x-ndjson) streams one record per line
+    try:
+        start, end, limit, after, fields = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    ndjson = wants_ndjson(request)
+
     try:
-        records = []
-        for file in BASE_DIR.glob("*.md"):
-            post = frontmatter.load(file)
-            records.append({
-                "date": post.metadata.get("Date"),
-                "emotion": post.metadata.get("Emotion"),
-                "appetite": post.metadata.get("Appetite"),
-                "confidence": post.metadata.get("Confidence")
-            })
-        return jsonify(records)
+        # 与 generate_all_heatmaps 共用 .mdjournal/index.sqlite；按日期排序的索引直接分页，
+        # 只有第一页才同步磁盘，后续页按游标读取索引
+        index = get_index(current_vault())
+        if after is None:
+            # from 和 to 都给出时只扫描这些年份的分片目录
+            index.sync(years=years_between(start, end), max_age=HISTORY_SYNC_MAX_AGE)
+        next_cursor = None
+        rows = None
+        if limit is not None:
+            rows = index.page(start, end, after, limit + 1)
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1])
+
+        if ndjson:
+            def generate(rows=rows, after=after):
+                if rows is not None:
+                    for row in rows:
+                        yield json.dumps(project_row(row, fields), ensure_ascii=False) + "\n"
+                    return
+                while True:
+                    batch = index.page(start, end, after, HISTORY_STREAM_BATCH)
+                    for row in batch:
+                        yield json.dumps(project_row(row, fields), ensure_ascii=False) + "\n"
+                    if len(batch) < HISTORY_STREAM_BATCH:
+                        return
+                    after = (batch[-1][1], batch[-1][0])
+            response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        else:
+            if rows is None:
+                rows = index.page(start, end, after)
+            response = jsonify([project_row(row, fields) for row in rows])
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
     except Exception as e:
         logging.error(f"Error fetching history: {e}")
         return jsonify({"error": "Failed to fetch history."}), 500
 
-@app.route('/heatmaps/<filename>')
+@journal.route('/heatmap_data', methods=['GET'])
+def heatmap_data():
+    # Compact calendar data for client-side rendering (see templates/index.html):
+    #   {"year", "start", "fields": {field: {"labels", "colors", "days", "codes"}}}
+    # days are offsets from January 1st, codes index into labels/colors.
+    # Query parameters: year (default: current year), fields (comma-separated, default: all)
+    try:
+        year, fields = parse_calendar_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        etag, data = calendar_payload(current_vault(), year, fields)
+    except Exception as e:
+        logging.error(f"Error building heatmap data: {e}")
+        return jsonify({"error": "Failed to build heatmap data."}), 500
+    return conditional_response(data, etag, "application/json")
+
+# Page size limits for /search
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 200
+
+def _parse_count_arg(value, name, default):
+    if value is None:
+        return default
+    if not value.isdigit():
+        raise ValueError(f"'{name}' must be a non-negative integer.")
+    return int(value)
+
+@journal.route('/search', methods=['GET'])
+def search():
+    # Full-text search over diary bodies using the inverted index in .mdjournal/index.sqlite.
+    # Query parameters:
+    #   q           required; every whitespace-separated part must appear in the entry.
+    #               A q made only of punctuation is rejected; when every part is too common
+    #               to narrow the candidates, at most search_index.MAX_SCAN_BODIES entries are checked
+    #   from / to   inclusive YYYY-MM-DD range
+    #   emotion     exact Emotion label
+    #   limit       page size (default 20, max 200); offset skips earlier matches
+    query = request.args.get("q", "").strip()
+    try:
+        if not query:
+            raise ValueError("Missing 'q'.")
+        if not search_index.query_groups(query):
+            raise ValueError("'q' contains no searchable words.")
+        start = parse_date_arg(request.args.get("from"), "from")
+        end = parse_date_arg(request.args.get("to"), "to")
+        limit = _parse_count_arg(request.args.get("limit"), "limit", SEARCH_DEFAULT_LIMIT)
+        if not 0 < limit <= SEARCH_MAX_LIMIT:
+            raise ValueError(f"'limit' must be between 1 and {SEARCH_MAX_LIMIT}.")
+        offset = _parse_count_arg(request.args.get("offset"), "offset", 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        index = get_index(current_vault())
+        index.sync(years=years_between(start, end))
+        hits = index.search(query, start, end, request.args.get("emotion") or None, limit, offset)
+    except Exception as e:
+        logging.error(f"Error searching diaries: {e}")
+        return jsonify({"error": "Failed to search."}), 500
+    return jsonify([{
+        "name": hit["name"],
+        "date": hit["date"].isoformat() if hit["date"] else None,
+        "emotion": hit["Emotion"],
+        "snippet": hit["snippet"],
+    } for hit in hits])
+
+@journal.route('/stats', methods=['GET'])
+def get_stats():
+    # Counts per category from the precomputed day/week/month/year rollups in the metadata index.
+    # Query parameters:
+    #   field       Emotion (default), Appetite or Confidence
+    #   from / to   inclusive YYYY-MM-DD range
+    #   group       day, week, month or year: also return per-bucket counts
+    #   streak      a label of the field, e.g. 自信满满: longest and current run of consecutive days
+    field = request.args.get("field", "Emotion")
+    group = request.args.get("group")
+    label = request.args.get("streak")
+    try:
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field. Allowed: {', '.join(FIELDS)}.")
+        if group and group not in stats.GROUPS:
+            raise ValueError(f"Unknown group. Allowed: {', '.join(stats.GROUPS)}.")
+        start = parse_date_arg(request.args.get("from"), "from")
+        end = parse_date_arg(request.args.get("to"), "to")
+        if start and end and start > end:
+            raise ValueError("'from' must not be after 'to'.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        index = get_index(current_vault())
+        index.sync(years=years_between(start, end))
+        result = {
+            "field": field,
+            "from": start.isoformat() if start else None,
+            "to": end.isoformat() if end else None,
+            "totals": stats.totals(index, field, start, end),
+        }
+        if group:
+            result["group"] = group
+            result["buckets"] = [{"bucket": stats.bucket_name(group, bucket), "counts": counts}
+                                 for bucket, counts in stats.grouped(index, field, group, start, end)]
+        if label:
+            result["streak"] = stats.streaks(index, field, label, start, end)
+    except Exception as e:
+        logging.error(f"Error computing stats: {e}")
+        return jsonify({"error": "Failed to compute stats."}), 500
+    data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+    return conditional_response(data, content_hash(data), "application/json")
+
+@journal.route('/heatmaps/')
+def list_heatmaps():
+    # {filename: "/heatmaps/<filename>?v=<content hash>"}; an image's URL only changes when its content does,
+    # so polling this listing (304 while nothing changed) never re-downloads unchanged PNGs
+    etag, data = versioned_listing(current_vault() / "heatmaps",
+                                   lambda name, version: url_for(".serve_heatmap", filename=name, v=version))
+    return conditional_response(data, etag, "application/json")
+
+@journal.route('/heatmaps/<filename>')
 def serve_heatmap(filename):
-    return send_from_directory(BASE_DIR / "heatmaps", filename)
+    # Content-hash ETag; URLs carrying the current ?v= version are cached as immutable
+    return send_versioned_file(current_vault() / "heatmaps", filename, request.args.get("v"))
 
-@app.route('/')
+@journal.route('/')
 def index():
     return send_from_directory('templates', 'index.html')
 
+register_vault_blueprint(app, journal, vaults)
+
+@app.errorhandler(404)
+@app.errorhandler(405)
+def http_error(e):
+    # JSON bodies for unknown URLs and wrong methods, as asgi.py returns
+    return jsonify({"error": ERROR_MESSAGES[e.code]}), e.code
+
 if __name__ == '__main__':
+    # Optional: keep the metadata index hot with a filesystem watcher (set WATCH_VAULT = True in config.py)
+    if getattr(config, "WATCH_VAULT", False):
+        for _, vault_dir in vaults.items():
+            start_watcher(vault_dir)
     app.run(debug=True)
\ No newline at end of file
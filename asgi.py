@@ -0,0 +1,344 @@
+"""
+ASGI entry point for the journal API, for serving many concurrent clients:
+
+    uvicorn asgi:application --host 127.0.0.1 --port 5000
+
+Serves /get_history, /save_diary, /heatmaps/<filename>, /get_outlook and /metrics with the same
+parameters and responses as app.py (also under /v/<id>/ for the vaults in config.VAULTS); HEAD is
+answered for every GET route. Requests are werkzeug request objects and the handlers share their
+parsing, validation and caching code with app.py (journal_api.py, http_cache.py).
+The event loop only parses requests and writes responses: index queries, file I/O, heatmap updates
+and calendar lookups run on a bounded thread pool (ASGI_WORKERS in config.py, default 8).
+History without a limit is streamed in batches of HISTORY_STREAM_BATCH rows and heatmap images in
+64 KB chunks, so large responses are never held in memory whole.
+Written against the ASGI 3 spec directly; no web framework is needed, only an ASGI server.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import mimetypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import Headers
+from werkzeug.sansio.request import Request as SansIORequest
+from werkzeug.security import safe_join
+
+import config
+import journal_api
+import metrics
+from calendar_provider import get_default_calendar
+from http_cache import file_digest, file_headers, file_not_modified
+from journal_api import ERROR_MESSAGES, HISTORY_STREAM_BATCH, HISTORY_SYNC_MAX_AGE, MAX_BODY_SIZE, encode_cursor, \
+    outlook_events, parse_history_args, project_row, wants_ndjson
+from memory_cache import memory_cache
+from metadata_index import get_index
+from vault_watcher import start_watcher
+from vault_layout import years_between
+from vaults import DEFAULT_VAULT, load_registry
+
+logging.basicConfig(level=logging.INFO)
+
+if getattr(config, "METRICS_LOG", False):
+    metrics.enable_json_log()
+
+vaults = load_registry(config)
+for _, vault_dir in vaults.items():
+    vault_dir.mkdir(parents=True, exist_ok=True)
+
+if getattr(config, "CACHE_BUDGET_MB", None):
+    memory_cache.configure(budget=config.CACHE_BUDGET_MB * 1024 * 1024)
+
+calendar = get_default_calendar(getattr(config, "CALENDAR_ICS", None))
+
+# Blocking work runs here; the bound keeps a burst of requests from opening unlimited SQLite
+# connections and rendering threads
+executor = ThreadPoolExecutor(max_workers=getattr(config, "ASGI_WORKERS", 8), thread_name_prefix="mdjournal-asgi")
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+async def run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+class Request(SansIORequest):
+    """werkzeug request built from the ASGI scope: args, headers, accept_mimetypes, if_none_match...
+    behave exactly as on Flask's request"""
+
+    def __init__(self, scope, receive, vault_id, vault_dir):
+        server = scope.get("server") or ("localhost", None)
+        client = scope.get("client")
+        super().__init__(
+            method=scope["method"],
+            scheme=scope.get("scheme", "http"),
+            server=(server[0], server[1]),
+            root_path=scope.get("root_path", ""),
+            path=scope["path"],
+            query_string=scope.get("query_string", b""),
+            headers=Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope.get("headers", ())]),
+            remote_addr=client[0] if client else None,
+        )
+        self.receive = receive
+        self.vault_id = vault_id
+        self.vault_dir = vault_dir
+
+    async def body(self, limit=MAX_BODY_SIZE):
+        """Whole request body; None when it exceeds limit"""
+        chunks, size = [], 0
+        while True:
+            message = await self.receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > limit:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+
+class Response:
+    """Status, headers and either a bytes body or an async iterator of chunks"""
+
+    def __init__(self, body=b"", status=200, content_type="application/json", headers=None):
+        self.body = body
+        self.status = status
+        # Set for HEAD requests: headers only, the body is discarded
+        self.head = False
+        self.headers = dict(headers or {})
+        if content_type:
+            self.headers["Content-Type"] = content_type
+        if isinstance(body, bytes):
+            self.headers["Content-Length"] = str(len(body))
+
+    async def __call__(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in self.headers.items()],
+        })
+        if isinstance(self.body, bytes):
+            await send({"type": "http.response.body", "body": b"" if self.head else self.body})
+            return
+        if self.head:
+            # Closing the iterator runs its cleanup (e.g. closes an opened file)
+            await self.body.aclose()
+            await send({"type": "http.response.body", "body": b""})
+            return
+        try:
+            async for chunk in self.body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except Exception as e:
+            # Headers are already sent; all we can do is end the response early
+            logging.error(f"Error while streaming response: {e}")
+        await send({"type": "http.response.body", "body": b""})
+
+
+def json_response(data, status=200, headers=None):
+    return Response(json.dumps(data, ensure_ascii=False).encode("utf-8"), status, headers=headers)
+
+
+def error(message, status):
+    return json_response({"error": message}, status)
+
+
+def _encode_rows(rows, fields, ndjson):
+    items = (json.dumps(project_row(row, fields), ensure_ascii=False) for row in rows)
+    return "".join(item + "\n" for item in items) if ndjson else ",".join(items)
+
+
+async def get_history(request):
+    # Same query parameters as app.py: from, to, limit, cursor, fields, format=ndjson
+    try:
+        start, end, limit, after, fields = parse_history_args(request.args)
+    except ValueError as e:
+        return error(str(e), 400)
+    ndjson = wants_ndjson(request)
+
+    def first_page():
+        index = get_index(request.vault_dir)
+        if after is None:
+            index.sync(years=years_between(start, end), max_age=HISTORY_SYNC_MAX_AGE)
+        if limit is None:
+            return index, index.page(start, end, after, HISTORY_STREAM_BATCH), None
+        rows = index.page(start, end, after, limit + 1)
+        if len(rows) > limit:
+            return index, rows[:limit], encode_cursor(rows[limit - 1])
+        return index, rows, None
+
+    try:
+        index, rows, next_cursor = await run_blocking(first_page)
+    except Exception as e:
+        logging.error(f"Error fetching history: {e}")
+        return error("Failed to fetch history.", 500)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+
+    if limit is not None and not ndjson:
+        return json_response([project_row(row, fields) for row in rows], headers=headers)
+
+    async def chunks(rows=rows, after=after):
+        # Without a limit the JSON array is written batch by batch: "[" + elements + "]"
+        first = True
+        if not ndjson:
+            yield b"["
+        while True:
+            if rows:
+                text = await run_blocking(_encode_rows, rows, fields, ndjson)
+                if not ndjson and not first:
+                    text = "," + text
+                first = False
+                yield text.encode("utf-8")
+            if limit is not None or len(rows) < HISTORY_STREAM_BATCH:
+                break
+            after = (rows[-1][1], rows[-1][0])
+            rows = await run_blocking(index.page, start, end, after, HISTORY_STREAM_BATCH)
+        if not ndjson:
+            yield b"]"
+
+    return Response(chunks(), content_type="application/x-ndjson" if ndjson else "application/json",
+                    headers=headers)
+
+
+async def save_diary(request):
+    body = await request.body()
+    if body is None:
+        return error(ERROR_MESSAGES[413], 413)
+    status, payload = await run_blocking(journal_api.save_diary, request.vault_dir, request.content_type, body)
+    return json_response(payload, status)
+
+
+def _open_file(path, request):
+    """(digest, open file or None when If-None-Match matches, size); digest is None when the file is missing"""
+    digest = file_digest(path)
+    if digest is None or file_not_modified(request, digest):
+        return digest, None, 0
+    f = open(path, "rb")
+    return digest, f, os.fstat(f.fileno()).st_size
+
+
+async def _read_chunks(f, size):
+    try:
+        while size > 0:
+            chunk = await run_blocking(f.read, min(FILE_CHUNK_SIZE, size))
+            if not chunk:
+                return
+            size -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+async def serve_heatmap(request, filename):
+    # Content-hash ETag; URLs carrying the current ?v= version are cached as immutable
+    path = safe_join(os.fspath(request.vault_dir / "heatmaps"), filename)
+    try:
+        digest, f, size = await run_blocking(_open_file, path, request) if path else (None, None, 0)
+    except OSError:
+        digest = None
+    if digest is None:
+        return error(ERROR_MESSAGES[404], 404)
+    headers = file_headers(digest, request.args.get("v"))
+    if f is None:
+        metrics.inc("http_conditional_total", result="not_modified")
+        return Response(status=304, content_type=None, headers=headers)
+    metrics.inc("http_conditional_total", result="full")
+    headers["Content-Length"] = str(size)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return Response(_read_chunks(f, size), content_type=content_type, headers=headers)
+
+
+async def get_outlook(request):
+    # Without parameters returns today's events as a list; with from/to a {"YYYY-MM-DD": [events]} map
+    status, payload = await run_blocking(outlook_events, calendar, request.args)
+    return json_response(payload, status)
+
+
+async def get_metrics(request):
+    return Response(metrics.render().encode("utf-8"), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# path -> (methods, handler); /heatmaps/<filename> is matched separately
+ROUTES = {
+    "/get_history": (("GET",), get_history),
+    "/save_diary": (("POST",), save_diary),
+    "/get_outlook": (("GET",), get_outlook),
+}
+
+
+def resolve(path):
+    """URL path -> (vault id, path inside the vault); the default vault is served at the root"""
+    if path.startswith("/v/"):
+        vault_id, _, rest = path[3:].partition("/")
+        return vault_id, "/" + rest
+    return DEFAULT_VAULT, path
+
+
+async def _route(request, path):
+    """Returns (endpoint name, response); HEAD is handled as GET"""
+    method = "GET" if request.method == "HEAD" else request.method
+    if path.startswith("/heatmaps/") and len(path) > len("/heatmaps/"):
+        if method != "GET":
+            return "serve_heatmap", error(ERROR_MESSAGES[405], 405)
+        return "serve_heatmap", await serve_heatmap(request, path[len("/heatmaps/"):])
+    route = ROUTES.get(path)
+    if route is None:
+        return "unmatched", error(ERROR_MESSAGES[404], 404)
+    methods, handler = route
+    if method not in methods:
+        return handler.__name__, error(ERROR_MESSAGES[405], 405)
+    return handler.__name__, await handler(request)
+
+
+async def dispatch(request, path):
+    """Returns (endpoint name, response)"""
+    endpoint, response = await _route(request, path)
+    response.head = request.method == "HEAD"
+    return endpoint, response
+
+
+async def lifespan(receive, send):
+    watchers = []
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Optional: keep the metadata indexes hot with filesystem watchers (WATCH_VAULT = True in config.py)
+            if getattr(config, "WATCH_VAULT", False):
+                watchers = [start_watcher(vault_dir) for _, vault_dir in vaults.items()]
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            for watcher in watchers:
+                watcher.stop()
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    start = time.perf_counter()
+    path = scope["path"]
+    if path == "/metrics":
+        if scope["method"] not in ("GET", "HEAD"):
+            return await error(ERROR_MESSAGES[405], 405)(send)
+        response = await get_metrics(None)
+        response.head = scope["method"] == "HEAD"
+        return await response(send)
+
+    vault_id, path = resolve(path)
+    vault_dir = vaults.get(vault_id)
+    if vault_dir is None:
+        endpoint, response = "unmatched", error(ERROR_MESSAGES[404], 404)
+    else:
+        endpoint, response = await dispatch(Request(scope, receive, vault_id, vault_dir), path)
+    await response(send)
+    metrics.observe("http_request_seconds", time.perf_counter() - start, endpoint=f"asgi.{endpoint}",
+                    method=scope["method"], status=response.status, vault=vault_id if vault_dir else "")
@@ -0,0 +1,86 @@
+"""
+原子写入日记文件
+- 先写同目录下的临时文件并 fsync，再用 os.replace 替换目标文件，崩溃或同步客户端读取时不会看到写了一半的文件
+- 内容与磁盘上完全相同时跳过写入，避免同步客户端重复上传
+- 返回内容哈希（与 metadata_index 使用的哈希一致），扫描时可据此判断文件是否真的变化
+"""
+
+import os
+import pathlib
+import shutil
+import tempfile
+
+from metadata_index import content_hash
+
+# 进程的 umask 只在导入时读取一次：os.umask 只能先设置再恢复，运行中读取会短暂影响其他线程新建的文件
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _fsync_dir(directory: pathlib.Path):
+    # 让 rename 本身也落盘；Windows 不支持打开目录，直接跳过
+    if os.name != "posix":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _same_content(path: pathlib.Path, data: bytes):
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def atomic_write(path: pathlib.Path, data, encoding="utf-8", newline=None, fsync=True):
+    """把 data 原子地写入 path，返回 (是否实际写入, 内容哈希)
+
+    data 为 str 时按 encoding 编码；newline 与 open() 的含义相同，None 表示把 \\n 转换为系统换行符
+    """
+    path = pathlib.Path(path)
+    if isinstance(data, str):
+        if newline is None:
+            newline = os.linesep
+        if newline:
+            data = data.replace("\n", newline)
+        data = data.encode(encoding)
+    digest = content_hash(data)
+    if _same_content(path, data):
+        return False, digest
+
+    # 按年/月分片的目录布局下，新的一年或一个月的第一篇日记所在的分片目录可能还不存在
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 临时文件以 . 开头、以 .tmp 结尾，不会被当成日记扫描到
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp 创建的文件权限是 0600：已有文件保持原权限，新文件与 open() 新建的一样按 umask 取 0666
+        if path.exists():
+            shutil.copymode(path, tmp)
+        else:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        _fsync_dir(path.parent)
+    return True, digest
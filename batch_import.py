@@ -0,0 +1,246 @@
+"""
+批量导入 / 回填日记
+从 CSV 或 JSONL（例如情绪记录 App 的导出）读取多天的数据，按 build_template 的格式批量写入 YYYYMMDD.md
+
+用法:
+    python batch_import.py export.csv --base-dir D:\\journal
+    python batch_import.py export.jsonl --on-conflict merge --workers 8
+    python batch_import.py - --format jsonl --dry-run < export.jsonl
+
+支持的列（不区分大小写）: date, emotion, appetite, confidence, location, diary, exercise
+已存在的文件按 --on-conflict 处理:
+    skip       保留原文件（默认）
+    overwrite  用导入内容覆盖
+    merge      原文件中已有的元数据优先，只补充缺失的字段；正文保留，导入的随笔不重复时追加在末尾
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import pathlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import frontmatter
+
+from atomic_write import atomic_write
+from obsidian_daily import (build_template, frontmatter_lines, get_today_filename, ensure_dir,
+                            DEFAULT_DIR, EMOTIONS, APPETITES, CONFIDENCES)
+
+CONFLICT_POLICIES = ("skip", "overwrite", "merge")
+DEFAULT_LOCATION = "东涌镇,中国,广东省,广州市 南沙区"
+# 导出文件中常见的列名别名
+COLUMN_ALIASES = {
+    "date": "date", "day": "date", "日期": "date",
+    "emotion": "emotion", "mood": "emotion", "情绪": "emotion",
+    "appetite": "appetite", "食欲": "appetite",
+    "confidence": "confidence", "自信": "confidence",
+    "location": "location", "位置": "location",
+    "diary": "diary", "text": "diary", "note": "diary", "随笔": "diary",
+    "exercise": "exercise", "运动": "exercise",
+}
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S")
+MERGED_SECTION = "## 导入记录"
+
+
+def parse_date(value):
+    value = str(value or "").strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的日期: {value!r}")
+
+
+def read_rows(stream, fmt):
+    """逐行产出 (行号, 规范化后的字典)；无法解析的行产出 (行号, ValueError)，由 BatchImporter 计入 errors 后继续导入"""
+    if fmt == "jsonl":
+        for lineno, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield lineno, ValueError(f"JSON 格式错误: {e}")
+                continue
+            if not isinstance(row, dict):
+                yield lineno, ValueError(f"每行应为一个 JSON 对象，实际为 {type(row).__name__}")
+                continue
+            yield lineno, _normalize(row)
+    else:
+        # 行号从表头之后开始计
+        for lineno, row in enumerate(csv.DictReader(stream), 2):
+            yield lineno, _normalize(row)
+
+
+def _normalize(row):
+    result = {}
+    for key, value in row.items():
+        name = COLUMN_ALIASES.get(str(key).strip().lower())
+        if name and value not in (None, ""):
+            result[name] = str(value).strip()
+    return result
+
+
+def merge_entry(existing_text, meta, diary_text):
+    """merge 策略：已有元数据优先，正文保留并追加尚未出现过的导入随笔"""
+    post = frontmatter.loads(existing_text)
+    merged = dict(meta)
+    for key, value in post.metadata.items():
+        # 旧版 build_template 会把未填写的字段写成字符串 "None"
+        if value not in (None, "", "None"):
+            merged[key] = value
+    body = post.content
+    if diary_text and diary_text not in body:
+        body = f"{body.rstrip()}\n\n{MERGED_SECTION}\n\n{diary_text}\n"
+    return "\n".join(frontmatter_lines(merged)) + "\n\n" + body
+
+
+class BatchImporter:
+    def __init__(self, base_dir: pathlib.Path, on_conflict="skip", dry_run=False, workers=4, calendar=None):
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"on_conflict 必须是 {', '.join(CONFLICT_POLICIES)} 之一")
+        self.base_dir = pathlib.Path(base_dir)
+        self.on_conflict = on_conflict
+        self.dry_run = dry_run
+        self.workers = max(1, workers)
+        self.calendar = calendar
+
+    def _prepare(self, rows):
+        entries = {}
+        report = {"rows": 0, "duplicates": 0, "unknown_values": 0, "errors": []}
+        vocab = {"emotion": set(EMOTIONS), "appetite": set(APPETITES), "confidence": set(CONFIDENCES)}
+        for lineno, row in rows:
+            report["rows"] += 1
+            if isinstance(row, Exception):
+                report["errors"].append({"line": lineno, "error": str(row)})
+                continue
+            try:
+                when = parse_date(row.get("date"))
+            except ValueError as e:
+                report["errors"].append({"line": lineno, "error": str(e)})
+                continue
+            for field, allowed in vocab.items():
+                if row.get(field) and row[field] not in allowed:
+                    report["unknown_values"] += 1
+            day = when.date()
+            if day in entries:
+                # 同一天出现多次时以最后一行为准
+                report["duplicates"] += 1
+            entries[day] = (when, row)
+        return entries, report
+
+    def _write_one(self, item):
+        day, (when, row), events = item
+        path = get_today_filename(self.base_dir, day)
+        meta, content = build_template(when, row.get("location", DEFAULT_LOCATION), row.get("emotion"),
+                                       row.get("confidence"), row.get("appetite"), row.get("diary"),
+                                       row.get("exercise"), events)
+        outcome = "written"
+        if path.exists():
+            if self.on_conflict == "skip":
+                return "skipped", 0
+            if self.on_conflict == "merge":
+                content = merge_entry(path.read_text(encoding="utf-8"), meta, row.get("diary"))
+                outcome = "merged"
+            else:
+                outcome = "overwritten"
+        data = content.encode("utf-8")
+        if not self.dry_run:
+            written, _ = atomic_write(path, data)
+            if not written:
+                # 与磁盘上的内容完全相同
+                return "unchanged", 0
+        return outcome, len(data)
+
+    def run(self, rows):
+        t0 = time.perf_counter()
+        entries, report = self._prepare(rows)
+        events = {}
+        if self.calendar is not None and entries:
+            # 整个导入区间只查询一次日程
+            try:
+                events = self.calendar.fetch_range(min(entries), max(entries))
+            except Exception as e:
+                logging.warning(f"读取日程失败，导入时不写入日程：{e}")
+        if not self.dry_run:
+            ensure_dir(self.base_dir)
+        items = [(day, entries[day], events.get(day, [])) for day in sorted(entries)]
+        counts = {"written": 0, "overwritten": 0, "merged": 0, "skipped": 0, "unchanged": 0}
+        total_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for (day, _, _), result in zip(items, pool.map(self._safe_write, items)):
+                if isinstance(result, Exception):
+                    report["errors"].append({"date": day.isoformat(), "error": str(result)})
+                    continue
+                outcome, size = result
+                counts[outcome] += 1
+                total_bytes += size
+        elapsed = time.perf_counter() - t0
+        files = counts["written"] + counts["overwritten"] + counts["merged"]
+        report.update(counts)
+        report.update({
+            "dry_run": self.dry_run,
+            "bytes": total_bytes,
+            "seconds": round(elapsed, 3),
+            "files_per_second": round(files / elapsed, 1) if elapsed > 0 else None,
+        })
+        return report
+
+    def _safe_write(self, item):
+        try:
+            return self._write_one(item)
+        except Exception as e:
+            return e
+
+
+def load_config():
+    try:
+        import config
+        return config
+    except ImportError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从 CSV/JSONL 批量生成日记文件")
+    parser.add_argument("input", help="输入文件，- 表示标准输入")
+    parser.add_argument("--base-dir", type=pathlib.Path, default=None, help="日记目录（默认取 config.BASE_DIR）")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="输入格式（默认按扩展名判断）")
+    parser.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default="skip")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写文件")
+    parser.add_argument("--workers", type=int, default=4, help="并行写入的线程数")
+    parser.add_argument("--with-calendar", action="store_true", help="把日程写入 今日日程（整段区间只查询一次）")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("jsonl" if args.input.endswith((".jsonl", ".ndjson")) else "csv")
+    config = load_config()
+    calendar = None
+    if args.with_calendar:
+        from calendar_provider import get_default_calendar
+        calendar = get_default_calendar(getattr(config, "CALENDAR_ICS", None))
+    base_dir = args.base_dir or pathlib.Path(getattr(config, "BASE_DIR", DEFAULT_DIR))
+    importer = BatchImporter(base_dir, on_conflict=args.on_conflict,
+                             dry_run=args.dry_run, workers=args.workers, calendar=calendar)
+    if args.input == "-":
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+        report = importer.run(read_rows(stream, fmt))
+    else:
+        with open(args.input, "r", encoding="utf-8-sig", newline="") as stream:
+            report = importer.run(read_rows(stream, fmt))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+对比 frontmatter.load 与 metadata_index.read_frontmatter_header
+用法: python benchmarks/bench_frontmatter.py [文件数，默认 10000]
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+import frontmatter
+
+# synthetic_vault 会把仓库根目录加入 sys.path
+from synthetic_vault import generate_vault
+from metadata_index import read_frontmatter_header
+
+KEYS = ("Date", "Emotion", "Appetite", "Confidence", "Location")
+
+
+def timed(func, files):
+    t0 = time.perf_counter()
+    results = [func(p) for p in files]
+    return time.perf_counter() - t0, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        base = pathlib.Path(tmp)
+        generate_vault(base, count)
+        files = sorted(base.glob("*.md"))
+        # 预热一次文件系统缓存，两边在同样条件下比较
+        for p in files:
+            p.read_bytes()
+        slow, slow_meta = timed(lambda p: frontmatter.load(p).metadata, files)
+        fast, fast_meta = timed(read_frontmatter_header, files)
+    mismatched = sum(1 for a, b in zip(slow_meta, fast_meta)
+                     if any(str(a.get(k)) != str(b.get(k)) for k in KEYS))
+    print(f"文件数: {count}")
+    print(f"frontmatter.load:        {slow:.3f}s ({slow / count * 1e6:.1f} us/文件)")
+    print(f"read_frontmatter_header: {fast:.3f}s ({fast / count * 1e6:.1f} us/文件)")
+    print(f"加速比: {slow / fast:.1f}x, 结果不一致: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+并发负载测试：分别启动 WSGI（app.py，Flask 开发服务器）和 ASGI（asgi.py，uvicorn）服务，
+用多个长连接客户端在同一个合成日记目录上并发请求，比较吞吐（req/s）和延迟分位数（p50/p99）
+默认的请求混合（轮流发送）：
+- /get_history?limit=50  首页
+- /get_history           全部记录（ASGI 分批流式发送）
+- /get_history?format=ndjson
+- /heatmaps/<文件名>      热力图 PNG
+- /get_outlook           日程（使用生成的 .ics 文件，不需要 Outlook）
+/save_diary 每天只能创建一篇，不适合反复压测，没有包含在内
+用法:
+    python benchmarks/bench_load.py                                # 1000 篇，并发 16，每个服务 10 秒
+    python benchmarks/bench_load.py --size 10000 --concurrency 64 --duration 30 --json load.json
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000    # 压测已在运行的服务
+需要 uvicorn（pip install uvicorn）才能测试 ASGI；没有安装时只测 WSGI
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import math
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from urllib.parse import urlsplit
+
+# bench_suite 经 synthetic_vault 把仓库根目录加入 sys.path
+from bench_suite import prepare_vault
+from obsidian_daily import generate_all_heatmaps
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+DEFAULT_PATHS = [
+    "/get_history?limit=50",
+    "/get_history",
+    "/get_history?format=ndjson",
+    "/heatmaps/{heatmap}",
+    "/get_outlook",
+]
+WSGI_LAUNCHER = ("import logging, sys, app; logging.getLogger('werkzeug').setLevel(logging.WARNING); "
+                 "app.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_config(config_dir: pathlib.Path, base_dir: pathlib.Path, today: date):
+    """服务进程使用的 config.py，以及 /get_outlook 读取的 .ics 文件（今天的几个日程）"""
+    ics = config_dir / "calendar.ics"
+    events = [
+        f"BEGIN:VEVENT\nDTSTART:{today:%Y%m%d}T{h:02d}0000\nDTEND:{today:%Y%m%d}T{h + 1:02d}0000\nSUMMARY:日程{h}\nEND:VEVENT"
+        for h in (9, 14, 16)]
+    ics.write_text("BEGIN:VCALENDAR\n" + "\n".join(events) + "\nEND:VCALENDAR\n", encoding="utf-8")
+    (config_dir / "config.py").write_text(
+        f"import pathlib\nBASE_DIR = pathlib.Path({str(base_dir)!r})\nCALENDAR_ICS = {str(ics)!r}\n", encoding="utf-8")
+
+
+def start_server(kind, config_dir: pathlib.Path, port):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(config_dir), str(REPO_ROOT)]))
+    if kind == "wsgi":
+        cmd = [sys.executable, "-c", WSGI_LAUNCHER, str(port)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:application", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/get_history?limit=1")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"服务 {host}:{port} 在 {timeout}s 内没有就绪")
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p * len(sorted_values)) - 1)]
+
+
+def run_load(host, port, paths, concurrency, duration):
+    """concurrency 个线程各用一个长连接轮流请求 paths，持续 duration 秒
+
+    返回 {path: [(延迟秒, 状态码或 None), ...]}；状态码为 None 表示连接错误
+    """
+    samples = {path: [] for path in paths}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(offset):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local = []
+        i = offset
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            path = paths[i % len(paths)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = None
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            local.append((path, time.perf_counter() - t0, status))
+        conn.close()
+        with lock:
+            for path, elapsed, status in local:
+                samples[path].append((elapsed, status))
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    deadline[0] = time.perf_counter() + duration
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def summarize(samples, duration):
+    def stats(items):
+        latencies = sorted(elapsed for elapsed, _ in items)
+        errors = sum(1 for _, status in items if status is None or status >= 500)
+        return {
+            "requests": len(items),
+            "errors": errors,
+            "rps": round(len(items) / duration, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round((latencies[-1] if latencies else 0) * 1000, 2),
+        }
+    return {
+        "total": stats([item for items in samples.values() for item in items]),
+        "paths": {path: stats(items) for path, items in samples.items()},
+    }
+
+
+def print_summary(name, summary):
+    total = summary["total"]
+    print(f"[{name}] {total['rps']:8.1f} req/s   p50 {total['p50_ms']:8.1f} ms   p99 {total['p99_ms']:8.1f} ms   "
+          f"请求 {total['requests']}  错误 {total['errors']}")
+    for path, s in summary["paths"].items():
+        print(f"[{name}]   {path:<40} {s['rps']:8.1f} req/s   p50 {s['p50_ms']:8.1f} ms   p99 {s['p99_ms']:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WSGI 与 ASGI 服务的并发负载测试")
+    parser.add_argument("--size", type=int, default=1000, help="合成目录的日记篇数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=10, help="每个服务的压测时长（秒）")
+    parser.add_argument("--targets", nargs="+", choices=["wsgi", "asgi"], default=["wsgi", "asgi"])
+    parser.add_argument("--paths", nargs="+", help="请求的路径，默认见文件开头；{heatmap} 替换为一张热力图的文件名")
+    parser.add_argument("--url", help="压测已在运行的服务，不再启动 WSGI/ASGI 进程")
+    parser.add_argument("--vault-dir", help="合成目录保存在这里并在下次复用，默认用临时目录")
+    parser.add_argument("--json", help="结果写入的 JSON 文件")
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    results = {}
+    if args.url:
+        url = urlsplit(args.url)
+        # 不知道已运行服务的目录里有哪些热力图，需要时用 --paths 指定
+        paths = [p for p in paths if "{heatmap}" not in p]
+        wait_ready(url.hostname, url.port or 80)
+        samples = run_load(url.hostname, url.port or 80, paths, args.concurrency, args.duration)
+        results[url.netloc] = summarize(samples, args.duration)
+        print_summary(url.netloc, results[url.netloc])
+    else:
+        targets = list(args.targets)
+        if "asgi" in targets and importlib.util.find_spec("uvicorn") is None:
+            print("未安装 uvicorn，跳过 ASGI（pip install uvicorn）")
+            targets.remove("asgi")
+        today = date.today()
+        with tempfile.TemporaryDirectory() as tmp:
+            root = pathlib.Path(args.vault_dir) if args.vault_dir else pathlib.Path(tmp)
+            base, generated = prepare_vault(root, args.size, today)
+            if generated:
+                print(f"生成目录用时 {generated:.1f}s")
+            # 服务启动前先建好索引和去年的热力图，两种服务从同样的状态开始
+            generate_all_heatmaps(base, today.year - 1)
+            heatmap = sorted(p.name for p in (base / "heatmaps").glob("*.png"))[0]
+            paths = [p.format(heatmap=heatmap) for p in paths]
+            config_dir = pathlib.Path(tmp) / "config"
+            config_dir.mkdir()
+            write_config(config_dir, base, today)
+
+            for kind in targets:
+                port = free_port()
+                server = start_server(kind, config_dir, port)
+                try:
+                    wait_ready("127.0.0.1", port)
+                    # 预热：每个路径先请求一次，缓存和索引连接都已就绪后再计时
+                    run_load("127.0.0.1", port, paths, 1, 0.5)
+                    samples = run_load("127.0.0.1", port, paths, args.concurrency, args.duration)
+                finally:
+                    server.terminate()
+                    server.wait(timeout=10)
+                results[kind] = summarize(samples, args.duration)
+                print_summary(kind, results[kind])
+
+    if args.json:
+        output = {"concurrency": args.concurrency, "duration": args.duration, "size": args.size, "results": results}
+        pathlib.Path(args.json).write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+对比热力图的几种渲染方式的单张图耗时
+- separate: 每张图新建 figure（原来的做法）
+- reuse:    HeatmapRenderer 复用 figure/axes，只替换图像数据
+- combined: 所有字段、所有年份画进一张图
+- pillow:   pil_heatmap，不经过 matplotlib
+用法: python benchmarks/bench_render.py [年数，默认 3] [--repeat N]
+"""
+
+import argparse
+import pathlib
+import tempfile
+import time
+from datetime import datetime
+
+# synthetic_vault 会把仓库根目录加入 sys.path
+from synthetic_vault import generate_vault
+from obsidian_daily import FIELDS, HeatmapRenderer, build_category_matrices, load_record_store
+import pil_heatmap
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("years", type=int, nargs="?", default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复次数，取最快的一次")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = pathlib.Path(tmp)
+        generate_vault(base, args.years * 365, start=datetime(2020, 1, 1, 21, 30))
+        store = load_record_store(base)
+        years = store.years()
+        matrices = {year: build_category_matrices(store, year, FIELDS) for year in years}
+        jobs = [(year, field) + matrices[year][field] for year in years for field in FIELDS]
+        out = base / "out"
+        out.mkdir()
+
+        def separate():
+            for year, field, mat, cats in jobs:
+                HeatmapRenderer().render(mat, cats, year, field, out / f"{year}_{field}.png")
+
+        renderer = HeatmapRenderer()
+
+        def reuse():
+            for year, field, mat, cats in jobs:
+                renderer.render(mat, cats, year, field, out / f"{year}_{field}.png")
+
+        def combined():
+            HeatmapRenderer().render_combined(matrices, out / "combined.png")
+
+        def pillow():
+            for year, field, mat, cats in jobs:
+                pil_heatmap.render_category_heatmap(mat, cats, year, field, out / f"{year}_{field}_pil.png")
+
+        results = {
+            "separate": timed(separate, args.repeat),
+            "reuse": timed(reuse, args.repeat),
+            "combined": timed(combined, args.repeat),
+            "pillow": timed(pillow, args.repeat),
+        }
+    n = len(jobs)
+    print(f"年份: {years[0]}-{years[-1]}，子图数: {n}")
+    for name, elapsed in results.items():
+        print(f"{name:9s} 总计 {elapsed:.3f}s，每张子图 {elapsed / n * 1000:.1f} ms，"
+              f"相对 separate {results['separate'] / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
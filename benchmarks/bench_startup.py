@@ -0,0 +1,99 @@
+"""
+冷启动导入耗时基准（基于 python -X importtime）
+用法:
+    python benchmarks/bench_startup.py                     # 默认测 obsidian_daily
+    python benchmarks/bench_startup.py obsidian_daily metadata_index --runs 5
+    python benchmarks/bench_startup.py --json out.json     # 保存结果
+    python benchmarks/bench_startup.py --baseline out.json # 与上次结果比较，变慢超过阈值时返回非 0
+"""
+
+import argparse
+import json
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = pathlib.Path(__file__).resolve().parent.parent
+# 写日记的启动路径上不应该出现的重量级模块
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib")
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module):
+    """在全新解释器中导入 module，返回 (导入耗时 us, {模块: 累计耗时 us}, {直接依赖: 累计耗时 us})"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    cumulative = {}
+    children = {}
+    pending = {}
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        _, cum, indent, name = m.groups()
+        cumulative[name] = int(cum)
+        # -X importtime 先输出子模块再输出父模块，缩进多两格即为直接依赖
+        if len(indent) == 3:
+            pending[name] = int(cum)
+        elif len(indent) == 1:
+            if name == module:
+                children = pending
+            pending = {}
+    return cumulative.get(module, 0), cumulative, children
+
+
+def run(modules, runs):
+    results = {}
+    for module in modules:
+        totals = []
+        last = children = {}
+        for _ in range(runs):
+            total, last, children = measure(module)
+            totals.append(total)
+        heavy = sorted(m for m in last if m in HEAVY_MODULES)
+        top = sorted(children.items(), key=lambda x: -x[1])[:10]
+        results[module] = {
+            "median_us": int(statistics.median(totals)),
+            "min_us": min(totals),
+            "heavy_modules": heavy,
+            "top_imports": top,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量模块冷启动导入耗时")
+    parser.add_argument("modules", nargs="*", default=["obsidian_daily"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="结果写入的 JSON 文件")
+    parser.add_argument("--baseline", help="上次保存的 JSON，用于回归比较")
+    parser.add_argument("--threshold", type=float, default=1.25, help="中位数超过基线的倍数视为回归")
+    args = parser.parse_args()
+
+    results = run(args.modules, args.runs)
+    regressed = False
+    baseline = json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else {}
+    for module, r in results.items():
+        print(f"{module}: 中位数 {r['median_us'] / 1000:.1f} ms, 最快 {r['min_us'] / 1000:.1f} ms")
+        for name, us in r["top_imports"]:
+            print(f"    {name:<28} {us / 1000:8.1f} ms")
+        if r["heavy_modules"]:
+            print(f"    警告: 启动时加载了 {', '.join(r['heavy_modules'])}")
+        if module in baseline:
+            ratio = r["median_us"] / max(1, baseline[module]["median_us"])
+            print(f"    相对基线: {ratio:.2f}x")
+            if ratio > args.threshold:
+                regressed = True
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if regressed:
+        print("启动耗时出现回归")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+端到端基准：生成不同规模的合成日记目录，测量主要函数和 Flask 路由的耗时，结果写成 JSON 便于前后比较
+测量项（每项取 --repeat 次中的最快值和中位数）：
+- scan_folder_for_metadata：cold 新建索引 / warm 索引已是最新 / full 不用索引的全量扫描
+- make_category_heatmap：最近一个完整年份的单个字段，matplotlib 与 pillow 两种后端
+- generate_all_heatmaps：cold 不用渲染缓存 / warm 全部命中缓存
+- GET /get_history（全部、首页 50 条、NDJSON 流）与 POST /save_diary，经 Flask test client
+用法:
+    python benchmarks/bench_suite.py                          # 默认 1000 和 10000 篇
+    python benchmarks/bench_suite.py --sizes 1000 10000 100000 --json out.json
+    python benchmarks/bench_suite.py --baseline out.json      # 与上次结果比较，变慢超过阈值时返回非 0
+    python benchmarks/bench_suite.py --vault-dir D:/bench     # 保留生成的目录，下次直接复用
+"""
+
+import argparse
+import json
+import logging
+import pathlib
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+from datetime import date, datetime, timedelta
+
+# synthetic_vault 会把仓库根目录加入 sys.path
+from synthetic_vault import generate_vault
+from obsidian_daily import FIELDS, generate_all_heatmaps, load_record_store, make_category_heatmap, \
+    scan_folder_for_metadata
+from metadata_index import INDEX_DIRNAME
+
+MALFORMED = 0.01
+SAVE_PAYLOAD = {
+    "emotion": "平静😐",
+    "confidence": "自信满满",
+    "appetite": "想吃辣的🌶",
+    "diary": "基准测试写入的日记。\n\n和朋友一起吃了火锅，聊了很多。",
+    "events": [{"start": "09:00", "end": "10:00", "subject": "组会"}],
+}
+
+
+def timed(func, repeat, setup=None):
+    """运行 repeat 次，返回 {"min_ms", "median_ms", "runs"}；setup 在每次计时前调用，不计入耗时"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {"min_ms": round(min(samples), 3), "median_ms": round(statistics.median(samples), 3), "runs": repeat}
+
+
+def load_app(base_dir: pathlib.Path):
+    """导入 app.py 并让它的默认 vault 使用合成目录
+
+    用临时的 config 模块代替真实的 config.py，避免基准测试往真实的日记目录里写文件
+    """
+    config = types.ModuleType("config")
+    config.BASE_DIR = base_dir
+    sys.modules["config"] = config
+    import app
+    from vaults import DEFAULT_VAULT
+    app.vaults.add(DEFAULT_VAULT, base_dir)
+    return app.app
+
+
+def prepare_vault(root: pathlib.Path, size, today: date):
+    """root/<size> 下的合成目录，最后一篇是昨天；已存在且篇数一致时直接复用"""
+    base = root / str(size)
+    if base.exists() and sum(1 for _ in base.glob("*.md")) == size:
+        return base, 0.0
+    shutil.rmtree(base, ignore_errors=True)
+    start = datetime.combine(today - timedelta(days=size), datetime.min.time()).replace(hour=21, minute=30)
+    t0 = time.perf_counter()
+    generate_vault(base, size, start=start, malformed=MALFORMED)
+    return base, time.perf_counter() - t0
+
+
+def bench_size(base: pathlib.Path, repeat, today: date):
+    results = {}
+    index_dir = base / INDEX_DIRNAME
+    year = today.year - 1
+
+    results["scan_folder_for_metadata.cold"] = timed(
+        lambda: scan_folder_for_metadata(base), repeat, setup=lambda: shutil.rmtree(index_dir, ignore_errors=True))
+    results["scan_folder_for_metadata.warm"] = timed(lambda: scan_folder_for_metadata(base), repeat)
+    results["scan_folder_for_metadata.full"] = timed(lambda: scan_folder_for_metadata(base, use_index=False), repeat)
+
+    store = load_record_store(base)
+    with tempfile.TemporaryDirectory() as out:
+        for backend in ("matplotlib", "pillow"):
+            out_path = pathlib.Path(out) / f"{year}_{FIELDS[0]}_{backend}.png"
+            results[f"make_category_heatmap.{backend}"] = timed(
+                lambda: make_category_heatmap(store, year, FIELDS[0], out_path, backend=backend), repeat)
+
+    results["generate_all_heatmaps.cold"] = timed(lambda: generate_all_heatmaps(base, year, use_cache=False), repeat)
+    # 先生成一次当年和去年的图片：warm 全部命中缓存，/save_diary 也会走增量更新热力图的路径
+    generate_all_heatmaps(base, today.year)
+    generate_all_heatmaps(base, year)
+    results["generate_all_heatmaps.warm"] = timed(lambda: generate_all_heatmaps(base, year), repeat)
+
+    client = load_app(base).test_client()
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            response.get_data()
+            assert response.status_code == 200, (url, response.status_code)
+        return request
+
+    results["GET /get_history"] = timed(get("/get_history"), repeat)
+    results["GET /get_history?limit=50"] = timed(get("/get_history?limit=50"), repeat)
+    results["GET /get_history?format=ndjson"] = timed(get("/get_history?format=ndjson"), repeat)
+
+    today_file = base / f"{today.strftime('%Y%m%d')}.md"
+
+    def save():
+        response = client.post("/save_diary", json=SAVE_PAYLOAD)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    results["POST /save_diary"] = timed(save, repeat, setup=lambda: today_file.unlink(missing_ok=True))
+    today_file.unlink(missing_ok=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """打印与基线的比较，返回是否出现回归"""
+    regressed = False
+    for size, cases in results.items():
+        for name, r in cases.items():
+            old = baseline.get(size, {}).get(name)
+            if not old:
+                continue
+            ratio = r["median_ms"] / max(old["median_ms"], 1e-3)
+            if ratio > threshold:
+                regressed = True
+                print(f"回归: [{size}] {name} {old['median_ms']:.1f} -> {r['median_ms']:.1f} ms ({ratio:.2f}x)")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成日记目录上的端到端基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="日记篇数，可以给多个")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数")
+    parser.add_argument("--vault-dir", help="生成的目录保存在这里并在下次复用，默认用临时目录")
+    parser.add_argument("--json", help="结果写入的 JSON 文件")
+    parser.add_argument("--baseline", help="上次保存的 JSON，用于回归比较")
+    parser.add_argument("--threshold", type=float, default=1.25, help="中位数超过基线的倍数视为回归")
+    args = parser.parse_args()
+
+    today = date.today()
+    tmp = None
+    if args.vault_dir:
+        root = pathlib.Path(args.vault_dir)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        root = pathlib.Path(tmp.name)
+    results = {}
+    try:
+        for size in args.sizes:
+            base, generated = prepare_vault(root, size, today)
+            if generated:
+                print(f"[{size}] 生成目录用时 {generated:.1f}s")
+            # 只保留警告，避免每次渲染和保存的日志淹没结果
+            logging.disable(logging.INFO)
+            results[str(size)] = bench_size(base, args.repeat, today)
+            logging.disable(logging.NOTSET)
+            for name, r in results[str(size)].items():
+                print(f"[{size}] {name:<36} 最快 {r['min_ms']:10.1f} ms   中位数 {r['median_ms']:10.1f} ms")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "malformed": MALFORMED,
+        },
+        "results": results,
+    }
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8"))
+        if compare(results, baseline.get("results", {}), args.threshold):
+            print("出现性能回归")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
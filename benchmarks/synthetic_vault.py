@@ -0,0 +1,115 @@
+"""
+合成日记目录生成器（供 benchmarks 下的脚本使用）
+按 build_template 的格式每天写一个 YYYYMMDD.md
+- 正文由日程、长短不一的随笔和运动情况组成，随机跳过一些日期
+- malformed > 0 时按比例写入头部有问题的文件（缺少结束的 ---、YAML 语法错误、缺少 Date、
+  Date 不是日期、空文件、未知的类别值），用于测量解析失败路径
+"""
+
+import pathlib
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from obsidian_daily import build_template, EMOTIONS, APPETITES, CONFIDENCES
+from vault_layout import layout_path, write_layout
+
+SAMPLE_SENTENCES = [
+    "今天早上跑了五公里，感觉状态不错。",
+    "下午开了三个会，效率一般。",
+    "晚上读了一会儿书，心情平静。",
+    "和朋友一起吃了火锅，聊了很多。",
+    "工作上遇到一个棘手的问题，还没解决。",
+    "天气转凉，出门忘了带伞，淋了一点雨。",
+    "给家里打了电话，妈妈说最近身体还好。",
+    "重构了一部分代码，测试终于全部通过了。",
+    "午饭吃得太多，下午一直犯困。",
+    "周末去公园散步，看到很多人在放风筝。",
+]
+ENGLISH_SENTENCES = [
+    "Reviewed the quarterly report and sent feedback to the team.",
+    "Finished reading chapter 7, the argument about habits was convincing.",
+    "Spent the evening fixing a flaky deployment script.",
+]
+# 单独成段的 Markdown 块
+SAMPLE_BLOCKS = ["- [ ] 整理房间\n- [x] 交水电费", "> 明天要早点起床。", "1. 买菜\n2. 取快递\n3. 还书"]
+SAMPLE_EVENTS = ["组会", "1:1 沟通", "项目评审", "Code review", "健身课", "牙医预约", "Weekly sync"]
+SAMPLE_EXERCISE = ["跑步 30 分钟", "游泳 1 小时", "瑜伽 20 分钟", "步行 8000 步", "", "休息"]
+LOCATIONS = ["东涌镇,中国,广东省,广州市 南沙区", "天河区,中国,广东省,广州市", "浦东新区,中国,上海市"]
+
+MALFORMED_KINDS = ("unterminated", "bad_yaml", "no_date", "bad_date", "empty", "unknown_value")
+
+
+def _events(rng, day):
+    events = []
+    for _ in range(rng.randint(0, 4)):
+        start = day.replace(hour=rng.randint(8, 18), minute=rng.choice((0, 30)))
+        events.append({"subject": rng.choice(SAMPLE_EVENTS), "start": start,
+                       "end": start + timedelta(minutes=rng.choice((30, 60, 90)))})
+    return sorted(events, key=lambda e: e["start"])
+
+
+def _diary(rng):
+    paragraphs = []
+    for _ in range(rng.randint(1, 6)):
+        roll = rng.random()
+        if roll < 0.15:
+            paragraphs.append(rng.choice(SAMPLE_BLOCKS))
+        elif roll < 0.3:
+            paragraphs.append(" ".join(rng.choice(ENGLISH_SENTENCES) for _ in range(rng.randint(1, 4))))
+        else:
+            paragraphs.append("".join(rng.choice(SAMPLE_SENTENCES) for _ in range(rng.randint(1, 8))))
+    return "\n\n".join(paragraphs)
+
+
+def _malform(content, kind):
+    header, sep, body = content[4:].partition("\n---\n")
+    if kind == "unterminated":
+        return "---\n" + header + "\n" + body
+    if kind == "bad_yaml":
+        return "---\n" + header + "\nEmotion: [未闭合\n---\n" + body
+    if kind == "no_date":
+        return "---\n" + "\n".join(l for l in header.splitlines() if not l.startswith("Date")) + sep + body
+    if kind == "bad_date":
+        return "---\n" + "\n".join("Date: 某天晚上" if l.startswith("Date") else l
+                                   for l in header.splitlines()) + sep + body
+    if kind == "empty":
+        return ""
+    return "---\n" + "\n".join("Emotion: 说不清" if l.startswith("Emotion") else l
+                               for l in header.splitlines()) + sep + body
+
+
+def generate_vault(base_dir: pathlib.Path, count: int, start=datetime(2000, 1, 1, 21, 30), seed=0,
+                   malformed=0.0, skip=0.0, layout="flat"):
+    """在 base_dir 下生成 count 篇日记，返回写入的文件数
+
+    从 start 开始每天一篇；skip 为随机跳过某天的概率，malformed 为头部有问题的文件比例；
+    layout 为 year / month 时按年或年月分片存放（见 vault_layout）
+    """
+    rng = random.Random(seed)
+    base_dir.mkdir(parents=True, exist_ok=True)
+    if layout != "flat":
+        write_layout(base_dir, layout)
+    day = start
+    for _ in range(count):
+        while skip and rng.random() < skip:
+            day += timedelta(days=1)
+        _, content = build_template(day, rng.choice(LOCATIONS), rng.choice(EMOTIONS), rng.choice(CONFIDENCES),
+                                    rng.choice(APPETITES), _diary(rng), rng.choice(SAMPLE_EXERCISE),
+                                    _events(rng, day))
+        if malformed and rng.random() < malformed:
+            content = _malform(content, rng.choice(MALFORMED_KINDS))
+        path = layout_path(base_dir, day, layout)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        day += timedelta(days=1)
+    return count
+
+
+if __name__ == "__main__":
+    target = pathlib.Path(sys.argv[1])
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    generate_vault(target, n)
+    print(f"已在 {target} 生成 {n} 篇日记")
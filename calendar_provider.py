@@ -0,0 +1,293 @@
+"""
+日程来源
+- CalendarProvider 接口：fetch_range(start, end) 一次查询返回 {date: [event, ...]}
+- OutlookProvider：通过 COM 读取本地 Outlook，所有查询在同一个专用线程中执行并复用连接，失败时重连一次
+- ICSProvider / StaticProvider：读取本地 .ics 文件或内存中的事件，用于测试和没有 Outlook 的环境
+- CachedCalendar：按日期缓存（TTL），批量查询时只向来源请求缺失的日期区间
+事件格式与 build_template 一致：{"subject": str, "start": datetime, "end": datetime}
+"""
+
+import atexit
+import logging
+import pathlib
+import queue
+import threading
+import time as _time
+from concurrent.futures import Future
+from datetime import datetime, date, time, timedelta
+
+# Outlook 用
+try:
+    import win32com.client
+except Exception:
+    win32com = None
+
+try:
+    import pythoncom
+except Exception:
+    pythoncom = None
+
+
+def _days(start: date, end: date):
+    d = start
+    while d <= end:
+        yield d
+        d += timedelta(days=1)
+
+
+class CalendarProvider:
+    """日程来源接口"""
+
+    available = True
+
+    def fetch_range(self, start: date, end: date):
+        """返回 [start, end] 闭区间内每天的事件 {date: [event, ...]}（没有事件的日期可以省略）"""
+        raise NotImplementedError
+
+    def fetch_day(self, day: date):
+        return self.fetch_range(day, day).get(day, [])
+
+    def stop(self):
+        """释放来源占用的资源（线程、连接）；之后再查询时重新建立"""
+
+
+class OutlookProvider(CalendarProvider):
+    """本地 Outlook 日历
+
+    COM 对象只能在创建它的线程中使用：第一次查询时启动一个专用线程（CoInitialize 一次），
+    各线程的查询都放入它的队列、等待 Future 的结果；stop() 结束该线程并 CoUninitialize
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._queue = None
+        self._thread_lock = threading.Lock()
+        # 只在 COM 线程中访问
+        self._items_cache = None
+
+    @property
+    def available(self):
+        return win32com is not None
+
+    def _run(self, tasks):
+        if pythoncom is not None:
+            pythoncom.CoInitialize()
+        try:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    break
+                future, start, end = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._fetch(start, end))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            # COM 对象必须在 CoUninitialize 之前释放
+            self._items_cache = None
+            if pythoncom is not None:
+                pythoncom.CoUninitialize()
+
+    def _submit(self, start: date, end: date):
+        future = Future()
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                # 每个线程使用自己的队列，stop() 之后新启动的线程不会取到旧线程的结束标记
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name="outlook-com", daemon=True)
+                self._thread.start()
+            self._queue.put((future, start, end))
+        return future
+
+    def stop(self, timeout=5):
+        with self._thread_lock:
+            thread, tasks = self._thread, self._queue
+            self._thread = self._queue = None
+        if thread is not None:
+            tasks.put(None)
+            thread.join(timeout)
+
+    def _items(self):
+        if self._items_cache is None:
+            outlook = win32com.client.Dispatch("Outlook.Application")
+            ns = outlook.GetNamespace("MAPI")
+            calendar = ns.GetDefaultFolder(9)  # olFolderCalendar
+            items = calendar.Items
+            items.IncludeRecurrences = True
+            items.Sort("[Start]")
+            self._items_cache = items
+        return self._items_cache
+
+    def _query(self, start: date, end: date):
+        first = datetime.combine(start, time.min)
+        last = datetime.combine(end, time.max)
+        # Outlook 的 Restrict 需要特定格式
+        restr = "[Start] >= '{}' AND [Start] <= '{}'".format(first.strftime("%m/%d/%Y %I:%M %p"),
+                                                             last.strftime("%m/%d/%Y %I:%M %p"))
+        result = {}
+        for it in self._items().Restrict(restr):
+            try:
+                event = {"subject": str(it.Subject), "start": it.Start, "end": it.End}
+                result.setdefault(it.Start.date(), []).append(event)
+            except Exception:
+                continue
+        return result
+
+    def _fetch(self, start: date, end: date):
+        try:
+            return self._query(start, end)
+        except Exception as e:
+            # Outlook 重启后旧连接会失效，丢弃后重连一次
+            logging.info(f"Outlook 连接失效，重新连接：{e}")
+            self._items_cache = None
+            return self._query(start, end)
+
+    def fetch_range(self, start: date, end: date):
+        if win32com is None:
+            logging.warning("pywin32 未安装或不可用，跳过 Outlook 集成。")
+            return {}
+        return self._submit(start, end).result()
+
+
+def _parse_ics_datetime(value: str):
+    value = value.strip()
+    if len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d")
+    # 忽略结尾的 Z（UTC）标记，与 Outlook 返回的本地时间一样按朴素时间处理
+    return datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+
+
+def parse_ics(text: str):
+    """解析 .ics 中的 VEVENT（只读取 DTSTART/DTEND/SUMMARY，不展开重复规则）"""
+    # 续行以空格或制表符开头
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        else:
+            lines.append(line)
+    events = []
+    current = None
+    for line in lines:
+        if line == "BEGIN:VEVENT":
+            current = {}
+        elif line == "END:VEVENT" and current is not None:
+            if "start" in current:
+                current.setdefault("end", current["start"])
+                current.setdefault("subject", "")
+                events.append(current)
+            current = None
+        elif current is not None and ":" in line:
+            name, value = line.split(":", 1)
+            name = name.split(";", 1)[0].upper()
+            try:
+                if name == "DTSTART":
+                    current["start"] = _parse_ics_datetime(value)
+                elif name == "DTEND":
+                    current["end"] = _parse_ics_datetime(value)
+                elif name == "SUMMARY":
+                    current["subject"] = value.replace("\\,", ",").replace("\\;", ";").replace("\\n", " ")
+            except ValueError:
+                logging.debug(f"无法解析 ICS 行：{line}")
+    return events
+
+
+class StaticProvider(CalendarProvider):
+    """内存中的固定事件列表"""
+
+    def __init__(self, events=()):
+        self.events = sorted(events, key=lambda e: e["start"])
+        self.queries = 0
+
+    def fetch_range(self, start: date, end: date):
+        self.queries += 1
+        result = {}
+        for e in self.events:
+            d = e["start"].date()
+            if start <= d <= end:
+                result.setdefault(d, []).append(e)
+        return result
+
+
+class ICSProvider(StaticProvider):
+    """本地 .ics 文件；文件修改后自动重新读取"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = pathlib.Path(path)
+        self._mtime = None
+
+    def fetch_range(self, start: date, end: date):
+        mtime = self.path.stat().st_mtime_ns
+        if mtime != self._mtime:
+            self.events = sorted(parse_ics(self.path.read_text(encoding="utf-8")), key=lambda e: e["start"])
+            self._mtime = mtime
+        return super().fetch_range(start, end)
+
+
+class CachedCalendar(CalendarProvider):
+    """按日期缓存另一个来源的结果；fetch_range 只对缺失或过期的日期发起一次区间查询"""
+
+    def __init__(self, provider: CalendarProvider, ttl=300):
+        self.provider = provider
+        self.ttl = ttl
+        self._cache = {}  # date -> (过期时间, events)
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self.provider.available
+
+    def stop(self):
+        self.provider.stop()
+
+    def fetch_range(self, start: date, end: date):
+        now = _time.monotonic()
+        with self._lock:
+            missing = [d for d in _days(start, end) if d not in self._cache or self._cache[d][0] <= now]
+        if missing:
+            fetched = self.provider.fetch_range(missing[0], missing[-1])
+            expires = _time.monotonic() + self.ttl
+            with self._lock:
+                for d in _days(missing[0], missing[-1]):
+                    self._cache[d] = (expires, fetched.get(d, []))
+        with self._lock:
+            return {d: self._cache[d][1] for d in _days(start, end) if self._cache.get(d, (0, []))[1]}
+
+    def invalidate(self, day: date = None):
+        with self._lock:
+            if day is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(day, None)
+
+
+_default_calendars = {}
+_default_calendar_lock = threading.Lock()
+
+
+def _stop_default_calendars():
+    with _default_calendar_lock:
+        calendars = list(_default_calendars.values())
+    for calendar in calendars:
+        calendar.stop()
+
+
+atexit.register(_stop_default_calendars)
+
+
+def get_default_calendar(ics_path=None, ttl=300) -> CachedCalendar:
+    """进程内共享的日程来源：指定 ics_path 时读取 .ics 文件，否则使用 Outlook
+
+    按 (ics_path, ttl) 分别共享，参数不同的调用方不会拿到别人的来源
+    """
+    key = (str(pathlib.Path(ics_path).resolve()) if ics_path else None, ttl)
+    with _default_calendar_lock:
+        calendar = _default_calendars.get(key)
+        if calendar is None:
+            provider = ICSProvider(ics_path) if ics_path else OutlookProvider()
+            calendar = _default_calendars[key] = CachedCalendar(provider, ttl=ttl)
+        return calendar
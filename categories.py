@@ -0,0 +1,48 @@
+"""
+日记中可选的类别及其颜色
+diary_gui 的按钮和 Pillow 热力图共用同一套颜色；本模块没有副作用，可以在任何地方导入
+"""
+
+EMOTIONS = ["开心😊", "幸福🥰", "兴奋🤩", "自豪😎", "平静😐", "痛苦😫", "悲伤☹️", "疲惫😭", "生病😷", "气愤😡", "成就🥂", "心流🧘"]
+APPETITES = ["食欲稳定🥗", "想吃辣的🌶", "想吃碳水🍜"]
+CONFIDENCES = ["自信满满", "自我怀疑"]
+
+# 为每个情绪选项定义颜色
+EMOTION_COLORS = {
+    "开心😊": "#FFD700",      # 金色
+    "幸福🥰": "#FF69B4",      # 粉红色
+    "兴奋🤩": "#FF4500",      # 橙红色
+    "自豪😎": "#4169E1",      # 皇家蓝
+    "平静😐": "#87CEEB",      # 天蓝色
+    "痛苦😫": "#8B4513",      # 棕色
+    "悲伤☹️": "#4682B4",      # 钢蓝色
+    "疲惫😭": "#708090",      # 灰石色
+    "生病😷": "#98FB98",      # 淡绿色
+    "气愤😡": "#DC143C",      # 深红色
+    "成就🥂": "#FFD700",      # 金色
+    "心流🧘": "#9370DB"       # 中紫色
+}
+
+# 为每个食欲选项定义颜色
+APPETITE_COLORS = {
+    "食欲稳定🥗": "#90EE90",  # 浅绿色
+    "想吃辣的🌶": "#FF6347",  # 番茄红
+    "想吃碳水🍜": "#FFA500"   # 橙色
+}
+
+# 为每个自信选项定义颜色
+CONFIDENCE_COLORS = {
+    "自信满满": "#32CD32",    # 酸橙绿
+    "自我怀疑": "#FFB6C1"     # 浅粉色
+}
+
+# frontmatter 字段 -> 颜色表
+FIELD_COLORS = {"Emotion": EMOTION_COLORS, "Appetite": APPETITE_COLORS, "Confidence": CONFIDENCE_COLORS}
+# 颜色表里没有的类别（例如手动编辑过的日记）
+FALLBACK_COLOR = "#C0C0C0"
+
+
+def category_colors(field, labels):
+    """按 labels 的顺序返回颜色（#RRGGBB）"""
+    colors = FIELD_COLORS.get(field, {})
+    return [colors.get(label, FALLBACK_COLOR) for label in labels]
@@ -1,10 +1,15 @@
 import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
 import pathlib
 import frontmatter
 import logging
 from config import BASE_DIR
+from atomic_write import atomic_write
+from vault_layout import entry_path
+from categories import (EMOTIONS, APPETITES, CONFIDENCES,
+                        EMOTION_COLORS, APPETITE_COLORS, CONFIDENCE_COLORS)
 
 # 尝试导入tkcalendar，如果不可用则使用备用方案
 try:
@@ -13,40 +18,6 @@ try:
 except ImportError:
     HAS_TKCALENDAR = False
 
-# Constants
-EMOTIONS = ["开心😊", "幸福🥰", "兴奋🤩", "自豪😎", "平静😐", "痛苦😫", "悲伤☹️", "疲惫😭", "生病😷", "气愤😡", "成就🥂", "心流🧘"]
-APPETITES = ["食欲稳定🥗", "想吃辣的🌶", "想吃碳水🍜"]
-CONFIDENCES = ["自信满满", "自我怀疑"]
-
-# 为每个情绪选项定义颜色
-EMOTION_COLORS = {
-    "开心😊": "#FFD700",      # 金色
-    "幸福🥰": "#FF69B4",      # 粉红色
-    "兴奋🤩": "#FF4500",      # 橙红色
-    "自豪😎": "#4169E1",      # 皇家蓝
-    "平静😐": "#87CEEB",      # 天蓝色
-    "痛苦😫": "#8B4513",      # 棕色
-    "悲伤☹️": "#4682B4",      # 钢蓝色
-    "疲惫😭": "#708090",      # 灰石色
-    "生病😷": "#98FB98",      # 淡绿色
-    "气愤😡": "#DC143C",      # 深红色
-    "成就🥂": "#FFD700",      # 金色
-    "心流🧘": "#9370DB"       # 中紫色
-}
-
-# 为每个食欲选项定义颜色
-APPETITE_COLORS = {
-    "食欲稳定🥗": "#90EE90",  # 浅绿色
-    "想吃辣的🌶": "#FF6347",  # 番茄红
-    "想吃碳水🍜": "#FFA500"   # 橙色
-}
-
-# 为每个自信选项定义颜色
-CONFIDENCE_COLORS = {
-    "自信满满": "#32CD32",    # 酸橙绿
-    "自我怀疑": "#FFB6C1"     # 浅粉色
-}
-
 # Ensure the base directory exists
 BASE_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -68,9 +39,21 @@ def write_frontmatter_file(filename, meta, body):
                 value = f'"{value}"'
             frontmatter_content += f"{key}: {value}\n"
     frontmatter_content += "---\n\n"
-    
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(frontmatter_content + body)
+
+    # 先写临时文件再替换，避免崩溃或同步客户端读到写了一半的文件
+    written, digest = atomic_write(filename, frontmatter_content + body)
+    return digest
+
+# 保存后更新热力图的后台线程；只有一个线程，多次保存按顺序处理，退出时等待未完成的更新
+heatmap_updates = ThreadPoolExecutor(max_workers=1, thread_name_prefix="heatmap-update")
+
+def update_heatmaps(filename):
+    # 已生成过的热力图只增量更新这一天所在的年份，不重新扫描整个目录
+    try:
+        from obsidian_daily import update_heatmaps_for_entry
+        update_heatmaps_for_entry(BASE_DIR, filename)
+    except Exception as e:
+        logging.error(f"更新热力图失败: {e}")
 
 def save_diary(location, emotion, appetite, confidence, diary_text, selected_date):
     """保存日记到指定日期"""
@@ -78,7 +61,8 @@ def save_diary(location, emotion, appetite, confidence, diary_text, selected_dat
     if isinstance(selected_date, date):
         selected_date = datetime.combine(selected_date, datetime.min.time())
     
-    filename = BASE_DIR / f"{selected_date.strftime('%Y%m%d')}.md"
+    # 与其他写入入口一致：按目录布局（平铺 / 年 / 年月分片）解析路径
+    filename = entry_path(BASE_DIR, selected_date.date())
 
     if filename.exists():
         if not messagebox.askyesno("覆盖确认", f"文件 {filename.name} 已存在，是否覆盖？"):
@@ -96,6 +80,9 @@ def save_diary(location, emotion, appetite, confidence, diary_text, selected_dat
 
     write_frontmatter_file(filename, meta, body)
 
+    # 热力图在后台线程中更新，保存后界面立即响应
+    heatmap_updates.submit(update_heatmaps, filename)
+
     messagebox.showinfo("成功", f"日记已保存到 {filename}")
 
 def create_rounded_button(parent, text, command, bg_color="#4A154B", fg_color="white", width=15):
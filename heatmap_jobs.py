@@ -0,0 +1,116 @@
+"""
+热力图后台任务队列
+- POST 提交后立即返回任务 id，渲染在有界线程池中进行
+- 同一目录、同一年份已在排队或运行的任务会被复用（合并重复请求）
+- 多个日记目录（vault）共用一个线程池，任务记录各自的目录
+- 任务状态包含进度：已扫描文件数、已完成/总图片数
+"""
+
+import logging
+import pathlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from obsidian_daily import generate_all_heatmaps
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class HeatmapJob:
+    def __init__(self, year, backend="matplotlib", base_dir: pathlib.Path = None):
+        self.id = uuid.uuid4().hex
+        self.base_dir = base_dir
+        self.year = year
+        self.backend = backend
+        self.status = QUEUED
+        self.progress = {"files_scanned": 0, "images_done": 0, "images_total": 0}
+        self.report = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "year": self.year,
+            "backend": self.backend,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "report": self.report,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class HeatmapJobQueue:
+    """有界线程池 + 按 (目录, 年份, 后端) 合并的任务表；base_dir 为 submit 未指定目录时的默认目录"""
+
+    def __init__(self, base_dir: pathlib.Path = None, max_workers=2, keep_finished=100):
+        self.base_dir = pathlib.Path(base_dir) if base_dir else None
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="heatmap-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}  # (base_dir, year, backend) -> 排队中/运行中的任务
+
+    def submit(self, year, backend="matplotlib", base_dir: pathlib.Path = None):
+        """提交任务，返回 (job, 是否新建)；同一目录、年份、后端已有未完成任务时直接返回该任务"""
+        base_dir = pathlib.Path(base_dir) if base_dir else self.base_dir
+        if base_dir is None:
+            raise ValueError("没有指定日记目录")
+        key = (base_dir, year, backend)
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job, False
+            job = HeatmapJob(year, backend, base_dir)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._trim()
+        self._pool.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _trim(self):
+        # 只保留最近 keep_finished 个已结束的任务
+        finished = [jid for jid, j in self._jobs.items() if j.status in (DONE, FAILED)]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
+
+    def _run(self, job):
+        def progress(**counts):
+            with self._lock:
+                job.progress.update(counts)
+
+        with self._lock:
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            report = generate_all_heatmaps(job.base_dir, job.year, progress=progress, backend=job.backend)
+            status, error = DONE, None
+        except Exception as e:
+            logging.error(f"Error generating heatmaps for {job.year}: {e}")
+            report, status, error = None, FAILED, str(e)
+        with self._lock:
+            job.report = report
+            job.error = error
+            job.status = status
+            job.finished_at = time.time()
+            key = (job.base_dir, job.year, job.backend)
+            if self._active.get(key) is job:
+                del self._active[key]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
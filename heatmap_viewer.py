@@ -1,40 +1,118 @@
-from flask import Flask, render_template, request, send_from_directory
+from flask import Blueprint, Flask, jsonify, render_template, request, url_for
 import pathlib
 import logging
-from obsidian_daily import generate_all_heatmaps
+import metrics
+from heatmap_jobs import HeatmapJobQueue
+from journal_api import parse_calendar_args, parse_year
+from memory_cache import memory_cache
+from http_cache import conditional_response, file_version, send_versioned_file, versioned_listing
+from obsidian_daily import BACKENDS, calendar_payload
+from vault_watcher import start_watcher
+from vaults import current_vault, load_registry, register_vault_blueprint
+
+try:
+    # Same config.py as app.py (BASE_DIR / VAULTS), when present
+    import config
+except ImportError:
+    config = None
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Set the base directory for heatmaps
-BASE_DIR = pathlib.Path(r"D:\jianguo\我的坚果云\obsidian\Personal\2026")
-HEATMAP_DIR = BASE_DIR / "heatmaps"
+# Default journal directory when there is no config.py; config.VAULTS adds more under /v/<id>/
+DEFAULT_BASE_DIR = pathlib.Path(r"D:\jianguo\我的坚果云\obsidian\Personal\2026")
+vaults = load_registry(config, DEFAULT_BASE_DIR)
+if getattr(config, "CACHE_BUDGET_MB", None):
+    memory_cache.configure(budget=config.CACHE_BUDGET_MB * 1024 * 1024)
+# WATCH_VAULT = True in config.py keeps the metadata index hot with a filesystem watcher instead of rescanning per job
+WATCH_VAULT = getattr(config, "WATCH_VAULT", False)
+# METRICS_LOG = True in config.py logs every timing span as one JSON line in addition to the /metrics endpoint
+METRICS_LOG = getattr(config, "METRICS_LOG", False)
+
+# Bounded pool for heatmap rendering jobs, shared by all vaults
+jobs = HeatmapJobQueue(max_workers=2)
+
+# Request timings plus scan/render stage spans, exposed at /metrics in Prometheus text format
+metrics.instrument_app(app)
+if METRICS_LOG:
+    metrics.enable_json_log()
 
-@app.route('/')
+# Routes are mounted at "/" for the default vault and at /v/<id>/ for the others (see vaults.py)
+viewer = Blueprint("viewer", __name__)
+
+@viewer.route('/')
 def index():
     # Render the main page with options
     return render_template('index.html')
 
-@app.route('/generate', methods=['POST'])
+@viewer.route('/generate', methods=['POST'])
 def generate_heatmaps():
-    year = request.form.get('year', None)
-    if not year or not year.isdigit():
-        return "Invalid year provided.", 400
+    try:
+        year = parse_year(request.form.get('year'))
+    except ValueError as e:
+        return str(e), 400
+    # "pillow" skips matplotlib and is much faster for server-side rendering
+    backend = request.form.get('backend', 'matplotlib')
+    if backend not in BACKENDS:
+        return f"Invalid backend, expected one of: {', '.join(BACKENDS)}.", 400
+
+    # Rendering runs in the background; poll /jobs/<job_id> for progress
+    job, created = jobs.submit(year, backend, current_vault())
+    response = jsonify({**job.to_dict(), "coalesced": not created})
+    response.status_code = 202
+    response.headers["Location"] = url_for(".job_status", job_id=job.id)
+    return response
 
-    year = int(year)
+def heatmap_url(filename):
+    # Content-hashed URL: changes only when the image does, so browsers can cache it forever
+    version = file_version(current_vault() / "heatmaps", filename)
+    return url_for(".serve_heatmap", filename=filename, v=version) if version else None
+
+@viewer.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    # Jobs of other vaults are reported as unknown
+    if job is None or job.base_dir != current_vault():
+        return jsonify({"error": "Unknown job."}), 404
+    status = job.to_dict()
+    if job.report:
+        status["urls"] = {name: heatmap_url(name) for name in job.report["hits"] + job.report["misses"]}
+    return jsonify(status)
+
+@viewer.route('/heatmaps/')
+def list_heatmaps():
+    # Poll this instead of re-fetching images: it answers 304 until some image changes
+    etag, data = versioned_listing(current_vault() / "heatmaps",
+                                   lambda name, version: url_for(".serve_heatmap", filename=name, v=version))
+    return conditional_response(data, etag, "application/json")
+
+@viewer.route('/heatmap_data')
+def heatmap_data():
+    # Calendar data for client-side rendering in index.html; unchanged data answers 304.
+    # Same parameters and validation as app.py: year (default: current year), fields
     try:
-        generate_all_heatmaps(BASE_DIR, year)
-        return f"Heatmaps for {year} generated successfully!"
+        year, fields = parse_calendar_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        etag, data = calendar_payload(current_vault(), year, fields)
     except Exception as e:
-        logging.error(f"Error generating heatmaps: {e}")
-        return f"Failed to generate heatmaps: {e}", 500
+        logging.error(f"Error building heatmap data: {e}")
+        return jsonify({"error": "Failed to build heatmap data."}), 500
+    return conditional_response(data, etag, "application/json")
 
-@app.route('/heatmaps/<filename>')
+@viewer.route('/heatmaps/<filename>')
 def serve_heatmap(filename):
-    # Serve heatmap images from the heatmap directory
-    return send_from_directory(HEATMAP_DIR, filename)
+    # Serve heatmap images from the heatmap directory with a content-hash ETag;
+    # URLs carrying the current ?v= version are cached as immutable
+    return send_versioned_file(current_vault() / "heatmaps", filename, request.args.get('v'))
+
+register_vault_blueprint(app, viewer, vaults)
 
 if __name__ == '__main__':
-    # Ensure the heatmap directory exists
-    HEATMAP_DIR.mkdir(exist_ok=True)
+    for _, vault_dir in vaults.items():
+        # Ensure the heatmap directory exists
+        (vault_dir / "heatmaps").mkdir(exist_ok=True)
+        if WATCH_VAULT:
+            start_watcher(vault_dir)
     app.run(debug=True)
\ No newline at end of file
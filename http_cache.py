@@ -0,0 +1,148 @@
+"""
+HTTP 缓存工具（app.py、heatmap_viewer.py 与 asgi.py 共用）
+- 强 ETag + If-None-Match：内容未变时返回 304，不再传输正文
+- 客户端支持时返回 gzip 压缩的正文，压缩结果按 ETag 缓存
+- 静态文件（热力图 PNG）以内容哈希作为 ETag 和 URL 中的版本号；带当前版本号的 URL 可以永久缓存
+判断 304、选择表示和生成响应头的部分（conditional、file_not_modified、file_headers）只依赖 werkzeug 的请求对象，
+Flask 的 request 和 asgi.Request 都可以传入，两种服务的缓存行为因此完全一致
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, abort, request, send_from_directory
+from werkzeug.http import quote_etag
+from werkzeug.security import safe_join
+
+import metrics
+from metadata_index import content_hash
+
+# 压缩结果缓存 {etag: gzip bytes}，只保留最近的若干条
+GZIP_CACHE_SIZE = 64
+GZIP_MIN_SIZE = 512
+_gzip_cache = OrderedDict()
+_gzip_lock = threading.Lock()
+
+
+def _gzip(etag, data: bytes):
+    with _gzip_lock:
+        cached = _gzip_cache.get(etag)
+        if cached is not None:
+            _gzip_cache.move_to_end(etag)
+            return cached
+    compressed = gzip.compress(data, compresslevel=6, mtime=0)
+    with _gzip_lock:
+        _gzip_cache[etag] = compressed
+        while len(_gzip_cache) > GZIP_CACHE_SIZE:
+            _gzip_cache.popitem(last=False)
+    return compressed
+
+
+def conditional(req, data: bytes, etag: str, cache_control="no-cache", compress=True):
+    """按请求头决定返回 304、gzip 还是原始正文，返回 (status, 正文, 响应头)"""
+    use_gzip = compress and len(data) >= GZIP_MIN_SIZE and req.accept_encodings["gzip"] > 0
+    # 压缩与未压缩是两种表示，ETag 需要区分
+    tag = f"{etag}-gz" if use_gzip else etag
+    headers = {"ETag": quote_etag(tag), "Cache-Control": cache_control}
+    if compress:
+        headers["Vary"] = "Accept-Encoding"
+    if req.if_none_match.contains(tag):
+        metrics.inc("http_conditional_total", result="not_modified")
+        return 304, b"", headers
+    metrics.inc("http_conditional_total", result="full")
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return 200, _gzip(etag, data), headers
+    return 200, data, headers
+
+
+def conditional_response(data: bytes, etag: str, mimetype, cache_control="no-cache", compress=True):
+    """带 ETag 的 Flask 响应；If-None-Match 命中时返回 304
+
+    cache_control 默认 no-cache：浏览器每次都会带 If-None-Match 重新验证，内容未变时只收到 304
+    """
+    status, body, headers = conditional(request, data, etag, cache_control, compress)
+    response = Response(status=304) if status == 304 else Response(body, mimetype=mimetype)
+    response.headers.update(headers)
+    return response
+
+
+# 带版本号的 URL 内容永远不变，可以缓存一年且不必重新验证
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+VERSION_LENGTH = 16
+# 文件内容哈希 {路径: (mtime_ns, size, digest)}；mtime/size 不变时不重新读取文件
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """文件内容的 SHA-1；文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _file_digests_lock:
+        cached = _file_digests.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    try:
+        with open(path, "rb") as f:
+            digest = content_hash(f.read())
+    except OSError:
+        return None
+    with _file_digests_lock:
+        _file_digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def file_version(directory, filename):
+    """URL 中使用的版本号（内容哈希的前缀）；文件不存在时返回 None"""
+    path = safe_join(os.fspath(directory), filename)
+    digest = file_digest(path) if path else None
+    return digest[:VERSION_LENGTH] if digest else None
+
+
+def versioned_listing(directory, url_for_file, pattern="*.png"):
+    """目录中文件名 -> 带版本号 URL 的 JSON 清单，返回 (etag, bytes)，供 conditional_response 使用
+
+    url_for_file(filename, version) 生成 URL；内容未变的图片 URL 不变，浏览器直接使用缓存
+    """
+    import json
+    import pathlib
+    listing = {}
+    for path in sorted(pathlib.Path(directory).glob(pattern)):
+        version = file_version(directory, path.name)
+        if version:
+            listing[path.name] = url_for_file(path.name, version)
+    data = json.dumps(listing, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return content_hash(data), data
+
+
+def file_not_modified(req, digest):
+    """If-None-Match 是否与文件的内容哈希匹配（弱比较，与 werkzeug 的条件请求一致）"""
+    return req.if_none_match.contains_weak(digest)
+
+
+def file_headers(digest, version=None):
+    """ETag 与 Cache-Control：version 与当前内容一致时（URL 形如 ?v=<版本号>）按不可变资源缓存，否则每次重新验证"""
+    immutable = version and version == digest[:VERSION_LENGTH]
+    return {"ETag": quote_etag(digest), "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"}
+
+
+def send_versioned_file(directory, filename, version=None):
+    """以内容哈希为 ETag 发送文件，If-None-Match 命中时返回 304"""
+    path = safe_join(os.fspath(directory), filename)
+    digest = file_digest(path) if path else None
+    if digest is None:
+        abort(404)
+    if file_not_modified(request, digest):
+        metrics.inc("http_conditional_total", result="not_modified")
+        response = Response(status=304)
+    else:
+        metrics.inc("http_conditional_total", result="full")
+        response = send_from_directory(directory, filename, etag=False, conditional=False)
+        response.headers.pop("Expires", None)
+    response.headers.update(file_headers(digest, version))
+    return response
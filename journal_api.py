@@ -0,0 +1,219 @@
+"""
+Framework-independent pieces of the journal HTTP API, shared by app.py (Flask/WSGI) and asgi.py
+- query-parameter parsing and validation (errors are raised as ValueError with the client-facing message)
+- /get_history row projection, pagination cursors and format negotiation
+- building and writing the diary file for /save_diary
+- whole handlers for /get_outlook and /save_diary, returning (status, JSON payload)
+Requests are werkzeug request objects (Flask's request, or asgi.Request), so query strings with
+repeated parameters, Accept and If-None-Match headers are interpreted the same way by both servers.
+"""
+
+import base64
+import json
+import logging
+import pathlib
+from datetime import date, datetime
+
+import frontmatter
+
+from atomic_write import atomic_write
+from obsidian_daily import FIELDS, update_heatmaps_for_entry
+from vault_layout import entry_path
+
+DEFAULT_LOCATION = "东涌镇,中国,广东省,广州市 南沙区"
+
+# Columns of MetadataIndex.page() rows exposed by /get_history
+HISTORY_FIELDS = {
+    "date": lambda row: row[2],
+    "day": lambda row: date.fromordinal(row[1]).isoformat() if row[1] else None,
+    "emotion": lambda row: row[3],
+    "appetite": lambda row: row[4],
+    "confidence": lambda row: row[5],
+}
+DEFAULT_HISTORY_FIELDS = ("date", "emotion", "appetite", "confidence")
+# Page size used when streaming without a limit
+HISTORY_STREAM_BATCH = 500
+HISTORY_TYPES = ("application/json", "application/x-ndjson")
+# The first /get_history page rescans the vault (stat of every file) only when the last scan of the
+# same years is older than this many seconds, so clients polling in a loop do not stat the vault
+# on every request; diaries saved through this process are indexed immediately either way
+HISTORY_SYNC_MAX_AGE = 2.0
+# /save_diary bodies larger than this are rejected with 413
+MAX_BODY_SIZE = 1024 * 1024
+# JSON bodies of routing errors
+ERROR_MESSAGES = {404: "Not found.", 405: "Method not allowed.", 413: "Request body too large."}
+
+
+def format_event(event):
+    return {
+        "subject": event["subject"],
+        "start": event["start"].strftime('%Y-%m-%d %H:%M:%S'),
+        "end": event["end"].strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def parse_date_arg(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' date, expected YYYY-MM-DD.")
+
+
+def parse_year(value, default=None):
+    """'year' parameter -> int in 1..9999; default when the parameter is missing (None: required)"""
+    if not value:
+        if default is None:
+            raise ValueError("Missing 'year'.")
+        return default
+    if not (value.isascii() and value.isdigit()) or not 1 <= int(value) <= 9999:
+        raise ValueError("Invalid year provided, expected 1-9999.")
+    return int(value)
+
+
+def parse_calendar_args(args, today: date = None):
+    """/heatmap_data query parameters -> (year, fields); year defaults to the current year"""
+    year = parse_year(args.get("year"), (today or date.today()).year)
+    fields = tuple(f.strip() for f in args.get("fields", "").split(",") if f.strip()) or FIELDS
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(FIELDS)}.")
+    return year, fields
+
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row[1], row[0]]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        day, name = json.loads(base64.urlsafe_b64decode(value.encode("ascii")))
+        if (day is not None and not isinstance(day, int)) or not isinstance(name, str):
+            raise ValueError
+        return day, name
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+def parse_history_fields(value):
+    if not value:
+        return DEFAULT_HISTORY_FIELDS
+    fields = tuple(f.strip() for f in value.split(",") if f.strip())
+    unknown = [f for f in fields if f not in HISTORY_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(HISTORY_FIELDS)}.")
+    return fields
+
+
+def parse_history_args(args):
+    """/get_history query parameters -> (start, end, limit, after, fields); args is any mapping with .get()"""
+    start = parse_date_arg(args.get("from"), "from")
+    end = parse_date_arg(args.get("to"), "to")
+    limit = args.get("limit")
+    if limit is not None:
+        if not limit.isdigit() or int(limit) <= 0:
+            raise ValueError("'limit' must be a positive integer.")
+        limit = int(limit)
+    after = decode_cursor(args.get("cursor"))
+    fields = parse_history_fields(args.get("fields"))
+    return start, end, limit, after, fields
+
+
+def project_row(row, fields):
+    return {f: HISTORY_FIELDS[f](row) for f in fields}
+
+
+def wants_ndjson(req):
+    """format=ndjson, or an Accept header preferring application/x-ndjson over application/json"""
+    return (req.args.get("format") == "ndjson"
+            or req.accept_mimetypes.best_match(HISTORY_TYPES) == "application/x-ndjson")
+
+
+def outlook_events(calendar, args, today: date = None):
+    """/get_outlook -> (status, payload)
+
+    Without from/to returns today's events as a list; otherwise the whole range is fetched in one
+    query and returned as {"YYYY-MM-DD": [events]}
+    """
+    try:
+        start = parse_date_arg(args.get("from"), "from")
+        end = parse_date_arg(args.get("to"), "to")
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    if not calendar.available:
+        return 503, {"error": "Outlook integration is not available."}
+    try:
+        if start is None and end is None:
+            return 200, [format_event(e) for e in calendar.fetch_day(today or date.today())]
+        start = start or end
+        end = end or start
+        if end < start:
+            return 400, {"error": "'to' must not be earlier than 'from'."}
+        events = calendar.fetch_range(start, end)
+        return 200, {d.isoformat(): [format_event(e) for e in events[d]] for d in sorted(events)}
+    except Exception as e:
+        logging.error(f"Error fetching Outlook events: {e}")
+        return 500, {"error": "Failed to fetch Outlook events."}
+
+
+def build_diary(data, now: datetime):
+    """/save_diary JSON body -> file content"""
+    meta = {
+        "Date": now.isoformat(),
+        "Location": data.get("location", DEFAULT_LOCATION),
+        "Emotion": data.get("emotion"),
+        "Confidence": data.get("confidence"),
+        "Appetite": data.get("appetite")
+    }
+    body = "\n".join([
+        "## 今日日程",
+        "",
+        *[f"- {event['start']} - {event['end']}: {event['subject']}" for event in data.get("events", [])],
+        "",
+        "## 随笔",
+        "",
+        data.get("diary", "")
+    ])
+    return frontmatter.dumps(frontmatter.Post(body, **meta))
+
+
+def write_diary(vault_dir: pathlib.Path, data, now: datetime = None):
+    """Write today's diary into vault_dir (at the path its layout gives) and return the path;
+    FileExistsError if it already exists"""
+    now = now or datetime.now()
+    filename = entry_path(pathlib.Path(vault_dir), now.date())
+    if filename.exists():
+        raise FileExistsError(filename)
+    atomic_write(filename, build_diary(data, now))
+    return filename
+
+
+def save_diary(vault_dir: pathlib.Path, content_type, body: bytes, now: datetime = None):
+    """/save_diary -> (status, payload); body is the raw request body (already checked against MAX_BODY_SIZE)"""
+    if "json" not in (content_type or ""):
+        return 415, {"error": "Expected an application/json body."}
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        return 400, {"error": "Invalid JSON."}
+    if not data:
+        return 400, {"error": "No data provided."}
+    if not isinstance(data, dict):
+        return 400, {"error": "Expected a JSON object."}
+
+    try:
+        try:
+            filename = write_diary(vault_dir, data, now)
+        except FileExistsError:
+            return 409, {"error": "Diary already exists."}
+        try:
+            update_heatmaps_for_entry(vault_dir, filename)
+        except Exception as e:
+            logging.error(f"Error updating heatmaps: {e}")
+        return 200, {"message": "Diary saved successfully."}
+    except Exception as e:
+        logging.error(f"Error saving diary: {e}")
+        return 500, {"error": "Failed to save diary."}
@@ -0,0 +1,129 @@
+"""
+多个日记目录（vault）共用的内存缓存
+- 条目按 (vault, 类型, 键) 存放，各 vault 之间互不可见
+- 所有 vault 共用一个字节预算，超出时按最近最少使用（LRU）淘汰，不区分来自哪个 vault
+- 单个 vault 最多占用预算的 vault_share；超出时先淘汰它自己最久未用的条目，大目录不会把其他目录挤出缓存
+- 大于单个 vault 上限的条目不缓存，调用方照常使用计算结果
+条目大小由调用方估算（numpy 数组的 nbytes、JSON 的字节数等），不追求精确
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+import metrics
+
+DEFAULT_BUDGET = 256 * 1024 * 1024
+DEFAULT_VAULT_SHARE = 0.5
+
+
+class MemoryCache:
+    def __init__(self, budget=DEFAULT_BUDGET, vault_share=DEFAULT_VAULT_SHARE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (vault, kind, key) -> (value, nbytes)，按最近使用排序
+        self._used = 0
+        self._vault_used = {}
+        self.configure(budget, vault_share)
+
+    def configure(self, budget=None, vault_share=None):
+        """修改预算；缩小时立即淘汰到新的预算以内"""
+        with self._lock:
+            if budget is not None:
+                self.budget = int(budget)
+            if vault_share is not None:
+                if not 0 < vault_share <= 1:
+                    raise ValueError("vault_share 必须在 (0, 1] 之间")
+                self.vault_share = vault_share
+            for vault in list(self._vault_used):
+                self._shrink_vault(vault)
+            self._shrink()
+
+    @property
+    def vault_limit(self):
+        return int(self.budget * self.vault_share)
+
+    def get(self, vault, kind, key, default=None):
+        with self._lock:
+            item = self._entries.get((vault, kind, key))
+            if item is None:
+                return default
+            self._entries.move_to_end((vault, kind, key))
+            return item[0]
+
+    def put(self, vault, kind, key, value, nbytes):
+        """放入条目；返回是否被缓存（超过单个 vault 上限时不缓存）"""
+        full_key = (vault, kind, key)
+        with self._lock:
+            self._remove(full_key)
+            if nbytes > self.vault_limit:
+                logging.debug(f"缓存条目 {kind} 大小 {nbytes} 超过单个 vault 上限，不缓存")
+                return False
+            self._entries[full_key] = (value, nbytes)
+            self._used += nbytes
+            self._vault_used[vault] = self._vault_used.get(vault, 0) + nbytes
+            self._shrink_vault(vault)
+            self._shrink()
+            return True
+
+    def pop(self, vault, kind, key):
+        with self._lock:
+            self._remove((vault, kind, key))
+
+    def drop_vault(self, vault):
+        """丢弃某个 vault 的全部条目"""
+        with self._lock:
+            for full_key in [k for k in self._entries if k[0] == vault]:
+                self._remove(full_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vault_used.clear()
+            self._used = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "vault_limit": self.vault_limit,
+                "used": self._used,
+                "entries": len(self._entries),
+                "vaults": {str(v): n for v, n in self._vault_used.items()},
+            }
+
+    def _remove(self, full_key):
+        item = self._entries.pop(full_key, None)
+        if item is None:
+            return
+        vault = full_key[0]
+        self._used -= item[1]
+        remaining = self._vault_used.get(vault, 0) - item[1]
+        if remaining > 0:
+            self._vault_used[vault] = remaining
+        else:
+            self._vault_used.pop(vault, None)
+
+    def _evict(self, full_key, reason):
+        self._remove(full_key)
+        metrics.inc("memory_cache_evictions_total", kind=full_key[1], reason=reason)
+
+    def _shrink_vault(self, vault):
+        while self._vault_used.get(vault, 0) > self.vault_limit:
+            # OrderedDict 从最久未用的一端开始找
+            self._evict(next(k for k in self._entries if k[0] == vault), "vault_share")
+
+    def _shrink(self):
+        while self._used > self.budget:
+            self._evict(next(iter(self._entries)), "budget")
+
+
+memory_cache = MemoryCache()
+
+
+def _gauges():
+    stats = memory_cache.stats()
+    return [("memory_cache_budget_bytes", {}, stats["budget"])] + [
+        ("memory_cache_bytes", {"vault": vault}, used) for vault, used in stats["vaults"].items()]
+
+
+metrics.register_gauges(_gauges)
@@ -0,0 +1,629 @@
+"""
+日记元数据索引
+- 把每个 .md（根目录和年/月分片目录中的，见 vault_layout） 解析出的 Date/Emotion/Appetite/Confidence 缓存到日记目录下的 .mdjournal/index.sqlite
+- 重新扫描时先比较 mtime/size，变化后再比较内容哈希，只重新解析新增或真正改动的文件
+- 已删除的文件会从索引中移除
+- 每个字段的计数按 日/周/月/年 预先汇总（rollups 表），随条目的增删改在同一事务中增量维护
+- 正文的全文检索倒排表（见 search_index）不在刷新时维护，第一次检索时才建立，之后按内容哈希增量补齐
+- frontmatter 只读到结束的 ---，扁平 key: value 直接切分，嵌套结构才交给 PyYAML
+"""
+
+import hashlib
+import io
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime, date
+
+import yaml
+
+import metrics
+import search_index
+from vault_layout import entry_name, list_entries
+
+INDEX_DIRNAME = ".mdjournal"
+INDEX_FILENAME = "index.sqlite"
+# 表结构变化时递增，旧索引会被丢弃重建
+SCHEMA_VERSION = 6
+# refresh(years=...) 的年份超过这个数时直接扫描全部分片
+MAX_SCOPED_YEARS = 100
+# 汇总粒度：day 为日期序数，week 为该周周一的序数，month 为 year*12 + month-1，year 为年份
+ROLLUP_LEVELS = ("day", "week", "month", "year")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name        TEXT PRIMARY KEY,
+    mtime_ns    INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    hash        TEXT NOT NULL,
+    ok          INTEGER NOT NULL,
+    day         INTEGER,
+    raw_date    TEXT,
+    emotion     TEXT,
+    appetite    TEXT,
+    confidence  TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_day ON entries(day, name);
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value       INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+CREATE TABLE IF NOT EXISTS rollups (
+    level       TEXT NOT NULL,
+    bucket      INTEGER NOT NULL,
+    field       TEXT NOT NULL,
+    label       TEXT NOT NULL,
+    count       INTEGER NOT NULL,
+    PRIMARY KEY (level, field, bucket, label)
+);
+"""
+
+
+def content_hash(data: bytes) -> str:
+    """文件内容哈希，用于判断 mtime 变了但内容没变的情况"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def resolve_entry_date(meta_date, path: pathlib.Path):
+    """优先使用 Date 元数据，失败时回退到文件名 YYYYMMDD.md"""
+    day = None
+    if isinstance(meta_date, datetime):
+        day = meta_date.date()
+    elif isinstance(meta_date, date):
+        day = meta_date
+    elif meta_date:
+        try:
+            day = datetime.fromisoformat(meta_date).date()
+        except Exception:
+            # 如果 Date 是纯日期字符串，尝试 parse
+            try:
+                day = datetime.strptime(meta_date, "%Y-%m-%d").date()
+            except Exception:
+                # 在进程池中解析时计入子进程，不会出现在 /metrics 中
+                metrics.inc("date_fallbacks_total")
+                day = None
+    if day is None:
+        try:
+            day = datetime.strptime(path.stem, "%Y%m%d").date()
+        except Exception:
+            return None
+    return day
+
+
+def _as_text(value):
+    if value is None:
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+FRONTMATTER_DELIMITER = "---"
+_YAML_NULLS = ("", "~", "null", "Null", "NULL")
+# 以这些字符开头的值可能是列表/映射/多行块/锚点等，交给 PyYAML
+_YAML_SPECIAL_STARTS = ("[", "{", "|", ">", "&", "*", "!", "%", "@", "`")
+
+
+def _parse_flat_value(value: str):
+    """解析 build_template / write_frontmatter_file 写出的标量值，无法确定时返回 NotImplemented"""
+    if value in _YAML_NULLS:
+        return None
+    if value.startswith(_YAML_SPECIAL_STARTS):
+        return NotImplemented
+    if value[0] == '"':
+        # 与写入端一致：只加引号不转义；含反斜杠时交给 YAML 处理转义
+        if len(value) < 2 or value[-1] != '"' or "\\" in value:
+            return NotImplemented
+        return value[1:-1]
+    if value[0] == "'":
+        if len(value) < 2 or value[-1] != "'":
+            return NotImplemented
+        return value[1:-1].replace("''", "'")
+    if " #" in value:
+        return NotImplemented
+    return value
+
+
+def parse_header_lines(lines):
+    """从行迭代器中解析 frontmatter，读到结束的 --- 即停止，不会消费正文"""
+    it = iter(lines)
+    first = next(it, None)
+    if first is None or first.lstrip("\ufeff").rstrip() != FRONTMATTER_DELIMITER:
+        return {}
+    header = []
+    meta = {}
+    needs_yaml = False
+    for line in it:
+        if line.rstrip() == FRONTMATTER_DELIMITER:
+            break
+        header.append(line)
+        if needs_yaml:
+            continue
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if line[0] in " \t" or stripped.startswith("- "):
+            # 缩进或列表项说明是嵌套结构
+            needs_yaml = True
+            continue
+        key, sep, value = line.partition(":")
+        key = key.strip()
+        if not sep or not key or key[0] in "\"'?":
+            needs_yaml = True
+            continue
+        value = _parse_flat_value(value.strip())
+        if value is NotImplemented:
+            needs_yaml = True
+            continue
+        meta[key] = value
+    else:
+        # 没有结束分隔符，不是合法的 frontmatter
+        return {}
+    if needs_yaml:
+        loaded = yaml.safe_load("".join(line if line.endswith("\n") else line + "\n" for line in header))
+        return loaded if isinstance(loaded, dict) else {}
+    return meta
+
+
+def read_frontmatter_header(path: pathlib.Path):
+    """流式读取文件头部的 frontmatter，不读取正文"""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_header_lines(f)
+
+
+def entry_from_metadata(meta: dict, path: pathlib.Path):
+    """把 frontmatter 字典整理成索引记录"""
+    return {
+        "date": resolve_entry_date(meta.get("Date"), path),
+        "Date": _as_text(meta.get("Date")),
+        "Emotion": _as_text(meta.get("Emotion")),
+        "Appetite": _as_text(meta.get("Appetite")),
+        "Confidence": _as_text(meta.get("Confidence")),
+    }
+
+
+def parse_entry(path: pathlib.Path, data: bytes):
+    """解析已读入内存的日记文件，返回记录字典；无法解析时抛出异常"""
+    return entry_from_metadata(parse_header_lines(io.StringIO(data.decode("utf-8"))), path)
+
+
+def read_entry(path: pathlib.Path):
+    """只读取文件头部并解析成记录字典"""
+    return entry_from_metadata(read_frontmatter_header(path), path)
+
+
+def _stat(path: pathlib.Path):
+    try:
+        return path.stat()
+    except OSError:
+        return None
+
+
+def _read(path: pathlib.Path):
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        logging.warning(f"读取 {path} 失败：{e}")
+        return None
+    return data, content_hash(data)
+
+
+def _safe_parse_entry(path: pathlib.Path, data: bytes):
+    try:
+        return parse_entry(path, data)
+    except Exception as e:
+        logging.debug(f"解析 {path} 失败：{e}")
+        return None
+
+
+def _safe_read_entry(path: pathlib.Path):
+    try:
+        return read_entry(path)
+    except Exception as e:
+        logging.debug(f"解析 {path} 失败：{e}")
+        return None
+
+
+def map_concurrently(func, items, workers=None):
+    """workers > 1 时用线程池执行 func（适合网络同步目录上的 I/O），结果顺序与输入一致"""
+    if not workers or workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+
+def parse_concurrently(items, workers=None, processes=False):
+    """解析 (path, data) 列表；processes=True 时交给进程池做 CPU 密集的 YAML 解析"""
+    if processes and workers and workers > 1 and len(items) > 1:
+        paths, datas = zip(*items)
+        chunksize = max(1, len(items) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_safe_parse_entry, paths, datas, chunksize=chunksize))
+    return map_concurrently(lambda item: _safe_parse_entry(*item), items, workers)
+
+
+def read_entries(paths, workers=None, processes=False):
+    """不经过索引直接解析一组文件，返回与 paths 顺序一致的记录（失败为 None）"""
+    if processes and workers and workers > 1 and len(paths) > 1:
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_safe_read_entry, paths, chunksize=chunksize))
+    return map_concurrently(_safe_read_entry, paths, workers)
+
+
+_FIELD_COLUMNS = {"Emotion": "emotion", "Appetite": "appetite", "Confidence": "confidence"}
+_EMPTY_ENTRY = {"date": None, "Date": None, "Emotion": None, "Appetite": None, "Confidence": None}
+
+
+def rollup_buckets(day: int):
+    """日期序数在各汇总粒度下所属的桶"""
+    d = date.fromordinal(day)
+    # 序数 1（0001-01-01）是周一
+    return {"day": day, "week": day - (day - 1) % 7, "month": d.year * 12 + d.month - 1, "year": d.year}
+
+
+def _apply_rollups(conn, day, labels, delta):
+    """把一条记录（day 序数, {field: label}）计入 / 移出汇总表"""
+    if day is None:
+        return
+    rows = [(level, bucket, field, label, delta)
+            for level, bucket in rollup_buckets(day).items()
+            for field, label in labels.items() if label]
+    conn.executemany(
+        "INSERT INTO rollups (level, bucket, field, label, count) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (level, field, bucket, label) DO UPDATE SET count = count + excluded.count", rows)
+    if delta < 0:
+        conn.executemany(
+            "DELETE FROM rollups WHERE level = ? AND bucket = ? AND field = ? AND label = ? AND count <= 0",
+            [row[:4] for row in rows])
+
+
+def _unapply_existing(conn, name):
+    """从汇总中移除该文件当前在索引里的记录"""
+    row = conn.execute("SELECT ok, day, emotion, appetite, confidence FROM entries WHERE name = ?",
+                       (name,)).fetchone()
+    if row and row[0]:
+        _apply_rollups(conn, row[1], dict(zip(_FIELD_COLUMNS, row[2:])), -1)
+
+
+def _delete(conn, name):
+    _unapply_existing(conn, name)
+    search_index.remove_document(conn, name)
+    conn.execute("DELETE FROM entries WHERE name = ?", (name,))
+
+
+def _upsert(conn, name, st, digest, rec):
+    """写入一行索引；rec 为 None 表示解析失败，记下哈希避免反复解析"""
+    _unapply_existing(conn, name)
+    ok = 0 if rec is None else 1
+    if rec is not None:
+        _apply_rollups(conn, rec["date"].toordinal() if rec["date"] else None,
+                       {field: rec[field] for field in _FIELD_COLUMNS}, 1)
+    rec = rec or _EMPTY_ENTRY
+    day = rec["date"].toordinal() if rec["date"] else None
+    conn.execute(
+        "INSERT OR REPLACE INTO entries "
+        "(name, mtime_ns, size, hash, ok, day, raw_date, emotion, appetite, confidence) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (name, st.st_mtime_ns, st.st_size, digest, ok, day,
+         rec["Date"], rec["Emotion"], rec["Appetite"], rec["Confidence"]))
+
+
+def _bump_generation(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+
+class MetadataIndex:
+    """基于 SQLite 的持久化元数据索引，同一目录的所有调用方共享同一个索引文件"""
+
+    def __init__(self, base_dir: pathlib.Path):
+        self.base_dir = pathlib.Path(base_dir)
+        self.path = self.base_dir / INDEX_DIRNAME / INDEX_FILENAME
+        self._lock = threading.Lock()
+        # sync() 合并并发调用：_synced_at 为各扫描范围（None 为全部，否则为年份集合）最近一次完成的 refresh 的开始时间
+        self._sync_lock = threading.Lock()
+        self._synced_at = {}
+        # 由 vault_watcher.VaultWatcher 设置；监视器运行时 sync() 不再扫描目录
+        self.watcher = None
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS entries")
+            conn.execute("DROP TABLE IF EXISTS meta")
+            conn.execute("DROP TABLE IF EXISTS rollups")
+            for table in search_index.TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.executescript(_SCHEMA)
+            conn.executescript(search_index.SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        return conn
+
+    def generation(self):
+        """索引内容的版本号，任何进程改动索引都会使它递增，可用作内存缓存的失效依据"""
+        with self._lock, closing(self._connect()) as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def _last_sync(self, scope):
+        return max(self._synced_at.get(None, float("-inf")), self._synced_at.get(scope, float("-inf")))
+
+    def sync(self, workers=None, processes=False, years=None, max_age=0.0):
+        """需要最新数据时调用：有监视器保持索引更新时直接返回 None，否则执行 refresh()
+
+        years 只同步这些年的分片（以及根目录下的文件），见 refresh()
+        并发调用时只有一个线程扫描目录；等待期间有另一次在本次调用之后才开始、范围覆盖本次的 refresh 完成时，
+        索引已包含调用前的所有修改，直接返回 None
+        max_age > 0 时，覆盖本次范围的 refresh 在 max_age 秒内开始过就直接返回 None（调用方接受这段时间内
+        其他程序对文件的修改暂时不可见；本进程经 update_file 写入的修改总是立即可见）
+        """
+        if self.watcher is not None and self.watcher.is_alive():
+            return None
+        scope = None if years is None else frozenset(years)
+        requested = time.monotonic()
+        if max_age > 0 and self._last_sync(scope) > requested - max_age:
+            metrics.inc("index_sync_fresh_total")
+            return None
+        with self._sync_lock:
+            if self._last_sync(scope) > requested:
+                metrics.inc("index_sync_coalesced_total")
+                return None
+            started = time.monotonic()
+            result = self.refresh(workers=workers, processes=processes, years=years)
+            self._synced_at[scope] = started
+            return result
+
+    def refresh(self, workers=None, processes=False, years=None):
+        """同步索引与磁盘上的文件，返回本次扫描统计
+
+        workers > 1 时用线程池并发 stat/读取文件；processes=True 时再用进程池解析 frontmatter
+        years 不为 None 时只扫描这些年的分片目录和根目录，其他分片中的文件保持原样（不会被当作已删除）
+        """
+        stats = {"parsed": 0, "unchanged": 0, "touched": 0, "removed": 0, "failed": 0}
+        if years is not None and len(years) > MAX_SCOPED_YEARS:
+            years = None
+        with metrics.span("index.glob"):
+            listed = list_entries(self.base_dir, years)
+        names = [name for name, _ in listed]
+        paths = [path for _, path in listed]
+        present = set(names)
+        sql = "SELECT name, mtime_ns, size, hash FROM entries"
+        params = []
+        if years is not None:
+            # 只取根目录和这些年份分片中的行，其他分片的记录既不比较也不会被删除
+            prefixes = sorted({f"{y:04d}/" for y in years})
+            sql += f" WHERE instr(name, '/') = 0 OR substr(name, 1, 5) IN ({', '.join('?' * len(prefixes))})"
+            params = prefixes
+        with self._lock, closing(self._connect()) as conn, conn:
+            known = {row[0]: row[1:] for row in conn.execute(sql, params)}
+            removed = [name for name in known if name not in present]
+            for name in removed:
+                _delete(conn, name)
+            stats["removed"] = len(removed)
+
+            changed = []
+            with metrics.span("index.stat"):
+                stat_results = map_concurrently(_stat, paths, workers)
+            for name, p, st in zip(names, paths, stat_results):
+                if st is None:
+                    continue
+                old = known.get(name)
+                if old and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+                    stats["unchanged"] += 1
+                    continue
+                changed.append((name, p, st))
+
+            with metrics.span("index.read"):
+                loaded = map_concurrently(_read, [p for _, p, _ in changed], workers)
+            to_parse = []
+            for (name, p, st), item in zip(changed, loaded):
+                if item is None:
+                    continue
+                data, digest = item
+                old = known.get(name)
+                if old and old[2] == digest:
+                    # 只是被同步客户端 touch 过，内容未变
+                    conn.execute("UPDATE entries SET mtime_ns = ?, size = ? WHERE name = ?",
+                                 (st.st_mtime_ns, st.st_size, name))
+                    stats["touched"] += 1
+                    continue
+                to_parse.append((name, p, st, data, digest))
+
+            with metrics.span("index.parse"):
+                records = parse_concurrently([(p, data) for _, p, _, data, _ in to_parse], workers, processes)
+            with metrics.span("index.write"):
+                for (name, p, st, data, digest), rec in zip(to_parse, records):
+                    if rec is None:
+                        stats["failed"] += 1
+                    else:
+                        stats["parsed"] += 1
+                    _upsert(conn, name, st, digest, rec)
+                if stats["parsed"] or stats["failed"] or stats["removed"]:
+                    _bump_generation(conn)
+        # 解析失败只记 debug 日志，在这里计数以便从 /metrics 发现
+        metrics.inc("files_parsed_total", stats["parsed"])
+        metrics.inc("parse_failures_total", stats["failed"])
+        for result, n in stats.items():
+            metrics.inc("index_files_total", n, result=result)
+        logging.debug(f"索引刷新完成 {self.path}: {stats}")
+        return stats
+
+    def update_file(self, path: pathlib.Path):
+        """只同步单个文件（保存日记后调用），不扫描整个目录
+
+        返回 (旧的 day 序数, 新记录)；文件已删除或无法解析时新记录为 None
+        """
+        path = pathlib.Path(path)
+        name = entry_name(self.base_dir, path)
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT day FROM entries WHERE name = ?", (name,)).fetchone()
+            old_day = row[0] if row else None
+            st = _stat(path)
+            item = _read(path) if st is not None else None
+            if item is None:
+                _delete(conn, name)
+                _bump_generation(conn)
+                return old_day, None
+            data, digest = item
+            rec = _safe_parse_entry(path, data)
+            metrics.inc("parse_failures_total" if rec is None else "files_parsed_total")
+            _upsert(conn, name, st, digest, rec)
+            _bump_generation(conn)
+            return old_day, rec
+
+    def rename(self, moves):
+        """文件在目录内移动后（如迁移布局）更新索引中的名称，不重新解析；moves 为 [(旧路径, 新路径)]
+
+        os.replace 保留 mtime，之后的 refresh 会把这些文件视为未变化
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            for old, new in moves:
+                old_name, new_name = entry_name(self.base_dir, old), entry_name(self.base_dir, new)
+                if conn.execute("SELECT 1 FROM entries WHERE name = ?", (old_name,)).fetchone() is None:
+                    continue
+                _delete(conn, new_name)
+                conn.execute("UPDATE entries SET name = ? WHERE name = ?", (new_name, old_name))
+                search_index.rename_document(conn, old_name, new_name)
+            if moves:
+                _bump_generation(conn)
+
+    def rows_between(self, start: date, end: date):
+        """[start, end] 闭区间内的行，格式同 rows()"""
+        with self._lock, closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT day, raw_date, emotion, appetite, confidence FROM entries "
+                "WHERE ok = 1 AND day BETWEEN ? AND ? ORDER BY day, name",
+                (start.toordinal(), end.toordinal())).fetchall()
+
+    def distinct_labels(self, field):
+        """某字段在所有有日期记录中出现过的取值（按文本排序，与 RecordStore.present_labels 一致）"""
+        column = _FIELD_COLUMNS[field]
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT DISTINCT {column} FROM entries "
+                f"WHERE ok = 1 AND day IS NOT NULL AND {column} IS NOT NULL AND {column} != ''").fetchall()
+        return sorted(r[0] for r in rows)
+
+    def rollup(self, field, level, start: int = None, end: int = None):
+        """汇总表中 [start, end] 桶范围内的 (bucket, label, count)，按桶排序；桶的取值见 rollup_buckets"""
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"未知的汇总粒度: {level}")
+        sql = "SELECT bucket, label, count FROM rollups WHERE level = ? AND field = ?"
+        params = [level, field]
+        if start is not None:
+            sql += " AND bucket >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND bucket <= ?"
+            params.append(end)
+        sql += " ORDER BY bucket, label"
+        with self._lock, closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _sync_search(self):
+        """检索前让倒排表跟上 entries 表：索引版本号未变时直接返回，否则只读取哈希变化的文件"""
+        with self._lock, closing(self._connect()) as conn:
+            generation = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+            built = conn.execute("SELECT value FROM meta WHERE key = ?", (search_index.GENERATION_KEY,)).fetchone()
+            if built and built[0] == generation:
+                return
+            stale, missing = search_index.pending(conn)
+        with metrics.span("search.build"):
+            # 读取文件时不持有锁，其他请求可以继续查询元数据
+            loaded = map_concurrently(_read, [self.base_dir / name for name in missing])
+            with self._lock, closing(self._connect()) as conn, conn:
+                for name in stale:
+                    search_index.remove_document(conn, name)
+                search_index.index_documents(conn, [(name, item[1], search_index.entry_body(item[0]))
+                                                    for name, item in zip(missing, loaded) if item is not None])
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             (search_index.GENERATION_KEY, generation))
+        logging.debug(f"全文检索索引更新 {self.path}: 新建 {len(missing)}，移除 {len(stale)}")
+
+    def search(self, query, start: date = None, end: date = None, emotion=None, limit=20, offset=0):
+        """全文检索正文，返回 [{"name", "date", "Emotion", "snippet"}]，按日期倒序"""
+        self._sync_search()
+        with self._lock, closing(self._connect()) as conn:
+            rows = search_index.search(conn, self.base_dir, query, start.toordinal() if start else None,
+                                       end.toordinal() if end else None, emotion, limit, offset)
+        return [{
+            "name": name,
+            "date": date.fromordinal(day) if day is not None else None,
+            "Emotion": emo,
+            "snippet": text,
+        } for name, day, emo, text in rows]
+
+    def rows(self):
+        """按日期排序返回有日期记录的 (day 序数, 原始 Date, Emotion, Appetite, Confidence) 元组，供列式存储直接构建"""
+        with self._lock, closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT day, raw_date, emotion, appetite, confidence FROM entries "
+                "WHERE ok = 1 AND day IS NOT NULL ORDER BY day, name").fetchall()
+
+    def page(self, start: date = None, end: date = None, after=None, limit=None):
+        """按 (day, name) 排序的键集分页，返回 (name, day, 原始 Date, Emotion, Appetite, Confidence)
+
+        无日期的记录排在最前，只在没有 start/end 过滤时返回；after 为上一页最后一行的 (day, name)
+        """
+        where = ["ok = 1"]
+        params = []
+        if start is not None or end is not None:
+            where.append("day IS NOT NULL")
+        if start is not None:
+            where.append("day >= ?")
+            params.append(start.toordinal())
+        if end is not None:
+            where.append("day <= ?")
+            params.append(end.toordinal())
+        if after is not None:
+            after_day, after_name = after
+            if after_day is None:
+                where.append("((day IS NULL AND name > ?) OR day IS NOT NULL)")
+                params.append(after_name)
+            else:
+                where.append("(day > ? OR (day = ? AND name > ?))")
+                params.extend([after_day, after_day, after_name])
+        sql = ("SELECT name, day, raw_date, emotion, appetite, confidence FROM entries "
+               f"WHERE {' AND '.join(where)} ORDER BY day, name")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock, closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def entries(self, include_undated=False):
+        """返回已解析的记录（按日期排序）；include_undated 时也包含无法确定日期的文件"""
+        sql = ("SELECT name, day, raw_date, emotion, appetite, confidence FROM entries "
+               "WHERE ok = 1")
+        if not include_undated:
+            sql += " AND day IS NOT NULL"
+        sql += " ORDER BY day, name"
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(sql).fetchall()
+        return [{
+            "name": name,
+            "date": date.fromordinal(day) if day is not None else None,
+            "Date": raw_date,
+            "Emotion": emotion,
+            "Appetite": appetite,
+            "Confidence": confidence,
+        } for name, day, raw_date, emotion, appetite, confidence in rows]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(base_dir: pathlib.Path) -> MetadataIndex:
+    """按目录复用 MetadataIndex 实例，保证同一进程内的读写串行"""
+    key = pathlib.Path(base_dir).resolve()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = MetadataIndex(key)
+        return index
@@ -0,0 +1,195 @@
+"""
+进程内的耗时与计数指标（/metrics 以 Prometheus 文本格式输出）
+- span(stage, **labels)：上下文管理器，记录一段代码的耗时，汇总到直方图 mdjournal_stage_seconds；timed(stage) 为装饰器形式
+- observe(metric, seconds, **labels) / inc(metric, amount, **labels)：直方图与计数器
+- register_gauges(collect)：生成 /metrics 时调用 collect() 取得当前值（如缓存占用的内存）
+- enable_json_log() 之后，每个 span 结束时再以一行 JSON 写入 mdjournal.metrics 日志，便于逐次排查
+- instrument_app(app)：Flask 应用的请求耗时与 /metrics 路由
+不依赖 prometheus_client，也不导入 Flask（只有 instrument_app 用到），写日记的启动路径上可以放心导入
+"""
+
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "mdjournal_"
+# 直方图分桶上界（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DESCRIPTIONS = {
+    "stage_seconds": "Time spent in each instrumented stage.",
+    "http_request_seconds": "HTTP request handling time by endpoint.",
+    "files_parsed_total": "Diary files parsed into the metadata index.",
+    "parse_failures_total": "Diary files whose frontmatter could not be parsed.",
+    "date_fallbacks_total": "Entries whose Date metadata was unusable and fell back to the file name.",
+    "index_files_total": "Files seen by metadata index refreshes, by outcome.",
+    "index_sync_coalesced_total": "Index syncs answered by a concurrent refresh instead of a new scan.",
+    "index_sync_fresh_total": "Index syncs skipped because a refresh of the same scope ran within max_age.",
+    "cache_requests_total": "In-process and on-disk cache lookups, by cache and result.",
+    "http_conditional_total": "Conditional HTTP responses, by result.",
+    "memory_cache_evictions_total": "Entries evicted from the shared in-memory cache, by kind and reason.",
+    "memory_cache_bytes": "Estimated bytes held in the shared in-memory cache, by vault.",
+    "memory_cache_budget_bytes": "Byte budget of the shared in-memory cache.",
+}
+
+_lock = threading.Lock()
+_counters = {}     # (metric, labels) -> 数值
+_histograms = {}   # (metric, labels) -> [各分桶计数..., 总和, 次数]
+_collectors = []
+_json_log = False
+_json_logger = logging.getLogger("mdjournal.metrics")
+
+
+def _key(metric, labels):
+    return metric, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(metric, amount=1, **labels):
+    if not amount:
+        return
+    key = _key(metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(metric, seconds, **labels):
+    key = _key(metric, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+def register_gauges(collect):
+    """collect() 返回 [(metric, {标签}, 数值), ...]"""
+    with _lock:
+        _collectors.append(collect)
+
+
+def enable_json_log(enabled=True):
+    """span 结束时写一行 JSON 日志：{"span": ..., "seconds": ..., 标签...}"""
+    global _json_log
+    _json_log = enabled
+
+
+@contextmanager
+def span(stage, **labels):
+    """计时；出现异常时也会记录，并带上 error 标签"""
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        if error:
+            labels["error"] = error
+        observe("stage_seconds", elapsed, stage=stage, **labels)
+        if _json_log:
+            _json_logger.info(json.dumps({"span": stage, "seconds": round(elapsed, 6), **labels},
+                                         ensure_ascii=False, default=str))
+
+
+def timed(stage):
+    """装饰器：整个函数调用记为一个 span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_result(cache, hit):
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """所有指标的 Prometheus 文本格式（exposition format 0.0.4）"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(hist)) for key, hist in _histograms.items())
+        collectors = list(_collectors)
+    gauges = sorted(_key(metric, labels) + (value,) for collect in collectors for metric, labels, value in collect())
+    lines = []
+    declared = set()
+
+    def declare(metric, kind):
+        if metric in declared:
+            return
+        declared.add(metric)
+        if metric in DESCRIPTIONS:
+            lines.append(f"# HELP {PREFIX}{metric} {DESCRIPTIONS[metric]}")
+        lines.append(f"# TYPE {PREFIX}{metric} {kind}")
+
+    for (metric, labels), value in counters:
+        declare(metric, "counter")
+        lines.append(f"{PREFIX}{metric}{_format_labels(labels)} {_format_value(value)}")
+    for metric, labels, value in gauges:
+        declare(metric, "gauge")
+        lines.append(f"{PREFIX}{metric}{_format_labels(labels)} {_format_value(value)}")
+    for (metric, labels), hist in histograms:
+        declare(metric, "histogram")
+        name = PREFIX + metric
+        for bound, count in zip(BUCKETS, hist):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist[-2])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def instrument_app(app, route="/metrics"):
+    """给 Flask 应用加上请求耗时统计和 Prometheus 的 /metrics 路由"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None and request.endpoint != "metrics":
+            # 流式响应（NDJSON）只统计到开始发送为止
+            observe("http_request_seconds", time.perf_counter() - start,
+                    endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code,
+                    vault=g.get("vault_id", ""))
+        return response
+
+    @app.route(route, endpoint="metrics")
+    def _metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
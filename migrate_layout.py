@@ -0,0 +1,103 @@
+"""
+把日记目录迁移到另一种布局（见 vault_layout）
+    flat   BASE_DIR/20261018.md
+    year   BASE_DIR/2026/20261018.md
+    month  BASE_DIR/2026/10/20261018.md
+
+用法:
+    python migrate_layout.py month                              # 迁移 config.BASE_DIR
+    python migrate_layout.py year --base-dir D:\\journal --dry-run
+    python migrate_layout.py flat                               # 迁回平铺
+
+- 只移动 YYYYMMDD.md 形式的日记；其他 .md（笔记、模板等）和附件保持原位
+- 先记录新布局，之后所有写入入口都按新布局创建文件；中途中断时重新运行即可继续
+- 用 os.replace 移动，mtime 不变；元数据索引和全文检索中的名称随之更新，不需要重新解析
+- 目标位置已有文件时跳过，在报告的 conflicts 中列出
+- 因迁移而变空的年/月分片目录会被删除；迁移前就已为空的分片目录保持原样
+"""
+
+import argparse
+import json
+import logging
+import os
+import pathlib
+import sys
+
+from batch_import import load_config
+from metadata_index import INDEX_DIRNAME, INDEX_FILENAME, get_index
+from obsidian_daily import DEFAULT_DIR
+from vault_layout import LAYOUTS, date_from_name, is_shard_dir, layout_path, list_entries, write_layout
+
+
+def _emptied_dirs(base_dir: pathlib.Path, moves):
+    """移出过日记的分片目录（相对名称），月目录排在所属年目录之前；只有这些目录可能因迁移而变空"""
+    candidates = set()
+    for source, _ in moves:
+        relative = source.parent.relative_to(base_dir).as_posix()
+        while relative != "." and is_shard_dir(relative):
+            candidates.add(relative)
+            relative = pathlib.PurePosixPath(relative).parent.as_posix()
+    return sorted(candidates, key=lambda r: (-r.count("/"), r))
+
+
+def migrate(base_dir: pathlib.Path, layout, dry_run=False):
+    """把 base_dir 中的日记移动到 layout 布局下的位置，返回统计报告"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"未知的目录布局: {layout}，可选 {', '.join(LAYOUTS)}")
+    base_dir = pathlib.Path(base_dir)
+    report = {"layout": layout, "moved": 0, "unchanged": 0, "kept": 0, "conflicts": [], "removed_dirs": []}
+    if not dry_run:
+        write_layout(base_dir, layout)
+    moves = []
+    try:
+        for name, path in list_entries(base_dir):
+            day = date_from_name(name)
+            if day is None:
+                report["kept"] += 1
+                continue
+            target = layout_path(base_dir, day, layout)
+            if target == path:
+                report["unchanged"] += 1
+                continue
+            if target.exists():
+                report["conflicts"].append({"source": name, "target": target.relative_to(base_dir).as_posix()})
+                continue
+            if not dry_run:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, target)
+            moves.append((path, target))
+            report["moved"] += 1
+    finally:
+        # 中途出错时也更新已经移动的文件，索引不会把它们当作删除后新增
+        if moves and not dry_run and (base_dir / INDEX_DIRNAME / INDEX_FILENAME).exists():
+            get_index(base_dir).rename(moves)
+    if not dry_run:
+        for relative in _emptied_dirs(base_dir, moves):
+            try:
+                (base_dir / relative).rmdir()
+            except OSError:
+                # 目录中还有其他文件（笔记、附件或冲突而未移动的日记）
+                continue
+            report["removed_dirs"].append(relative)
+    logging.info(f"迁移到 {layout} 布局：移动 {report['moved']}，已在目标位置 {report['unchanged']}，"
+                 f"保留原位 {report['kept']}，冲突 {len(report['conflicts'])}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把日记目录迁移到平铺 / 按年 / 按年月分片的布局")
+    parser.add_argument("layout", choices=LAYOUTS, help="目标布局")
+    parser.add_argument("--base-dir", type=pathlib.Path, default=None, help="日记目录（默认取 config.BASE_DIR）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不移动文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config()
+    base_dir = args.base_dir or pathlib.Path(getattr(config, "BASE_DIR", DEFAULT_DIR))
+    report = migrate(base_dir, args.layout, dry_run=args.dry_run)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report["conflicts"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@
 """
 Obsidian 日记助手
 功能：
-- 创建/覆盖当天 YYYYMMDD.md（模板 + YAML frontmatter）
+- 创建/覆盖当天 YYYYMMDD.md（模板 + YAML frontmatter；按目录布局可能在 YYYY/ 或 YYYY/MM/ 分片中）
 - 抽取本地 Outlook 今日日程写入文件
 - 扫描目录所有 .md（读取 YAML）生成年度热力图（Emotion/Appetite/Confidence）
 """
@@ -10,19 +10,21 @@ Obsidian 日记助手
 import os
 import sys
 import pathlib
-from datetime import datetime, date, time, timedelta
+from datetime import datetime, date, timedelta
+import functools
 import logging
+import threading
 import frontmatter
 import json
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+import sqlite3
 
-# Outlook 用
-try:
-    import win32com.client
-except Exception:
-    win32com = None
+import metrics
+from atomic_write import atomic_write
+from calendar_provider import get_default_calendar
+from categories import EMOTIONS, APPETITES, CONFIDENCES, category_colors
+from memory_cache import memory_cache
+from metadata_index import get_index, read_entries
+from vault_layout import entry_path, list_entries
 
 # GUI 弹窗用于覆盖确认（可回落到命令行）
 try:
@@ -34,9 +36,9 @@ except Exception:
 
 logging.basicConfig(level=logging.INFO)
 DEFAULT_DIR = r"D:\jianguo\我的坚果云\obsidian\Personal\2026"
-EMOTIONS = ["开心😊","幸福🥰","兴奋🤩","自豪😎","平静😐","痛苦😫","悲伤☹️","疲惫😭","生病😷","气愤😡","成就🥂","心流🧘"]
-APPETITES = ["食欲稳定🥗","想吃辣的🌶","想吃碳水🍜"]
-CONFIDENCES = ["自信满满","自我怀疑"]
+# 列式存储的类别编码字典
+VOCABULARIES = {"Emotion": EMOTIONS, "Appetite": APPETITES, "Confidence": CONFIDENCES}
+FIELDS = tuple(VOCABULARIES)
 
 def ask_yes_no(prompt, title="确认"):
     # 先尝试弹窗
@@ -63,8 +65,8 @@ def ensure_dir(path: pathlib.Path):
             raise
 
 def get_today_filename(base_dir: pathlib.Path, target_date: date):
-    name = target_date.strftime("%Y%m%d") + ".md"
-    return base_dir / name
+    # 按目录的布局（平铺 / 年 / 年月分片，见 vault_layout）解析，这一天已有文件时返回现有位置
+    return entry_path(base_dir, target_date)
 
 def prompt_choice(prompt, options, default_index=0):
     print(f"{prompt}")
@@ -82,50 +84,42 @@ def prompt_choice(prompt, options, default_index=0):
         print("请输入有效数字。")
 
 def fetch_outlook_events_for_today():
-    events = []
-    if win32com is None:
-        logging.warning("pywin32 未安装或不可用，跳过 Outlook 集成。")
-        return events
+    # 通过共享的日程来源读取（复用 Outlook 连接，按日期缓存）
     try:
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        ns = outlook.GetNamespace("MAPI")
-        calendar = ns.GetDefaultFolder(9)  # olFolderCalendar
-        items = calendar.Items
-        items.IncludeRecurrences = True
-        items.Sort("[Start]")
-        today = date.today()
-        start = datetime.combine(today, time.min)
-        end = datetime.combine(today, time.max)
-        # Outlook 的 Restrict 需要特定格式
-        restr = "[Start] >= '{}' AND [Start] <= '{}'".format(start.strftime("%m/%d/%Y %I:%M %p"),
-                                                             end.strftime("%m/%d/%Y %I:%M %p"))
-        restricted = items.Restrict(restr)
-        for it in restricted:
-            try:
-                start_time = it.Start
-                end_time = it.End
-                subj = str(it.Subject)
-                events.append({
-                    "subject": subj,
-                    "start": start_time,
-                    "end": end_time
-                })
-            except Exception:
-                continue
+        return get_default_calendar().fetch_day(date.today())
     except Exception as e:
         logging.warning(f"获取 Outlook 日程失败：{e}")
-    return events
+        return []
 
 def write_markdown_file(path: pathlib.Path, meta: dict, body: str):
+    # 原子写入，内容未变时不改动文件；返回内容哈希
     post = frontmatter.Post(body, **meta)
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(frontmatter.dumps(post))
-        logging.info(f"写入文件 {path}")
+        written, digest = atomic_write(path, frontmatter.dumps(post))
+        if written:
+            logging.info(f"写入文件 {path}")
+        else:
+            logging.info(f"内容未变化，跳过写入 {path}")
+        return digest
     except Exception as e:
         logging.error(f"写文件失败：{e}")
         raise
 
+def frontmatter_lines(meta: dict):
+    # 扁平 key: value 形式的 YAML 头部（含首尾 ---），与 read_frontmatter_header 的快速解析对应
+    lines = ["---"]
+    for key, value in meta.items():
+        if value is None:
+            # 未填写的字段留空（YAML 中即为 null），避免写出字符串 "None"
+            lines.append(f"{key}:")
+            continue
+        # Properly format YAML fields
+        if isinstance(value, str) and any(c in value for c in ['\"', ':']):
+            value = f'"{value}"'  # Add quotes if special characters exist
+        lines.append(f"{key}: {value}")
+    lines.append("---")
+    return lines
+
 def build_template(date_dt: datetime, location, emotion, confidence, appetite, diary_text, exercise_text, events):
     # YAML metadata, 注意 field 名称用简洁 key
     meta = {
@@ -135,14 +129,7 @@ def build_template(date_dt: datetime, location, emotion, confidence, appetite, d
         "Emotion": emotion,
         "Location": location
     }
-    lines = []
-    lines.append("---")
-    for key, value in meta.items():
-        # Properly format YAML fields
-        if isinstance(value, str) and any(c in value for c in ['\"', ':']):
-            value = f'"{value}"'  # Add quotes if special characters exist
-        lines.append(f"{key}: {value}")
-    lines.append("---")
+    lines = frontmatter_lines(meta)
     lines.append("")
     lines.append("## 今日日程")
     lines.append("")
@@ -165,96 +152,488 @@ def build_template(date_dt: datetime, location, emotion, confidence, appetite, d
     content = "\n".join(lines)
     return meta, content
 
-def scan_folder_for_metadata(base_dir: pathlib.Path):
-    records = []
-    for p in base_dir.glob("*.md"):
+def scan_folder_for_metadata(base_dir: pathlib.Path, use_index=True, workers=None, processes=False):
+    # 默认走 .mdjournal/index.sqlite 增量索引，只重新解析变化过的文件
+    # workers > 1 时并发读取文件，processes=True 时用进程池解析；结果总是按日期排序
+    # 各阶段耗时见 /metrics 的 mdjournal_stage_seconds（index.* 为索引刷新的各步骤）
+    if use_index:
         try:
-            post = frontmatter.load(p)
-            # 优先寻找 Date 元数据，回退使用文件名
-            d = post.metadata.get("Date")
-            if d:
-                try:
-                    dt = datetime.fromisoformat(d)
-                    day = dt.date()
-                except Exception:
-                    # 如果 Date 是纯日期字符串，尝试 parse
-                    try:
-                        day = datetime.strptime(d, "%Y-%m-%d").date()
-                    except Exception:
-                        # fallback filename
-                        day = None
-            else:
-                day = None
-            if day is None:
-                # 使用文件名 YYYYMMDD.md
-                try:
-                    stem = p.stem
-                    day = datetime.strptime(stem, "%Y%m%d").date()
-                except Exception:
-                    continue
-            records.append({
-                "date": day,
-                "Emotion": post.metadata.get("Emotion"),
-                "Appetite": post.metadata.get("Appetite"),
-                "Confidence": post.metadata.get("Confidence")
-            })
-        except Exception:
+            with metrics.span("scan_folder_for_metadata", mode="index"):
+                index = get_index(base_dir)
+                index.sync(workers=workers, processes=processes)
+                with metrics.span("index.entries"):
+                    return [{"date": r["date"], "Emotion": r["Emotion"], "Appetite": r["Appetite"],
+                             "Confidence": r["Confidence"]} for r in index.entries()]
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"元数据索引不可用，回退到全量扫描：{e}")
+    with metrics.span("scan_folder_for_metadata", mode="full"):
+        return _scan_without_index(base_dir, workers, processes)
+
+def _scan_without_index(base_dir: pathlib.Path, workers=None, processes=False):
+    with metrics.span("scan.glob"):
+        paths = [path for _, path in list_entries(base_dir)]
+    with metrics.span("scan.parse"):
+        entries = read_entries(paths, workers=workers, processes=processes)
+    records = []
+    for rec in entries:
+        if rec is None:
+            metrics.inc("parse_failures_total")
             continue
+        metrics.inc("files_parsed_total")
+        if rec["date"] is None:
+            continue
+        records.append({
+            "date": rec["date"],
+            "Emotion": rec["Emotion"],
+            "Appetite": rec["Appetite"],
+            "Confidence": rec["Confidence"]
+        })
+    records.sort(key=lambda r: r["date"])
     return records
 
+# numpy / matplotlib 只在统计和画图时才导入，写日记的路径（以及打包的 日记.exe）启动时不加载
+
+@functools.lru_cache(maxsize=None)
+def load_pyplot():
+    # 热力图只保存成文件，不需要交互窗口：未指定 MPLBACKEND 且 pyplot 尚未加载时使用无界面的 Agg
+    import matplotlib
+    if "matplotlib.pyplot" not in sys.modules and not os.environ.get("MPLBACKEND"):
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+# 进程内的缓存都放在 memory_cache 中，以日记目录（resolve 后的路径）区分 vault，共用一个内存预算：
+# - "records"：{RECORDS_KEY: (generation, RecordStore)}
+# - "calendar"：{(年份, 字段): (generation, etag, bytes)}
+# - "matrices"：{年份: (generation, {field: (mat, cats)})}，保存单篇日记时复制一份修补后替换；
+#   generation 与索引对不上（其他进程或线程改过索引）时按年重建
+def _vault_key(base_dir):
+    return pathlib.Path(base_dir).resolve()
+
+RECORDS_KEY = "dated"
+
+def load_record_store(base_dir: pathlib.Path, workers=None, processes=False, years=None):
+    # 直接从索引行构建列式存储，不经过 list-of-dict；索引 generation 未变时复用内存中的结果
+    # years 不为 None 时只同步这些年的分片目录，其他年份沿用索引中已有的数据
+    from record_store import RecordStore
+    try:
+        index = get_index(base_dir)
+        with metrics.span("records.sync"):
+            index.sync(workers=workers, processes=processes, years=years)
+        # 先读 generation 再读数据：中间若有写入，下次调用时 generation 不同会重新构建
+        generation = index.generation()
+        cached = memory_cache.get(index.base_dir, "records", RECORDS_KEY)
+        metrics.cache_result("record_store", cached and cached[0] == generation)
+        if cached and cached[0] == generation:
+            return cached[1]
+        with metrics.span("records.build"):
+            store = RecordStore.from_rows(index.rows(), VOCABULARIES)
+        memory_cache.put(index.base_dir, "records", RECORDS_KEY, (generation, store), store.nbytes())
+        return store
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"元数据索引不可用，回退到全量扫描：{e}")
+    records = scan_folder_for_metadata(base_dir, use_index=False, workers=workers, processes=processes)
+    return RecordStore.from_records(records, VOCABULARIES)
+
 # heatmap helper
-from matplotlib.colors import ListedColormap, BoundaryNorm
 
-def make_category_heatmap(records, year, field, out_path: pathlib.Path):
-    # records: list of dict with 'date' and field
-    # Build map date->category
+# 热力图调色板（也参与渲染缓存键）
+PALETTE = "tab20"
+# 渲染后端：matplotlib（tab20 调色板）或 pillow（pil_heatmap，使用 diary_gui 的类别颜色，快得多）
+BACKENDS = ("matplotlib", "pillow")
+DEFAULT_BACKEND = "matplotlib"
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的热力图后端: {backend}")
+
+def _palette_tag(backend):
+    # 参与缓存键：换后端后旧图片不会被当成命中
+    return PALETTE if backend == "matplotlib" else backend
+
+def year_grid(year):
+    # 年度日历网格：从 1 月 1 日所在周的周日开始，7 行（Sun=0）x num_weeks 列
     start_date = date(year, 1, 1)
     end_date = date(year, 12, 31)
-    # map categories to ints
-    cats = sorted({r[field] for r in records if r[field]})
-    cat_to_int = {c: i for i, c in enumerate(cats)}
-    # Prepare canvas
     first_sunday = start_date - timedelta(days=(start_date.weekday() + 1) % 7)
     num_weeks = ((end_date - first_sunday).days // 7) + 1
-    mat = np.full((7, num_weeks), np.nan)
-    # fill
-    for r in records:
-        d = r["date"]
-        if d.year != year: continue
-        week_idx = (d - first_sunday).days // 7
-        row = (d.weekday() + 1) % 7  # Sunday=0
-        val = r.get(field)
-        if val in cat_to_int:
-            mat[row, week_idx] = cat_to_int[val]
-    # plot
-    cmap_colors = plt.get_cmap("tab20").colors
+    return first_sunday, num_weeks
+
+def build_category_matrices(records, year, fields=FIELDS, categories=None):
+    # 一次遍历同时构建多个字段的 7 x num_weeks 矩阵，返回 {field: (mat, cats)}
+    # categories 可指定各字段的图例类别（只传入一年数据时用全库的类别，保证颜色一致）
+    with metrics.span("heatmap.matrix"):
+        return _build_category_matrices(records, year, fields, categories)
+
+def _build_category_matrices(records, year, fields, categories):
+    import numpy as np
+    from record_store import RecordStore
+    store = records if isinstance(records, RecordStore) else RecordStore.from_records(records, VOCABULARIES)
+    first_sunday, num_weeks = year_grid(year)
+    year_store = store.for_year(year)
+    # first_sunday 是周日，偏移天数 //7 即周序号，%7 即行号（Sunday=0）
+    offsets = year_store.days - first_sunday.toordinal()
+    week_idx = offsets // 7
+    row = offsets % 7
+    result = {}
+    for field in fields:
+        cats = categories[field] if categories else store.present_labels(field)
+        cat_to_int = {c: i for i, c in enumerate(cats)}
+        # 编码 -> 图例序号；末尾多放一个 -1，MISSING(-1) 编码正好索引到它
+        code_to_int = np.array([cat_to_int.get(label, -1) for label in store.vocab[field]] + [-1])
+        vals = code_to_int[year_store.codes[field]]
+        keep = vals >= 0
+        mat = np.full((7, num_weeks), np.nan)
+        mat[row[keep], week_idx[keep]] = vals[keep]
+        result[field] = (mat, cats)
+    return result
+
+def build_calendar_data(records, year, fields=FIELDS):
+    # 浏览器端渲染用的紧凑数据 {field: {"labels", "colors", "days", "codes"}}
+    # days 是相对 1 月 1 日的天数，codes 是 labels 中的序号；同一天有多条记录时与热力图一样取最后一条
+    import numpy as np
+    from record_store import RecordStore
+    store = records if isinstance(records, RecordStore) else RecordStore.from_records(records, VOCABULARIES)
+    year_store = store.for_year(year)
+    offsets = year_store.days - date(year, 1, 1).toordinal()
+    result = {}
+    for field in fields:
+        labels = store.present_labels(field)
+        label_to_int = {c: i for i, c in enumerate(labels)}
+        code_to_int = np.array([label_to_int.get(label, -1) for label in store.vocab[field]] + [-1])
+        vals = code_to_int[year_store.codes[field]]
+        keep = vals >= 0
+        days, vals = offsets[keep], vals[keep]
+        # 反转后 np.unique 取到的第一次出现即原顺序中的最后一条
+        days, first = np.unique(days[::-1], return_index=True)
+        result[field] = {
+            "labels": labels,
+            "colors": category_colors(field, labels),
+            "days": days.tolist(),
+            "codes": vals[::-1][first].tolist(),
+        }
+    return result
+
+def calendar_payload(base_dir: pathlib.Path, year, fields=FIELDS):
+    # 返回 (etag, JSON bytes)；etag 是内容的 SHA-1，供 HTTP 条件请求使用；索引未变化时直接复用序列化结果
+    import hashlib
+    index = get_index(base_dir)
+    store = load_record_store(base_dir, years=[year])
+    generation = index.generation()
+    key = (year, tuple(fields))
+    cached = memory_cache.get(index.base_dir, "calendar", key)
+    metrics.cache_result("calendar_payload", cached and cached[0] == generation)
+    if cached and cached[0] == generation:
+        return cached[1], cached[2]
+    payload = {"year": year, "start": date(year, 1, 1).isoformat(),
+               "fields": build_calendar_data(store, year, fields)}
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = hashlib.sha1(data).hexdigest()
+    memory_cache.put(index.base_dir, "calendar", key, (generation, etag, data), len(data))
+    return etag, data
+
+DAY_LABELS = ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"]
+
+def _category_cmap(cats):
+    import numpy as np
+    from matplotlib.colors import ListedColormap, BoundaryNorm
+    plt = load_pyplot()
+    cmap_colors = plt.get_cmap(PALETTE).colors
     cmap = ListedColormap(cmap_colors[:max(1, len(cats))])
     norm = BoundaryNorm(np.arange(-0.5, len(cats)+0.5, 1), cmap.N)
-    fig, ax = plt.subplots(figsize=(min(18, num_weeks*0.25), 3))
-    ax.imshow(mat, cmap=cmap, norm=norm, aspect="auto", interpolation='none')
-    ax.set_yticks(range(7))
-    ax.set_yticklabels(["Sun","Mon","Tue","Wed","Thu","Fri","Sat"])
-    ax.set_xticks([])
-    ax.set_title(f"{year} - {field}")
-    # legend
-    handles = [plt.Rectangle((0,0),1,1, color=cmap(i)) for i in range(len(cats))]
-    ax.legend(handles, cats, bbox_to_anchor=(1.01,1), loc='upper left')
-    plt.tight_layout()
-    fig.savefig(out_path)
-    plt.close(fig)
-    logging.info(f"保存热力图 {out_path}")
-
-def generate_all_heatmaps(base_dir: pathlib.Path, year: int):
-    records = scan_folder_for_metadata(base_dir)
-    if not records:
-        logging.info("没有找到元数据记录，跳过热力图。")
+    return cmap, norm
+
+def _legend_handles(cmap, cats):
+    from matplotlib.patches import Rectangle
+    return [Rectangle((0,0),1,1, color=cmap(i)) for i in range(len(cats))]
+
+class HeatmapRenderer:
+    # 复用 figure/axes：同一宽度（周数）只创建一次 figure，之后只替换图像数据、标题和图例
+    # 用 matplotlib.figure.Figure 而不是 pyplot，figure 不会进入 pyplot 的全局列表；输出与每次新建 figure 完全相同
+
+    def __init__(self):
+        self._figures = {}  # num_weeks -> (fig, ax, im)
+
+    def _figure(self, num_weeks, mat, cmap, norm):
+        from matplotlib.figure import Figure
+        cached = self._figures.get(num_weeks)
+        if cached is not None:
+            fig, ax, im = cached
+            im.set_data(mat)
+            im.set_cmap(cmap)
+            im.set_norm(norm)
+            ax.get_legend().remove()
+            # tight_layout 从默认边距重新计算，结果才与新建 figure 一致
+            fig.subplots_adjust(**{k: load_pyplot().rcParams[f"figure.subplot.{k}"]
+                                   for k in ("left", "right", "bottom", "top", "wspace", "hspace")})
+            return fig, ax
+        fig = Figure(figsize=(min(18, num_weeks*0.25), 3))
+        ax = fig.subplots()
+        im = ax.imshow(mat, cmap=cmap, norm=norm, aspect="auto", interpolation='none')
+        ax.set_yticks(range(7))
+        ax.set_yticklabels(DAY_LABELS)
+        ax.set_xticks([])
+        self._figures[num_weeks] = (fig, ax, im)
+        return fig, ax
+
+    def render(self, mat, cats, year, field, out_path: pathlib.Path):
+        cmap, norm = _category_cmap(cats)
+        fig, ax = self._figure(mat.shape[1], mat, cmap, norm)
+        ax.set_title(f"{year} - {field}")
+        ax.legend(_legend_handles(cmap, cats), cats, bbox_to_anchor=(1.01,1), loc='upper left')
+        with metrics.span("heatmap.layout"):
+            fig.tight_layout()
+        with metrics.span("heatmap.savefig", backend="matplotlib"):
+            fig.savefig(out_path)
+        logging.info(f"保存热力图 {out_path}")
+
+    def render_combined(self, matrices_by_year, out_path: pathlib.Path, fields=FIELDS):
+        # 所有字段（以及多个年份）画在同一张图里：每个字段一组子图，按年份排列，图例放在右侧一列、每组只画一个
+        # matrices_by_year: {year: {field: (mat, cats)}}，同一字段各年份应使用相同的类别
+        from matplotlib.figure import Figure
+        years = sorted(matrices_by_year)
+        num_weeks = max(m[fields[0]][0].shape[1] for m in matrices_by_year.values())
+        rows = len(fields) * len(years)
+        width = min(18, num_weeks*0.25)
+        fig = Figure(figsize=(width + 2.5, 0.5 + 1.5 * rows))
+        grid = fig.add_gridspec(rows, 2, width_ratios=[width, 2.5])
+        for i, field in enumerate(fields):
+            first = i * len(years)
+            for j, year in enumerate(years):
+                mat, cats = matrices_by_year[year][field]
+                cmap, norm = _category_cmap(cats)
+                ax = fig.add_subplot(grid[first + j, 0])
+                ax.imshow(mat, cmap=cmap, norm=norm, aspect="auto", interpolation='none')
+                ax.set_yticks(range(7))
+                ax.set_yticklabels(DAY_LABELS)
+                ax.set_xticks([])
+                ax.set_title(f"{year} - {field}")
+            legend_ax = fig.add_subplot(grid[first:first + len(years), 1])
+            legend_ax.axis("off")
+            legend_ax.legend(_legend_handles(cmap, cats), cats, loc='upper left')
+        with metrics.span("heatmap.layout"):
+            fig.tight_layout()
+        with metrics.span("heatmap.savefig", backend="matplotlib"):
+            fig.savefig(out_path)
+        logging.info(f"保存合并热力图 {out_path}")
+
+    def close(self):
+        self._figures.clear()
+
+# 共享的渲染器有可变状态，后台任务并发时串行化绘图
+_render_lock = threading.Lock()
+_renderer = HeatmapRenderer()
+
+def render_category_heatmap(mat, cats, year, field, out_path: pathlib.Path, backend=DEFAULT_BACKEND):
+    _check_backend(backend)
+    if backend == "pillow":
+        # 不使用共享状态，无需加锁
+        import pil_heatmap
+        with metrics.span("heatmap.render", backend=backend):
+            pil_heatmap.render_category_heatmap(mat, cats, year, field, out_path)
         return
+    # 包含等待 _render_lock 的时间；heatmap.layout / heatmap.savefig 是其中的绘图部分
+    with metrics.span("heatmap.render", backend=backend), _render_lock:
+        _renderer.render(mat, cats, year, field, out_path)
+
+def render_combined_heatmap(matrices_by_year, out_path: pathlib.Path, fields=FIELDS):
+    with metrics.span("heatmap.render", backend="matplotlib", layout="combined"), _render_lock:
+        _renderer.render_combined(matrices_by_year, out_path, fields)
+
+def make_category_heatmap(records, year, field, out_path: pathlib.Path, backend=DEFAULT_BACKEND):
+    # records: RecordStore（或旧的 list of dict，会先转换）
+    with metrics.span("make_category_heatmap", backend=backend):
+        mat, cats = build_category_matrices(records, year, (field,))[field]
+        render_category_heatmap(mat, cats, year, field, out_path, backend=backend)
+
+# 修补缓存中的年度矩阵时串行化
+_year_matrices_lock = threading.Lock()
+
+def _remember_matrices(base_dir, year, matrices, generation):
+    # 缓存中的矩阵只会被整体替换，已经交给渲染的矩阵不会再被修改
+    nbytes = sum(mat.nbytes + 64 * len(cats) for mat, cats in matrices.values())
+    memory_cache.put(_vault_key(base_dir), "matrices", year, (generation, matrices), nbytes)
+
+def _store_generation(base_dir, store):
+    # load_record_store 返回的 store 所对应的索引 generation；回退到全量扫描时为 None（不会被修补）
+    cached = memory_cache.get(_vault_key(base_dir), "records", RECORDS_KEY)
+    return cached[0] if cached and cached[1] is store else None
+
+def _render_fields(cache, out_dir: pathlib.Path, year, matrices, report, only_existing=False, progress=None,
+                   backend=DEFAULT_BACKEND):
+    # backend=None 时沿用该图片上次渲染时的后端（增量更新用）
+    from render_cache import render_key
+    for done, field in enumerate(FIELDS):
+        if progress:
+            progress(images_done=done, images_total=len(FIELDS))
+        filename = f"{year}_{field}.png"
+        if only_existing and not (out_dir / filename).exists():
+            continue
+        mat, cats = matrices[field]
+        image_backend = backend or (cache.backend(filename) if cache is not None else None) or DEFAULT_BACKEND
+        if cache is not None:
+            key = render_key(year, field, mat, cats, _palette_tag(image_backend))
+            if cache.lookup(filename, key):
+                report["hits"].append(filename)
+                continue
+        render_category_heatmap(mat, cats, year, field, out_dir / filename, backend=image_backend)
+        report["misses"].append(filename)
+        if cache is not None:
+            cache.store(filename, key, year, backend=image_backend)
+    if progress:
+        progress(images_done=len(FIELDS), images_total=len(FIELDS))
+
+def combined_filename(years):
+    years = sorted(years)
+    if len(years) == 1:
+        return f"{years[0]}_combined.png"
+    return f"{years[0]}-{years[-1]}_combined.png"
+
+def _render_combined(cache, out_dir: pathlib.Path, matrices_by_year, report, progress=None):
+    from render_cache import render_key, combined_render_key
+    years = sorted(matrices_by_year)
+    filename = combined_filename(years)
+    if progress:
+        progress(images_done=0, images_total=1)
+    if cache is not None:
+        key = combined_render_key(render_key(y, f, *matrices_by_year[y][f], PALETTE) for y in years for f in FIELDS)
+        if cache.lookup(filename, key):
+            report["hits"].append(filename)
+            filename = None
+    if filename:
+        render_combined_heatmap(matrices_by_year, out_dir / filename)
+        report["misses"].append(filename)
+        if cache is not None:
+            # 按起始年份记账，起始年份的数据被删除时随之淘汰
+            cache.store(filename, key, years[0])
+    if progress:
+        progress(images_done=1, images_total=1)
+
+@metrics.timed("generate_combined_heatmap")
+def generate_combined_heatmap(base_dir: pathlib.Path, years, use_cache=True, progress=None):
+    # 所有字段、一个或多个年份合成一张 heatmaps/<年份>_combined.png，整批只创建一个 figure、保存一次
+    # 返回格式与 generate_all_heatmaps 相同的缓存报告
+    from render_cache import get_render_cache
+    report = {"hits": [], "misses": [], "evicted": []}
+    years = sorted(set(years))
+    store = load_record_store(base_dir, years=years)
+    if progress:
+        progress(files_scanned=len(store))
+    if not len(store) or not years:
+        logging.info("没有找到元数据记录，跳过热力图。")
+        return report
     out_dir = base_dir / "heatmaps"
     out_dir.mkdir(exist_ok=True)
-    for field in ("Emotion","Appetite","Confidence"):
-        out_path = out_dir / f"{year}_{field}.png"
-        make_category_heatmap(records, year, field, out_path)
-    logging.info("热力图生成完毕，保存在 heatmaps 子目录。")
+    cache = get_render_cache(base_dir, out_dir) if use_cache else None
+    matrices_by_year = {}
+    generation = _store_generation(base_dir, store)
+    for year in years:
+        matrices_by_year[year] = build_category_matrices(store, year, FIELDS)
+        _remember_matrices(base_dir, year, matrices_by_year[year], generation)
+    _render_combined(cache, out_dir, matrices_by_year, report, progress=progress)
+    if cache is not None:
+        cache.save()
+    logging.info(f"合并热力图生成完毕：{combined_filename(years)}，缓存命中 {len(report['hits'])}")
+    return report
+
+@metrics.timed("generate_all_heatmaps")
+def generate_all_heatmaps(base_dir: pathlib.Path, year: int, use_cache=True, max_cached_years=None, progress=None,
+                          layout="separate", backend=DEFAULT_BACKEND):
+    # 返回本次请求的缓存报告 {"hits": [...], "misses": [...], "evicted": [...]}
+    # progress(**counts) 用于后台任务汇报进度：files_scanned / images_done / images_total
+    # layout="combined" 时三个字段画在同一张 <年份>_combined.png 里（只支持 matplotlib 后端）
+    _check_backend(backend)
+    if layout == "combined":
+        if backend != "matplotlib":
+            raise ValueError("combined 布局只支持 matplotlib 后端")
+        return generate_combined_heatmap(base_dir, [year], use_cache=use_cache, progress=progress)
+    if layout != "separate":
+        raise ValueError(f"未知的 layout: {layout}")
+    from render_cache import get_render_cache
+    report = {"hits": [], "misses": [], "evicted": []}
+    store = load_record_store(base_dir, years=[year])
+    if progress:
+        progress(files_scanned=len(store))
+    if not len(store):
+        logging.info("没有找到元数据记录，跳过热力图。")
+        return report
+    out_dir = base_dir / "heatmaps"
+    out_dir.mkdir(exist_ok=True)
+    cache = get_render_cache(base_dir, out_dir) if use_cache else None
+    matrices = build_category_matrices(store, year, FIELDS)
+    _remember_matrices(base_dir, year, matrices, _store_generation(base_dir, store))
+    _render_fields(cache, out_dir, year, matrices, report, progress=progress, backend=backend)
+    if cache is not None:
+        # 数据里已经没有的年份直接淘汰，当前请求的年份总是保留
+        keep_years = set(store.years()) | {year}
+        report["evicted"] = cache.evict(keep_years=keep_years, max_years=max_cached_years)
+        cache.save()
+    logging.info(f"热力图生成完毕，保存在 heatmaps 子目录。缓存命中 {len(report['hits'])}，"
+                 f"重新渲染 {len(report['misses'])}，淘汰 {len(report['evicted'])}")
+    return report
+
+@metrics.timed("update_heatmaps_for_entry")
+def update_heatmaps_for_entry(base_dir: pathlib.Path, path: pathlib.Path, only_existing=True):
+    # 保存单篇日记后调用：只在索引中更新这一个文件，修补缓存矩阵里对应日期的格子，
+    # 再只重绘受影响年份里内容真正变化的图；only_existing 时只更新已经生成过的图
+    # 每张图沿用上次渲染时的后端（matplotlib / pillow）
+    import numpy as np
+    from record_store import RecordStore
+    from render_cache import get_render_cache
+    report = {"hits": [], "misses": [], "evicted": []}
+    base_dir = pathlib.Path(base_dir)
+    out_dir = base_dir / "heatmaps"
+    index = get_index(base_dir)
+    before = index.generation()
+    old_day, rec = index.update_file(path)
+    # update_file 只递增一次 generation；增量不止 1 说明期间还有别的写入，缓存的矩阵不能只修补这几天
+    after = index.generation()
+    patchable = after == before + 1
+    days = set()
+    if old_day:
+        days.add(date.fromordinal(old_day))
+    if rec and rec["date"]:
+        days.add(rec["date"])
+    if not days or (only_existing and not out_dir.exists()):
+        return report
+    out_dir.mkdir(exist_ok=True)
+    # 图例类别取自全库；如果这次保存引入/去掉了某个类别，其他年份的图会在下次 generate_all_heatmaps 时因缓存键变化而重绘
+    categories = {field: index.distinct_labels(field) for field in FIELDS}
+    cache = get_render_cache(base_dir, out_dir)
+    for year in sorted({d.year for d in days}):
+        with _year_matrices_lock:
+            cached = memory_cache.get(_vault_key(base_dir), "matrices", year)
+            if (not patchable or cached is None or cached[0] != before
+                    or any(cached[1][f][1] != categories[f] for f in FIELDS)):
+                # 没有可修补的矩阵：只读取这一年的索引行重建（最多几百行，不扫描目录）
+                # 与 load_record_store 一样先读 generation 再读数据
+                generation = index.generation()
+                rows = index.rows_between(date(year, 1, 1), date(year, 12, 31))
+                matrices = build_category_matrices(RecordStore.from_rows(rows, VOCABULARIES), year,
+                                                   FIELDS, categories=categories)
+            else:
+                generation = after
+                # 复制后再修补，其他线程可能正在渲染缓存中的那一份
+                matrices = {field: (mat.copy(), cats) for field, (mat, cats) in cached[1].items()}
+                first_sunday, _ = year_grid(year)
+                for d in days:
+                    if d.year != year:
+                        continue
+                    offset = d.toordinal() - first_sunday.toordinal()
+                    # 同一天可能有多个文件，与全量构建一样取排序后的最后一条
+                    same_day = index.rows_between(d, d)
+                    for column, field in enumerate(FIELDS, start=2):
+                        mat, cats = matrices[field]
+                        label = same_day[-1][column] if same_day else None
+                        mat[offset % 7, offset // 7] = cats.index(label) if label in cats else np.nan
+            _remember_matrices(base_dir, year, matrices, generation)
+        _render_fields(cache, out_dir, year, matrices, report, only_existing=only_existing, backend=None)
+        if (out_dir / combined_filename([year])).exists():
+            _render_combined(cache, out_dir, {year: matrices}, report)
+    cache.save()
+    logging.info(f"增量更新热力图 {sorted(d.isoformat() for d in days)}：缓存命中 {len(report['hits'])}，"
+                 f"重新渲染 {len(report['misses'])}")
+    return report
 
 def main():
     base_dir_input = input(f"日记目录（回车默认 {DEFAULT_DIR}）: ").strip()
@@ -0,0 +1,125 @@
+"""
+不经过 matplotlib 的热力图渲染（NumPy + Pillow）
+- 类别矩阵直接查颜色表（categories.FIELD_COLORS）得到 RGB uint8 数组，按格子放大后编码为 PNG
+- 星期标签和图例与数据无关，按 (字段, 类别) 预先画好并缓存，每张图只需要画标题
+- 不使用 pyplot 的全局状态，可以在多个线程中同时渲染
+"""
+
+import functools
+import logging
+import pathlib
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import metrics
+from categories import category_colors
+
+CELL = 14           # 每个格子的边长（像素），含 1 像素间隔
+GAP = 1
+LABEL_WIDTH = 36    # 左侧星期标签宽度
+TITLE_HEIGHT = 26
+PADDING = 8
+SWATCH = 12
+LEGEND_ROW = 18
+BACKGROUND = (255, 255, 255)
+EMPTY_COLOR = "#F8F8F8"     # 没有记录的日期，与 diary_gui 未选中时的颜色一致
+TEXT_COLOR = (40, 40, 40)
+DAY_LABELS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+# 按顺序尝试能显示中文的字体，都没有时用 Pillow 自带字体
+FONT_CANDIDATES = (
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+)
+
+
+def _hex_to_rgb(value):
+    value = value.lstrip("#")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(size=12):
+    for candidate in FONT_CANDIDATES:
+        if pathlib.Path(candidate).exists():
+            try:
+                return ImageFont.truetype(candidate, size)
+            except OSError:
+                continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 的内置字体不能指定大小
+        return ImageFont.load_default()
+
+
+def color_table(field, cats):
+    """图例序号 -> RGB 的 (len(cats) + 1, 3) 数组，最后一行是空白日期的颜色"""
+    rows = [_hex_to_rgb(c) for c in category_colors(field, cats)] + [_hex_to_rgb(EMPTY_COLOR)]
+    return np.array(rows, dtype=np.uint8)
+
+
+@functools.lru_cache(maxsize=None)
+def _day_labels():
+    img = Image.new("RGB", (LABEL_WIDTH, 7 * CELL), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    font = load_font(10)
+    for i, label in enumerate(DAY_LABELS):
+        draw.text((LABEL_WIDTH - 4, i * CELL + CELL // 2), label, fill=TEXT_COLOR, font=font, anchor="rm")
+    return np.asarray(img)
+
+
+@functools.lru_cache(maxsize=64)
+def legend_strip(field, cats):
+    """预先画好的图例（RGB 数组）；cats 需为 tuple 以便缓存"""
+    font = load_font(12)
+    table = color_table(field, cats)
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    text_width = max([measure.textlength(c, font=font) for c in cats] or [0])
+    width = int(PADDING + SWATCH + 6 + text_width + PADDING)
+    img = Image.new("RGB", (width, max(1, len(cats)) * LEGEND_ROW), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    for i, cat in enumerate(cats):
+        y = i * LEGEND_ROW + (LEGEND_ROW - SWATCH) // 2
+        draw.rectangle((PADDING, y, PADDING + SWATCH - 1, y + SWATCH - 1), fill=tuple(int(v) for v in table[i]))
+        draw.text((PADDING + SWATCH + 6, i * LEGEND_ROW + LEGEND_ROW // 2), cat, fill=TEXT_COLOR, font=font,
+                  anchor="lm")
+    return np.asarray(img)
+
+
+def grid_pixels(mat, table):
+    """7 x num_weeks 的类别矩阵 -> 放大后的 RGB 数组，格子之间留 GAP 像素背景色"""
+    idx = np.where(np.isnan(mat), len(table) - 1, np.nan_to_num(mat, nan=0)).astype(np.intp)
+    rgb = table[idx]
+    rgb = np.repeat(np.repeat(rgb, CELL, axis=0), CELL, axis=1)
+    if GAP:
+        # 每个格子的最后 GAP 行/列涂成背景色
+        rgb[CELL - GAP::CELL, :] = BACKGROUND
+        rgb[:, CELL - GAP::CELL] = BACKGROUND
+    return rgb
+
+
+def render_category_heatmap(mat, cats, year, field, out_path: pathlib.Path):
+    cats = tuple(cats)
+    grid = grid_pixels(mat, color_table(field, cats))
+    labels = _day_labels()
+    legend = legend_strip(field, cats)
+    body_height = max(grid.shape[0], legend.shape[0])
+    height = TITLE_HEIGHT + body_height + PADDING
+    width = LABEL_WIDTH + grid.shape[1] + legend.shape[1]
+    canvas = np.empty((height, width, 3), dtype=np.uint8)
+    canvas[:] = BACKGROUND
+    top = TITLE_HEIGHT
+    canvas[top:top + labels.shape[0], :LABEL_WIDTH] = labels
+    canvas[top:top + grid.shape[0], LABEL_WIDTH:LABEL_WIDTH + grid.shape[1]] = grid
+    canvas[top:top + legend.shape[0], LABEL_WIDTH + grid.shape[1]:] = legend
+    img = Image.fromarray(canvas)
+    ImageDraw.Draw(img).text((LABEL_WIDTH + grid.shape[1] // 2, TITLE_HEIGHT // 2), f"{year} - {field}",
+                             fill=TEXT_COLOR, font=load_font(14), anchor="mm")
+    with metrics.span("heatmap.encode", backend="pillow"):
+        img.save(out_path, format="PNG")
+    logging.info(f"保存热力图 {out_path}")
@@ -0,0 +1,84 @@
+"""
+列式记录存储
+- 日期存为 int32 序数（date.toordinal），没有日期的记录为 0
+- Emotion/Appetite/Confidence 存为 int16 类别编码，缺失为 -1
+- 编码字典以固定词表（EMOTIONS/APPETITES/CONFIDENCES）开头，遇到词表外的旧值再追加
+"""
+
+from datetime import date
+
+import numpy as np
+
+FIELDS = ("Emotion", "Appetite", "Confidence")
+MISSING = -1
+NO_DATE = 0
+
+
+class RecordStore:
+    """按日期排序的列式记录集合，只用于构建热力图（图片和 /heatmap_data 的日历数据）；
+    历史查询直接分页读取元数据索引（MetadataIndex.page），统计读取索引中的汇总表"""
+
+    def __init__(self, days, codes, vocab):
+        order = np.argsort(days, kind="stable")
+        self.days = np.asarray(days, dtype=np.int32)[order]
+        self.codes = {f: np.asarray(codes[f], dtype=np.int16)[order] for f in FIELDS}
+        self.vocab = {f: list(vocab[f]) for f in FIELDS}
+        self._present = {}
+
+    @classmethod
+    def from_rows(cls, rows, vocabularies):
+        """rows: (day 序数或 None, 原始 Date 文本, Emotion, Appetite, Confidence) 元组（原始 Date 不保存）"""
+        vocab = {f: list(vocabularies.get(f, ())) for f in FIELDS}
+        lookup = {f: {label: i for i, label in enumerate(vocab[f])} for f in FIELDS}
+        days = []
+        codes = {f: [] for f in FIELDS}
+        for day, _, *values in rows:
+            days.append(day or NO_DATE)
+            for f, value in zip(FIELDS, values):
+                if not value:
+                    codes[f].append(MISSING)
+                    continue
+                code = lookup[f].get(value)
+                if code is None:
+                    code = lookup[f][value] = len(vocab[f])
+                    vocab[f].append(value)
+                codes[f].append(code)
+        return cls(days, codes, vocab)
+
+    @classmethod
+    def from_records(cls, records, vocabularies):
+        """兼容旧的 list-of-dict 记录（scan_folder_for_metadata 的返回值）"""
+        rows = ((r["date"].toordinal() if r.get("date") else None, None,
+                 r.get("Emotion"), r.get("Appetite"), r.get("Confidence")) for r in records)
+        return cls.from_rows(rows, vocabularies)
+
+    def __len__(self):
+        return len(self.days)
+
+    def nbytes(self):
+        """内存占用的粗略估计（数组 + 词表），用于 memory_cache 的预算"""
+        size = self.days.nbytes + sum(c.nbytes for c in self.codes.values())
+        size += sum(len(label) * 4 + 64 for labels in self.vocab.values() for label in labels)
+        return size
+
+    def select(self, mask):
+        """按布尔掩码取子集，共享同一份编码字典"""
+        return RecordStore(self.days[mask], {f: self.codes[f][mask] for f in FIELDS}, self.vocab)
+
+    def between(self, start: date, end: date):
+        """[start, end] 闭区间内的记录"""
+        return self.select((self.days >= start.toordinal()) & (self.days <= end.toordinal()))
+
+    def for_year(self, year: int):
+        return self.between(date(year, 1, 1), date(year, 12, 31))
+
+    def years(self):
+        dated = self.days[self.days != NO_DATE]
+        return sorted({date.fromordinal(int(d)).year for d in np.unique(dated)})
+
+    def present_labels(self, field):
+        """实际出现过的类别（按文本排序，与旧版热力图图例顺序一致），结果会被缓存"""
+        if field not in self._present:
+            used = np.unique(self.codes[field][self.codes[field] != MISSING])
+            self._present[field] = sorted(self.vocab[field][c] for c in used)
+        return self._present[field]
@@ -0,0 +1,126 @@
+"""
+热力图渲染缓存
+- 以 (年份, 字段, 类别矩阵, 图例, 调色板) 的哈希作为缓存键，键不变且 PNG 仍在时跳过 matplotlib
+- 清单保存在日记目录下的 .mdjournal/render_cache.json
+- 淘汰策略：数据中已不存在的年份直接淘汰，其余按最近使用时间保留 max_years 个年份
+"""
+
+import hashlib
+import json
+import logging
+import pathlib
+import threading
+import time
+
+import numpy as np
+
+import metrics
+from atomic_write import atomic_write
+from metadata_index import INDEX_DIRNAME
+
+MANIFEST_FILENAME = "render_cache.json"
+# 渲染代码变化时递增，让旧缓存全部失效
+RENDER_VERSION = 1
+
+
+def render_key(year, field, mat, cats, palette):
+    """渲染输入的内容哈希"""
+    h = hashlib.sha1()
+    h.update(f"{RENDER_VERSION}|{year}|{field}|{palette}|{mat.shape}".encode("utf-8"))
+    h.update(json.dumps(list(cats), ensure_ascii=False).encode("utf-8"))
+    h.update(np.nan_to_num(mat, nan=-1).astype(np.int16).tobytes())
+    return h.hexdigest()
+
+
+def combined_render_key(keys):
+    """多张子图合成一张图时的缓存键：按顺序组合各子图的键"""
+    h = hashlib.sha1(f"{RENDER_VERSION}|combined".encode("utf-8"))
+    for key in keys:
+        h.update(key.encode("ascii"))
+    return h.hexdigest()
+
+
+class RenderCache:
+    """记录 heatmaps 目录下每张图对应的缓存键"""
+
+    def __init__(self, base_dir: pathlib.Path, out_dir: pathlib.Path):
+        self.out_dir = pathlib.Path(out_dir)
+        self.manifest_path = pathlib.Path(base_dir) / INDEX_DIRNAME / MANIFEST_FILENAME
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == RENDER_VERSION:
+                return data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def save(self):
+        with self._lock:
+            payload = {"version": RENDER_VERSION, "entries": self._entries}
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.manifest_path, json.dumps(payload, ensure_ascii=False, indent=1), newline="",
+                         fsync=False)
+
+    def lookup(self, filename, key):
+        """缓存命中时返回 True 并刷新最近使用时间"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            hit = bool(entry and entry["key"] == key and (self.out_dir / filename).exists())
+            if hit:
+                entry["last_used"] = time.time()
+        metrics.cache_result("render", hit)
+        return hit
+
+    def store(self, filename, key, year, backend=None):
+        with self._lock:
+            self._entries[filename] = {"key": key, "year": year, "last_used": time.time()}
+            if backend:
+                self._entries[filename]["backend"] = backend
+
+    def backend(self, filename):
+        """该图片上次渲染时使用的后端（没有记录时返回 None）"""
+        with self._lock:
+            return self._entries.get(filename, {}).get("backend")
+
+    def evict(self, keep_years=None, max_years=None):
+        """淘汰不在 keep_years 中的年份，以及超出 max_years 的最久未使用年份；返回被删除的文件名"""
+        with self._lock:
+            stale = set()
+            if keep_years is not None:
+                keep_years = set(keep_years)
+                stale |= {name for name, e in self._entries.items() if e["year"] not in keep_years}
+            if max_years is not None:
+                last_used = {}
+                for name, e in self._entries.items():
+                    if name not in stale:
+                        last_used[e["year"]] = max(last_used.get(e["year"], 0), e["last_used"])
+                recent = sorted(last_used, key=last_used.get, reverse=True)[:max_years]
+                stale |= {name for name, e in self._entries.items() if e["year"] not in recent}
+            for name in sorted(stale):
+                del self._entries[name]
+                try:
+                    (self.out_dir / name).unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"删除缓存图片 {name} 失败：{e}")
+            return sorted(stale)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_render_cache(base_dir: pathlib.Path, out_dir: pathlib.Path) -> RenderCache:
+    """按目录复用 RenderCache，避免并发任务各自加载、保存清单时互相覆盖"""
+    key = (pathlib.Path(base_dir).resolve(), pathlib.Path(out_dir).resolve())
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = RenderCache(*key)
+        return cache
@@ -0,0 +1,274 @@
+"""
+日记正文全文检索（倒排索引）
+- 表与元数据索引放在同一个 .mdjournal/index.sqlite 中，但不随元数据刷新维护：
+  第一次检索时才建立，之后每次检索前按 entries 表的内容哈希增量补齐（MetadataIndex.search）
+- 只保存词表和倒排表，不复制正文；核对和生成摘要时读取日记文件本身
+- 分词（转为小写后）：中日韩文字取相邻两字（bigram），只有一个字时取单字；
+  其他文字按单词切分后取相邻三个字符（trigram），不足三个字符的单词取整个单词
+- 查询串的每个词都按子串匹配（单词中间的一段也能命中），结果与逐篇扫描正文、检查是否包含查询串的每一段一致
+- 查询时按词频选择从最少见的词的倒排表出发，或按日期倒序遍历并凑够一页即停止；
+  其余词用主键查找过滤，最后核对原文确实包含查询串，只读取一页所需的正文
+"""
+
+import pathlib
+import re
+
+# 中日韩文字（假名、汉字、谚文）
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_CJK_RE = re.compile(f"[{_CJK}]")
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W{_CJK}_]+")
+# 单字或一两个字符的短词展开成的词数超过此值时不再用于过滤，只做原文核对
+MAX_EXPANSION = 256
+# 所有条件组都因展开过多被跳过时只能逐篇核对原文，最多读取这么多篇（按日期倒序），避免读遍整个目录
+MAX_SCAN_BODIES = 2000
+SNIPPET_CONTEXT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc         INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL UNIQUE,
+    hash        TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term        TEXT NOT NULL,
+    doc         INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings(doc);
+CREATE TABLE IF NOT EXISTS terms (
+    term        TEXT PRIMARY KEY,
+    df          INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+TABLES = ("documents", "postings", "terms")
+# 一次加入的文档数超过此值时先删掉 postings_doc 索引，写完后重建（比逐行维护二级索引快）
+BULK_DOCUMENTS = 1000
+# meta 表中记录倒排表对应的元数据索引版本号（generation），相同时检索前不需要比较
+GENERATION_KEY = "search_generation"
+
+
+def entry_body(data: bytes) -> str:
+    """文件内容中 frontmatter 之后的正文"""
+    text = data.decode("utf-8", errors="replace")
+    lines = text.splitlines(keepends=True)
+    if lines and lines[0].strip() == "---":
+        for i in range(1, len(lines)):
+            if lines[i].strip() == "---":
+                return "".join(lines[i + 1:])
+    return text
+
+
+def _is_cjk(token):
+    return bool(_CJK_RE.match(token))
+
+
+def document_terms(text: str):
+    """正文的词集合"""
+    terms = set()
+    for token in _TOKEN_RE.findall(text.lower()):
+        if _is_cjk(token):
+            if len(token) == 1:
+                terms.add(token)
+            else:
+                terms.update(token[i:i + 2] for i in range(len(token) - 1))
+        elif len(token) < 3:
+            terms.add(token)
+        else:
+            terms.update(token[i:i + 3] for i in range(len(token) - 2))
+    return terms
+
+
+def query_groups(query: str):
+    """查询串 -> 条件组列表，各组之间为 AND；每组是
+    ("exact", 词)、("cjk_char", 单个汉字) 或 ("infix", 一两个字符的非中日韩短词)
+    """
+    groups = []
+    for token in _TOKEN_RE.findall(query.lower()):
+        if _is_cjk(token):
+            if len(token) == 1:
+                groups.append(("cjk_char", token))
+            else:
+                groups.extend(("exact", token[i:i + 2]) for i in range(len(token) - 1))
+        elif len(token) < 3:
+            groups.append(("infix", token))
+        else:
+            groups.extend(("exact", token[i:i + 3]) for i in range(len(token) - 2))
+    return list(dict.fromkeys(groups))
+
+
+def _adjust_df(conn, counts, delta):
+    """counts 为 {词: 文档数} 或词的集合（每个词计 1）"""
+    if not isinstance(counts, dict):
+        counts = dict.fromkeys(counts, 1)
+    conn.executemany(
+        "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+        [(t, n * delta) for t, n in counts.items()])
+    if delta < 0:
+        conn.executemany("DELETE FROM terms WHERE term = ? AND df <= 0", [(t,) for t in counts])
+
+
+def remove_document(conn, name):
+    row = conn.execute("SELECT doc FROM documents WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return
+    doc = row[0]
+    terms = [t for t, in conn.execute("SELECT term FROM postings WHERE doc = ?", (doc,))]
+    conn.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+    _adjust_df(conn, terms, -1)
+    conn.execute("DELETE FROM documents WHERE doc = ?", (doc,))
+
+
+def rename_document(conn, old_name, new_name):
+    remove_document(conn, new_name)
+    conn.execute("UPDATE documents SET name = ? WHERE name = ?", (new_name, old_name))
+
+
+def index_documents(conn, docs):
+    """把 [(name, digest, 正文)] 加入倒排表；digest 为文件内容哈希，与 entries.hash 比较判断是否需要重建
+
+    倒排表按 (词, 文档) 排序后一次写入，文档频率合并后每个词只更新一次，首次建立整个索引时比逐篇写入快得多
+    """
+    postings = []
+    counts = {}
+    for name, digest, body in docs:
+        remove_document(conn, name)
+        doc = conn.execute("INSERT INTO documents (name, hash) VALUES (?, ?)", (name, digest)).lastrowid
+        for t in document_terms(body):
+            postings.append((t, doc))
+            counts[t] = counts.get(t, 0) + 1
+    postings.sort()
+    bulk = len(docs) > BULK_DOCUMENTS
+    if bulk:
+        conn.execute("DROP INDEX IF EXISTS postings_doc")
+    conn.executemany("INSERT INTO postings (term, doc) VALUES (?, ?)", postings)
+    if bulk:
+        conn.execute("CREATE INDEX postings_doc ON postings(doc)")
+    _adjust_df(conn, counts, 1)
+
+
+def pending(conn):
+    """与 entries 表比较：返回 (需要移除的文档名, 需要建立或重建的文档名)"""
+    stale = [name for name, in conn.execute(
+        "SELECT d.name FROM documents d LEFT JOIN entries e ON e.name = d.name "
+        "WHERE e.name IS NULL OR e.ok = 0 OR e.hash != d.hash")]
+    missing = [name for name, in conn.execute(
+        "SELECT e.name FROM entries e LEFT JOIN documents d ON d.name = e.name "
+        "WHERE e.ok = 1 AND (d.name IS NULL OR d.hash != e.hash)")]
+    return stale, missing
+
+
+def read_body(base_dir: pathlib.Path, name):
+    """日记文件的正文；文件已被删除或无法读取时返回 None"""
+    try:
+        data = (pathlib.Path(base_dir) / name).read_bytes()
+    except OSError:
+        return None
+    return entry_body(data)
+
+
+def _expand(conn, kind, value):
+    """条件组 -> (词列表, 总文档频率)；展开过多时返回 None"""
+    if kind == "exact":
+        rows = conn.execute("SELECT term, df FROM terms WHERE term = ?", (value,)).fetchall()
+    elif kind == "cjk_char":
+        # 单字出现在以它开头或结尾的 bigram 中（或本身就是单字词）
+        rows = conn.execute(
+            "SELECT term, df FROM terms WHERE term = ? OR (term >= ? AND term < ?) OR term LIKE ?",
+            (value, value, value + "\uffff", "_" + value)).fetchall()
+    else:
+        # 一两个字符的短词：本身就是一个短单词，或出现在某个 trigram 之中
+        rows = conn.execute("SELECT term, df FROM terms WHERE instr(term, ?) > 0 LIMIT ?",
+                            (value, MAX_EXPANSION + 1)).fetchall()
+    if len(rows) > MAX_EXPANSION:
+        return None
+    return [t for t, _ in rows], sum(df for _, df in rows)
+
+
+def snippet(body, needle):
+    i = body.lower().find(needle)
+    if i < 0:
+        return body[:2 * SNIPPET_CONTEXT].strip().replace("\n", " ")
+    start = max(0, i - SNIPPET_CONTEXT)
+    text = body[start:i + len(needle) + SNIPPET_CONTEXT].strip().replace("\n", " ")
+    return ("…" if start > 0 else "") + text
+
+
+def _exists(terms):
+    return f"EXISTS (SELECT 1 FROM postings q WHERE q.doc = d.doc AND q.term IN ({','.join('?' * len(terms))}))"
+
+
+def search(conn, base_dir: pathlib.Path, query, start_day=None, end_day=None, emotion=None, limit=20, offset=0):
+    """返回 (name, day 序数, Emotion, 摘要) 列表，按日期倒序；查询串中以空白分隔的每一段都必须出现在正文中
+
+    两种执行方式取代价较小的一种：
+    - 候选来自最少见的词（约 df 行），按日期排序后依次核对
+    - 按日期倒序遍历日记，逐篇用主键检查是否含有各个词，凑够 limit 条即停止（约 limit * 总数 / df 行）
+    正文只对排好序的候选逐篇从 base_dir 中的文件读取，凑够结果后不再读取；
+    没有任何条件组可用于过滤时最多读取 MAX_SCAN_BODIES 篇，结果可能不完整
+    查询串中没有可检索的文字（如只有标点）时抛出 ValueError
+    """
+    parts = [p.lower() for p in query.split()]
+    if not query_groups(query):
+        raise ValueError("查询串中没有可检索的文字")
+    groups = []
+    for kind, value in query_groups(query):
+        expanded = _expand(conn, kind, value)
+        if expanded is None:
+            continue
+        terms, df = expanded
+        if not terms:
+            # 某个词从未出现过
+            return []
+        groups.append((df, terms))
+    groups.sort(key=lambda g: g[0])
+
+    total = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    where = ["e.ok = 1"]
+    params = []
+    rarest = groups[0] if groups else None
+    if rarest and rarest[0] < (limit + offset) * total / max(1, rarest[0]):
+        # 从最少见的词的倒排表出发
+        sql = ("SELECT DISTINCT d.name, e.day, e.emotion FROM postings p "
+               "JOIN documents d ON d.doc = p.doc JOIN entries e ON e.name = d.name")
+        where.append(f"p.term IN ({','.join('?' * len(rarest[1]))})")
+        params.extend(rarest[1])
+        others = groups[1:]
+    else:
+        # 常见词（或只有高频单字/短前缀）：按日期顺序遍历，提前停止
+        sql = "SELECT d.name, e.day, e.emotion FROM entries e JOIN documents d ON d.name = e.name"
+        others = groups
+    for _, terms in others:
+        where.append(_exists(terms))
+        params.extend(terms)
+    if start_day is not None:
+        where.append("e.day >= ?")
+        params.append(start_day)
+    if end_day is not None:
+        where.append("e.day <= ?")
+        params.append(end_day)
+    if emotion:
+        where.append("e.emotion = ?")
+        params.append(emotion)
+    sql += f" WHERE {' AND '.join(where)} ORDER BY e.day DESC, e.name DESC"
+
+    results = []
+    skipped = 0
+    scan_limit = None if groups else MAX_SCAN_BODIES
+    for name, day, emo in conn.execute(sql, params):
+        if scan_limit is not None:
+            if scan_limit == 0:
+                break
+            scan_limit -= 1
+        body = read_body(base_dir, name)
+        if body is None:
+            continue
+        lowered = body.lower()
+        if not all(p in lowered for p in parts):
+            continue
+        if skipped < offset:
+            skipped += 1
+            continue
+        results.append((name, day, emo, snippet(body, parts[0])))
+        if len(results) >= limit:
+            break
+    return results
@@ -0,0 +1,150 @@
+"""
+统计查询（/stats），基于 MetadataIndex 中按 日/周/月/年 预先汇总的计数
+- 任意日期区间的总计拆成 整年 + 整月 + 零散的日，只读取 O(桶数) 行，与日记文件数无关
+- 按周/月/年分组时，区间两端不完整的桶再按上面的方法单独计算
+- 连续天数（streak）基于日汇总，只读取含该类别的日期
+"""
+
+from datetime import date, timedelta
+
+from metadata_index import ROLLUP_LEVELS, rollup_buckets
+
+GROUPS = ROLLUP_LEVELS
+
+
+def _month_start(bucket: int) -> date:
+    return date(bucket // 12, bucket % 12 + 1, 1)
+
+
+def _month_end(bucket: int) -> date:
+    if bucket % 12 == 11:
+        return date(bucket // 12, 12, 31)
+    return _month_start(bucket + 1) - timedelta(days=1)
+
+
+def bucket_range(level, bucket):
+    """桶覆盖的 [开始日期, 结束日期]"""
+    if level == "day":
+        d = date.fromordinal(bucket)
+        return d, d
+    if level == "week":
+        return date.fromordinal(bucket), date.fromordinal(min(bucket + 6, date.max.toordinal()))
+    if level == "month":
+        return _month_start(bucket), _month_end(bucket)
+    return date(bucket, 1, 1), date(bucket, 12, 31)
+
+
+def bucket_name(level, bucket):
+    if level == "day":
+        return date.fromordinal(bucket).isoformat()
+    if level == "week":
+        year, week, _ = date.fromordinal(bucket).isocalendar()
+        return f"{year}-W{week:02d}"
+    if level == "month":
+        return f"{bucket // 12}-{bucket % 12 + 1:02d}"
+    return str(bucket)
+
+
+def decompose(start: date, end: date):
+    """把 [start, end] 拆成尽量粗的桶区间 [(level, 起始桶, 结束桶), ...]，各段互不重叠且恰好覆盖整个区间"""
+    pieces = []
+    if start > end:
+        return pieces
+    cur = start
+    end_month = rollup_buckets(end.toordinal())["month"]
+    last_full_month = end_month if end == _month_end(end_month) else end_month - 1
+    while True:
+        if cur.month == 1 and cur.day == 1 and date(cur.year, 12, 31) <= end:
+            last = end.year if end == date(end.year, 12, 31) else end.year - 1
+            pieces.append(("year", cur.year, last))
+            stop = date(last, 12, 31)
+        elif cur.day == 1 and cur.year * 12 + cur.month - 1 <= last_full_month:
+            first = cur.year * 12 + cur.month - 1
+            last = min(last_full_month, cur.year * 12 + 11)
+            pieces.append(("month", first, last))
+            stop = _month_end(last)
+        else:
+            stop = min(end, _month_end(cur.year * 12 + cur.month - 1))
+            pieces.append(("day", cur.toordinal(), stop.toordinal()))
+        # 先判断是否到达 end，区间到 date.max 为止时不能再计算下一天
+        if stop >= end:
+            break
+        cur = stop + timedelta(days=1)
+    return pieces
+
+
+def _add(counts, label, n):
+    counts[label] = counts.get(label, 0) + n
+
+
+def totals(index, field, start: date = None, end: date = None):
+    """[start, end] 内各类别的条目数 {label: count}；不指定区间时统计全部"""
+    counts = {}
+    if start is None and end is None:
+        for _, label, n in index.rollup(field, "year"):
+            _add(counts, label, n)
+        return counts
+    if start is None or end is None:
+        # 只给出一端时，另一端取汇总表中最早 / 最晚的年份，区间不会延伸到 date.min / date.max
+        years = [bucket for bucket, _, _ in index.rollup(field, "year")]
+        if not years:
+            return counts
+        start = start or date(years[0], 1, 1)
+        end = end or date(years[-1], 12, 31)
+    if start > end:
+        return counts
+    for level, lo, hi in decompose(start, end):
+        for _, label, n in index.rollup(field, level, lo, hi):
+            _add(counts, label, n)
+    return counts
+
+
+def grouped(index, field, group, start: date = None, end: date = None):
+    """按 group（day/week/month/year）分组的计数 [(bucket, {label: count}), ...]，只包含有记录的桶"""
+    if group not in GROUPS:
+        raise ValueError(f"未知的分组: {group}")
+    lo = rollup_buckets(start.toordinal())[group] if start else None
+    hi = rollup_buckets(end.toordinal())[group] if end else None
+    result = {}
+    for bucket, label, n in index.rollup(field, group, lo, hi):
+        _add(result.setdefault(bucket, {}), label, n)
+    # 区间两端只覆盖了一部分的桶重新计算
+    for bucket in {lo, hi} - {None}:
+        first, last = bucket_range(group, bucket)
+        if (start and first < start) or (end and last > end):
+            counts = totals(index, field, max(first, start or first), min(last, end or last))
+            if counts:
+                result[bucket] = counts
+            else:
+                result.pop(bucket, None)
+    return sorted(result.items())
+
+
+def streaks(index, field, label, start: date = None, end: date = None, today: date = None):
+    """label 的连续天数：{"longest": {...}, "current": {...}}
+
+    current 为截止到 end（默认今天）的连续天数；当天还没写日记时从前一天算起
+    """
+    today = end or today or date.today()
+    rows = index.rollup(field, "day", start.toordinal() if start else None, today.toordinal())
+    days = [bucket for bucket, row_label, n in rows if row_label == label and n > 0]
+    longest = (0, None, None)
+    run_start = prev = None
+    for day in days:
+        if prev is None or day != prev + 1:
+            run_start = day
+        prev = day
+        if day - run_start + 1 > longest[0]:
+            longest = (day - run_start + 1, run_start, day)
+    current = (0, None, None)
+    if days and days[-1] >= today.toordinal() - 1:
+        current = (days[-1] - run_start + 1, run_start, days[-1])
+
+    def describe(run):
+        length, first, last = run
+        return {
+            "length": length,
+            "start": date.fromordinal(first).isoformat() if first else None,
+            "end": date.fromordinal(last).isoformat() if last else None,
+        }
+    return {"label": label, "longest": describe(longest), "current": describe(current)}
@@ -0,0 +1,50 @@
+import pathlib
+import sys
+import types
+from datetime import datetime
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic_vault import generate_vault  # noqa: E402
+
+
+@pytest.fixture
+def vault(tmp_path):
+    """一个约 400 天的合成日记目录（2000-01-01 起，随机跳过一些日期）"""
+    base = tmp_path / "vault"
+    generate_vault(base, 300, skip=0.25)
+    return base
+
+
+@pytest.fixture(scope="module")
+def journal_config(tmp_path_factory):
+    """供 app.py / asgi.py / heatmap_viewer.py 导入的 config 模块：默认目录为 2026 年的合成日记，
+    另有两个空目录 /v/w/ 和 /v/a/，日程来自一个 .ics 文件；测试结束后卸载这些模块"""
+    root = tmp_path_factory.mktemp("journal")
+    generate_vault(root / "main", 120, start=datetime(2026, 1, 1, 21, 30), skip=0.2)
+    heatmaps = root / "main" / "heatmaps"
+    heatmaps.mkdir()
+    (heatmaps / "emotion_2026.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 300)
+    ics = root / "calendar.ics"
+    ics.write_text("BEGIN:VCALENDAR\nBEGIN:VEVENT\nDTSTART:20260105T090000\nDTEND:20260105T100000\n"
+                   "SUMMARY:组会\nEND:VEVENT\nEND:VCALENDAR\n", encoding="utf-8")
+    config = types.ModuleType("config")
+    config.BASE_DIR = root / "main"
+    config.VAULTS = {"w": root / "wsgi", "a": root / "asgi"}
+    config.CALENDAR_ICS = str(ics)
+    apps = ("app", "asgi", "heatmap_viewer")
+    previous = sys.modules.get("config")
+    sys.modules["config"] = config
+    for name in apps:
+        sys.modules.pop(name, None)
+    yield config
+    for name in apps:
+        sys.modules.pop(name, None)
+    if previous is None:
+        sys.modules.pop("config", None)
+    else:
+        sys.modules["config"] = previous
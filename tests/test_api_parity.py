@@ -0,0 +1,149 @@
+"""同一组请求分别交给 app.py（Flask 测试客户端）和 asgi.py（直接调用 ASGI 应用），比较状态码、关键响应头和正文"""
+
+import asyncio
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+HEADERS = ("content-type", "etag", "cache-control", "content-encoding", "x-next-cursor", "vary")
+
+
+@pytest.fixture(scope="module")
+def servers(journal_config):
+    import app
+    import asgi
+    return app.app.test_client(), asgi.application
+
+
+def call_wsgi(client, method, url, headers=(), body=None):
+    response = client.open(url, method=method, headers=list(headers), data=body)
+    return (response.status_code, {k.lower(): v for k, v in response.headers.items() if k.lower() in HEADERS},
+            response.get_data())
+
+
+def call_asgi(application, method, url, headers=(), body=None):
+    path, _, query = url.partition("?")
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers]}
+    messages = [{"type": "http.request", "body": body or b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start = sent[0]
+    headers = {k.decode(): v.decode() for k, v in start["headers"] if k.decode() in HEADERS}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def decode(headers, body):
+    if headers.get("content-encoding") == "gzip":
+        body = gzip.decompress(body)
+    content_type = headers.get("content-type", "")
+    if "x-ndjson" in content_type:
+        return [json.loads(line) for line in body.decode().splitlines()]
+    if "json" in content_type:
+        return json.loads(body)
+    return body
+
+
+def assert_same(servers, method, url, headers=(), body=None, compare=HEADERS):
+    client, application = servers
+    w_status, w_headers, w_body = call_wsgi(client, method, url, headers, body)
+    a_status, a_headers, a_body = call_asgi(application, method, url, headers, body)
+    assert w_status == a_status, (url, w_body, a_body)
+    for name in compare:
+        assert w_headers.get(name) == a_headers.get(name), (url, name)
+    if method == "HEAD":
+        assert w_body == a_body == b""
+    elif w_status != 304:
+        assert decode(w_headers, w_body) == decode(a_headers, a_body), url
+    return w_status, w_headers, w_body
+
+
+@pytest.mark.parametrize("url,headers", [
+    ("/get_history", ()),
+    ("/get_history?limit=7", ()),
+    ("/get_history?limit=7&limit=2", ()),
+    ("/get_history?from=2026-02-01&to=2026-03-01&fields=day,emotion", ()),
+    ("/get_history?format=ndjson&limit=3", ()),
+    ("/get_history?from=2026-02-01", [("Accept", "application/x-ndjson")]),
+    ("/get_history?limit=3", [("Accept", "application/json;q=0.5, application/x-ndjson")]),
+    ("/get_history?limit=3", [("Accept", "text/html, application/x-ndjson;q=0.9, */*;q=0.8")]),
+    ("/get_history?from=2026-13-01", ()),
+    ("/get_history?fields=nope", ()),
+    ("/get_history?cursor=xyz", ()),
+    ("/get_outlook?from=2026-01-01&to=2026-01-31", ()),
+    ("/get_outlook?to=2026-01-05", ()),
+    ("/get_outlook?from=2026-01-05&to=2026-01-01", ()),
+    ("/get_outlook?from=bad", ()),
+    ("/heatmaps/emotion_2026.png", ()),
+    ("/heatmaps/missing.png", ()),
+    ("/heatmaps/..%2Fconfig.py", ()),
+    ("/v/nope/get_history", ()),
+])
+def test_get_parity(servers, url, headers):
+    assert_same(servers, "GET", url, headers)
+
+
+def test_history_cursor_pages_match(servers):
+    url = "/get_history?limit=10"
+    seen = []
+    while True:
+        status, headers, body = assert_same(servers, "GET", url, compare=("x-next-cursor",))
+        seen.extend(json.loads(body))
+        if "x-next-cursor" not in headers:
+            break
+        url = f"/get_history?limit=10&cursor={headers['x-next-cursor']}"
+    assert len(seen) == len(json.loads(call_wsgi(servers[0], "GET", "/get_history")[2]))
+
+
+def test_heatmap_conditional_parity(servers):
+    _, headers, _ = assert_same(servers, "GET", "/heatmaps/emotion_2026.png")
+    etag = headers["etag"]
+    digest = etag.strip('"')
+    for if_none_match in (etag, f"W/{etag}", "*", f'"other", {etag}', '"other"'):
+        assert_same(servers, "GET", "/heatmaps/emotion_2026.png", [("If-None-Match", if_none_match)])
+    status, headers, _ = assert_same(servers, "GET", f"/heatmaps/emotion_2026.png?v={digest[:16]}")
+    assert "immutable" in headers["cache-control"]
+    assert assert_same(servers, "GET", "/heatmaps/emotion_2026.png", [("If-None-Match", etag)])[0] == 304
+
+
+@pytest.mark.parametrize("url", ["/get_history?limit=3", "/get_outlook", "/heatmaps/emotion_2026.png",
+                                 "/get_history?format=ndjson"])
+def test_head_parity(servers, url):
+    compare = ("content-type", "etag", "cache-control", "x-next-cursor")
+    assert assert_same(servers, "HEAD", url, compare=compare)[0] == 200
+
+
+def test_method_not_allowed(servers):
+    assert assert_same(servers, "POST", "/get_history", compare=())[0] == 405
+
+
+def test_save_diary_parity(servers, journal_config):
+    client, application = servers
+    body = json.dumps({"emotion": "平静", "diary": "今天不错"}).encode()
+    json_type = [("Content-Type", "application/json")]
+    cases = [
+        (json_type, b"{not json", 400),
+        (json_type, b"[1, 2]", 400),
+        (json_type, b"", 400),
+        ([("Content-Type", "text/plain")], body, 415),
+        (json_type, b" " * (1024 * 1024 + 1), 413),
+        (json_type, body, 200),
+        (json_type, body, 409),
+    ]
+    for headers, data, expected in cases:
+        w = call_wsgi(client, "POST", "/v/w/save_diary", headers, data)
+        a = call_asgi(application, "POST", "/v/a/save_diary", headers, data)
+        assert w[0] == a[0] == expected, (expected, w[2], a[2])
+        assert json.loads(w[2]) == json.loads(a[2])
+    names = {p.name for p in journal_config.VAULTS["w"].rglob("*.md")}
+    assert names == {p.name for p in journal_config.VAULTS["a"].rglob("*.md")}
+    assert names == {date.today().strftime("%Y%m%d") + ".md"}
@@ -0,0 +1,28 @@
+import os
+import stat
+
+import pytest
+
+import atomic_write as aw
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX 权限位")
+def test_new_file_mode_follows_umask(tmp_path):
+    path = tmp_path / "20260101.md"
+    aw.atomic_write(path, "hello")
+    assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~aw._UMASK
+
+    plain = tmp_path / "plain.md"
+    plain.write_text("x")
+    assert stat.S_IMODE(path.stat().st_mode) == stat.S_IMODE(plain.stat().st_mode)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX 权限位")
+def test_existing_file_mode_is_kept(tmp_path):
+    path = tmp_path / "20260101.md"
+    path.write_text("old")
+    os.chmod(path, 0o640)
+    written, _ = aw.atomic_write(path, "new")
+    assert written
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+    assert path.read_text() == "new"
@@ -0,0 +1,34 @@
+import io
+
+import stats
+from batch_import import BatchImporter, read_rows
+from metadata_index import get_index
+
+
+def test_jsonl_bad_lines_are_reported_and_skipped(tmp_path):
+    stream = io.StringIO(
+        '{"date": "2026-01-01", "mood": "开心"}\n'
+        '{"date": "2026-01-02", "mood": \n'
+        '["2026-01-03"]\n'
+        '\n'
+        '{"date": "2026-01-04", "mood": "平静"}\n'
+    )
+    report = BatchImporter(tmp_path, workers=1).run(read_rows(stream, "jsonl"))
+    assert report["rows"] == 4
+    assert report["written"] == 2
+    assert [e["line"] for e in report["errors"]] == [2, 3]
+    assert (tmp_path / "20260101.md").exists() and (tmp_path / "20260104.md").exists()
+
+
+def test_missing_columns_are_left_empty(tmp_path):
+    stream = io.StringIO("date,mood\n2026-01-01,开心😊\n2026-01-02,平静😐\n")
+    report = BatchImporter(tmp_path, workers=1).run(read_rows(stream, "csv"))
+    assert report["written"] == 2
+    text = (tmp_path / "20260101.md").read_text(encoding="utf-8")
+    assert "None" not in text
+    assert "Appetite:\n" in text and "Confidence:\n" in text
+    index = get_index(tmp_path)
+    index.refresh()
+    assert stats.totals(index, "Appetite") == {}
+    assert stats.totals(index, "Confidence") == {}
+    assert stats.totals(index, "Emotion") == {"开心😊": 1, "平静😐": 1}
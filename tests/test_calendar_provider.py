@@ -0,0 +1,55 @@
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import calendar_provider
+from calendar_provider import OutlookProvider, get_default_calendar
+
+
+class FakeItems:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def Sort(self, key):
+        pass
+
+    def Restrict(self, restriction):
+        self.calls.append(threading.current_thread())
+        start = datetime(2026, 10, 18, 9, 0)
+        return [types.SimpleNamespace(Subject="组会", Start=start, End=start)]
+
+
+def fake_com(calls, dispatched):
+    def dispatch(name):
+        dispatched.append(threading.current_thread())
+        folder = types.SimpleNamespace(Items=FakeItems(calls))
+        ns = types.SimpleNamespace(GetDefaultFolder=lambda n: folder)
+        return types.SimpleNamespace(GetNamespace=lambda name: ns)
+    return types.SimpleNamespace(client=types.SimpleNamespace(Dispatch=dispatch))
+
+
+def test_outlook_queries_run_on_one_com_thread(monkeypatch):
+    calls, dispatched, com_init = [], [], []
+    monkeypatch.setattr(calendar_provider, "win32com", fake_com(calls, dispatched))
+    monkeypatch.setattr(calendar_provider, "pythoncom", types.SimpleNamespace(
+        CoInitialize=lambda: com_init.append("init"), CoUninitialize=lambda: com_init.append("uninit")))
+    provider = OutlookProvider()
+    day = date(2026, 10, 18)
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: provider.fetch_day(day), range(8)))
+    assert all(r and r[0]["subject"] == "组会" for r in results)
+    assert len(calls) == 8 and len(set(calls)) == 1 and len(dispatched) == 1
+    assert calls[0] is not threading.current_thread()
+    provider.stop()
+    assert com_init == ["init", "uninit"]
+
+
+def test_default_calendar_is_keyed_by_arguments(tmp_path):
+    ics = tmp_path / "a.ics"
+    ics.write_text("BEGIN:VCALENDAR\nEND:VCALENDAR\n", encoding="utf-8")
+    a = get_default_calendar(ics)
+    assert get_default_calendar(str(ics)) is a
+    assert get_default_calendar(ics, ttl=60) is not a
+    assert get_default_calendar(ics, ttl=60).ttl == 60
+    assert isinstance(get_default_calendar().provider, OutlookProvider)
@@ -0,0 +1,45 @@
+import json
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def clients(journal_config):
+    import app
+    import heatmap_viewer
+    return app.app.test_client(), heatmap_viewer.app.test_client()
+
+
+@pytest.mark.parametrize("query", ["year=0", "year=10000", "year=abc", "year=-1", "year=２０２６", "fields=nope"])
+def test_invalid_parameters_rejected_by_both(clients, query):
+    for client in clients:
+        response = client.get(f"/heatmap_data?{query}")
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+
+def test_same_payload_and_default_year(clients):
+    app_client, viewer_client = clients
+    payloads = [json.loads(c.get("/heatmap_data?year=2026&fields=Emotion").get_data()) for c in clients]
+    assert payloads[0] == payloads[1]
+    assert payloads[0]["year"] == 2026
+    for client in clients:
+        assert client.get("/heatmap_data").get_json()["year"] == date.today().year
+        assert client.get("/heatmap_data?year=1").status_code == 200
+        assert client.get("/heatmap_data?year=9999").status_code == 200
+
+
+def test_build_failure_is_json_500(clients, monkeypatch):
+    import app
+    import heatmap_viewer
+
+    def fail(*args):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(app, "calendar_payload", fail)
+    monkeypatch.setattr(heatmap_viewer, "calendar_payload", fail)
+    for client in clients:
+        response = client.get("/heatmap_data?year=2026")
+        assert response.status_code == 500
+        assert response.get_json() == {"error": "Failed to build heatmap data."}
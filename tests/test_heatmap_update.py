@@ -0,0 +1,55 @@
+import numpy as np
+
+import obsidian_daily
+from memory_cache import memory_cache
+from metadata_index import get_index
+
+
+def _set_emotion(path, emotion):
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    lines = [f"Emotion: {emotion}\n" if line.startswith("Emotion:") else line for line in lines]
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def _cached(vault):
+    return memory_cache.get(obsidian_daily._vault_key(vault), "matrices", 2000)
+
+
+def _expected(vault):
+    store = obsidian_daily.load_record_store(vault)
+    return obsidian_daily.build_category_matrices(store, 2000, obsidian_daily.FIELDS)
+
+
+def _assert_same(matrices, expected):
+    for field in obsidian_daily.FIELDS:
+        assert matrices[field][1] == expected[field][1]
+        np.testing.assert_array_equal(matrices[field][0], expected[field][0])
+
+
+def test_patch_copies_cached_matrices(vault):
+    obsidian_daily.generate_all_heatmaps(vault, 2000, backend="pillow")
+    generation, before = _cached(vault)
+    snapshot = {field: mat.copy() for field, (mat, _) in before.items()}
+    path = sorted(vault.glob("2000*.md"))[10]
+    _set_emotion(path, "平静😐")
+    obsidian_daily.update_heatmaps_for_entry(vault, path)
+    new_generation, after = _cached(vault)
+    assert new_generation == generation + 1 == get_index(vault).generation()
+    assert after is not before
+    # 已经交给渲染的矩阵没有被原地修改
+    for field, (mat, _) in before.items():
+        np.testing.assert_array_equal(mat, snapshot[field])
+    _assert_same(after, _expected(vault))
+
+
+def test_rebuilds_when_index_changed_elsewhere(vault):
+    obsidian_daily.generate_all_heatmaps(vault, 2000, backend="pillow")
+    files = sorted(vault.glob("2000*.md"))
+    # 模拟另一个进程改动了另一天并刷新了索引，本进程缓存的矩阵并不知道
+    _set_emotion(files[3], "平静😐")
+    get_index(vault).refresh()
+    _set_emotion(files[20], "平静😐")
+    obsidian_daily.update_heatmaps_for_entry(vault, files[20])
+    generation, matrices = _cached(vault)
+    assert generation == get_index(vault).generation()
+    _assert_same(matrices, _expected(vault))
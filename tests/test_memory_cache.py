@@ -0,0 +1,71 @@
+import pytest
+
+import memory_cache as memory_cache_module
+import metrics
+from memory_cache import MemoryCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """预算 100 字节、单个 vault 最多 50 字节；/metrics 的仪表读取这个实例"""
+    cache = MemoryCache(budget=100, vault_share=0.5)
+    monkeypatch.setattr(memory_cache_module, "memory_cache", cache)
+    metrics.reset()
+    yield cache
+    metrics.reset()
+
+
+def keys(cache):
+    return [(vault, key) for vault, _, key in cache._entries]
+
+
+def test_budget_evicts_least_recently_used_across_vaults(cache):
+    cache.put("a", "records", 1, "a1", 20)
+    cache.put("b", "records", 1, "b1", 20)
+    cache.put("a", "records", 2, "a2", 20)
+    assert cache.get("a", "records", 1) == "a1"
+    cache.put("b", "records", 2, "b2", 20)
+    cache.put("c", "records", 1, "c1", 30)
+    # 总量 110 超出预算：淘汰全局最久未用的 b1，不管它属于哪个 vault
+    assert cache.get("b", "records", 1) is None
+    assert keys(cache) == [("a", 2), ("a", 1), ("b", 2), ("c", 1)]
+    stats = cache.stats()
+    assert stats["used"] == 90
+    assert stats["entries"] == 4
+    assert stats["vaults"] == {"a": 40, "b": 20, "c": 30}
+
+
+def test_vault_share_evicts_only_that_vault(cache):
+    cache.put("b", "calendar", 1, "b1", 10)
+    for key in range(3):
+        cache.put("a", "matrices", key, f"a{key}", 20)
+    # a 超过 50 字节的上限，先淘汰它自己最久未用的条目；更早放入的 b1 保留
+    assert cache.get("a", "matrices", 0) is None
+    assert cache.get("b", "calendar", 1) == "b1"
+    assert cache.stats()["vaults"] == {"a": 40, "b": 10}
+    assert 'memory_cache_evictions_total{kind="matrices",reason="vault_share"} 1' in metrics.render()
+
+
+def test_entries_larger_than_vault_limit_are_not_cached(cache):
+    assert cache.put("a", "records", 1, "small", 10)
+    assert not cache.put("a", "records", 2, "big", 51)
+    assert cache.get("a", "records", 2, "missing") == "missing"
+    # 同键替换为过大的值时旧值也被移除
+    assert not cache.put("a", "records", 1, "big", 60)
+    assert cache.stats()["used"] == 0
+
+
+def test_configure_shrinks_and_gauges_report_bytes(cache):
+    cache.put("a", "records", 1, "a1", 20)
+    cache.put("a", "records", 2, "a2", 20)
+    cache.put("b", "records", 1, "b1", 30)
+    cache.configure(budget=60)
+    # 单个 vault 上限变为 30：a 淘汰 a1；总量 50 在预算以内
+    assert keys(cache) == [("a", 2), ("b", 1)]
+    text = metrics.render()
+    assert "memory_cache_budget_bytes 60" in text
+    assert 'memory_cache_bytes{vault="a"} 20' in text
+    assert 'memory_cache_bytes{vault="b"} 30' in text
+    cache.drop_vault("b")
+    assert cache.stats()["vaults"] == {"a": 20}
+    assert 'vault="b"' not in metrics.render()
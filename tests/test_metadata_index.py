@@ -0,0 +1,32 @@
+import time
+
+from metadata_index import get_index
+from obsidian_daily import load_record_store
+
+
+def test_sync_skips_rescan_within_max_age(vault):
+    index = get_index(vault)
+    assert index.sync() is not None
+    assert index.sync(max_age=60) is None
+    # 范围更小的同步也被覆盖全部年份的 refresh 满足
+    assert index.sync(years=[2000], max_age=60) is None
+    assert index.sync() is not None
+
+
+def test_sync_rescans_after_max_age(vault):
+    index = get_index(vault)
+    index.sync(years=[2000])
+    time.sleep(0.05)
+    assert index.sync(years=[2000], max_age=0.01) is not None
+    # 只同步过 2000 年时，全部范围的同步仍需扫描
+    assert index.sync(max_age=60) is not None
+
+
+def test_record_store_matches_index(vault):
+    index = get_index(vault)
+    store = load_record_store(vault)
+    entries = index.entries()
+    assert len(store) == len(entries)
+    assert [int(d) for d in store.days] == [e["date"].toordinal() for e in entries]
+    assert store.present_labels("Emotion") == sorted({e["Emotion"] for e in entries if e["Emotion"]})
+    assert load_record_store(vault) is store
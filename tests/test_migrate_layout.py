@@ -0,0 +1,30 @@
+from metadata_index import get_index
+from migrate_layout import migrate
+from vault_layout import list_entries, read_layout
+
+
+def test_migrate_round_trip_keeps_index_and_unrelated_dirs(vault):
+    (vault / "2030").mkdir()
+    (vault / "2001" / "11").mkdir(parents=True)
+    (vault / "notes.md").write_text("# 笔记\n", encoding="utf-8")
+    index = get_index(vault)
+    index.refresh()
+    before = [(e["date"], e["Emotion"]) for e in index.entries()]
+
+    report = migrate(vault, "month")
+    assert read_layout(vault) == "month"
+    assert report["conflicts"] == [] and report["kept"] == 1
+    assert all(name.count("/") == 2 for name, _ in list_entries(vault) if name != "notes.md")
+    # 迁移前就存在的空分片目录不会被删除
+    assert (vault / "2030").is_dir()
+    assert index.refresh()["parsed"] == 0
+    assert [(e["date"], e["Emotion"]) for e in index.entries()] == before
+
+    report = migrate(vault, "flat")
+    assert all("/" not in name for name, _ in list_entries(vault))
+    assert "2000/01" in report["removed_dirs"] and "2000" in report["removed_dirs"]
+    assert "2001/01" in report["removed_dirs"] and "2001" not in report["removed_dirs"]
+    # 2001 年目录中还有迁移前就存在的空目录 11，所以保留
+    assert (vault / "2001" / "11").is_dir() and not (vault / "2001" / "01").exists()
+    assert (vault / "2030").is_dir() and not (vault / "2000").exists()
+    assert index.refresh()["parsed"] == 0
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import search_index
+from metadata_index import get_index
+
+
+def brute_force(vault, index, query, start=None, end=None):
+    """逐篇读取正文，保留包含查询串每一段的日记，按日期倒序"""
+    parts = query.lower().split()
+    hits = []
+    for entry in index.entries():
+        if (start and entry["date"] < start) or (end and entry["date"] > end):
+            continue
+        body = search_index.read_body(vault, entry["name"]).lower()
+        if all(p in body for p in parts):
+            hits.append((entry["date"], entry["name"]))
+    return [name for _, name in sorted(hits, reverse=True)]
+
+
+@pytest.fixture
+def index(vault):
+    index = get_index(vault)
+    index.refresh()
+    return index
+
+
+def count_documents(index):
+    with index._lock, index._connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+def test_refresh_does_not_build_search_index(index):
+    assert count_documents(index) == 0
+    index.search("跑步")
+    assert count_documents(index) == len(index.entries())
+
+
+@pytest.mark.parametrize("query", [
+    "跑步", "心", "火锅 朋友", "review", "eview", "EPLOY", "flaky deploy", "ch", "7", "r",
+    "Code review", "状态不错", "没有这个词", "zzzz",
+])
+def test_search_matches_substring_scan(vault, index, query):
+    names = [hit["name"] for hit in index.search(query, limit=10000)]
+    assert names == brute_force(vault, index, query)
+
+
+def test_search_follows_file_changes(vault, index):
+    assert index.search("xylophone") == []
+    name = index.entries()[10]["name"]
+    path = vault / name
+    path.write_text(path.read_text(encoding="utf-8") + "\nplayed the xylophone\n", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    index.refresh()
+    assert [hit["name"] for hit in index.search("ylophon")] == [name]
+    path.unlink()
+    index.refresh()
+    assert index.search("xylophone") == []
+
+
+def test_query_without_words_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.search("% ！")
+
+
+def test_unfiltered_scan_reads_bounded_bodies(vault, index, monkeypatch):
+    # 每个条件组都展开过多时只能核对原文，读取的篇数有上限
+    monkeypatch.setattr(search_index, "MAX_EXPANSION", 0)
+    monkeypatch.setattr(search_index, "MAX_SCAN_BODIES", 25)
+    reads = []
+    read_body = search_index.read_body
+    monkeypatch.setattr(search_index, "read_body", lambda base, name: reads.append(name) or read_body(base, name))
+    names = [hit["name"] for hit in index.search("跑步", limit=10000)]
+    assert len(reads) == 25
+    # 按日期倒序核对，返回的是完整结果的开头部分
+    assert names == brute_force(vault, index, "跑步")[:len(names)]
+
+
+def test_search_route_rejects_query_without_words(journal_config):
+    import app
+    client = app.app.test_client()
+    response = client.get("/search?q=%25")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert client.get("/search?q=%E8%B7%91%E6%AD%A5").status_code == 200
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+import pytest
+
+import stats
+from metadata_index import get_index
+
+
+def brute_force(index, field, start=None, end=None):
+    counts = {}
+    for entry in index.entries():
+        if (start and entry["date"] < start) or (end and entry["date"] > end) or not entry[field]:
+            continue
+        counts[entry[field]] = counts.get(entry[field], 0) + 1
+    return counts
+
+
+@pytest.fixture
+def index(vault):
+    index = get_index(vault)
+    index.refresh()
+    return index
+
+
+@pytest.mark.parametrize("start,end", [
+    (date(2000, 3, 15), None),
+    (date(1999, 1, 1), None),
+    (date(2000, 1, 1), None),
+    (None, date(2000, 7, 4)),
+    (None, date(2100, 1, 1)),
+    (date(2000, 2, 29), date(2000, 11, 30)),
+    (date(2000, 6, 1), date(2000, 5, 1)),
+])
+def test_totals_matches_brute_force(index, start, end):
+    for field in ("Emotion", "Appetite", "Confidence"):
+        assert stats.totals(index, field, start, end) == brute_force(index, field, start, end)
+
+
+def test_totals_open_range_after_last_entry(index):
+    assert stats.totals(index, "Emotion", date(2050, 1, 1)) == {}
+
+
+def test_grouped_from_only(index):
+    start = date(2000, 3, 15)
+    for group in stats.GROUPS:
+        buckets = stats.grouped(index, "Emotion", group, start)
+        merged = {}
+        for _, counts in buckets:
+            for label, n in counts.items():
+                merged[label] = merged.get(label, 0) + n
+        assert merged == brute_force(index, "Emotion", start)
+
+
+@pytest.mark.parametrize("start,end", [
+    (date(9999, 1, 1), date.max),
+    (date(9998, 12, 15), date.max),
+    (date(1, 1, 1), date.max),
+    (date(9999, 12, 31), date.max),
+    (date.min, date(1, 3, 1)),
+])
+def test_decompose_covers_range_up_to_date_max(start, end):
+    expected = start
+    for level, lo, hi in stats.decompose(start, end):
+        first = stats.bucket_range(level, lo)[0]
+        last = stats.bucket_range(level, hi)[1]
+        assert first == expected
+        expected = last + timedelta(days=1) if last < date.max else None
+    assert last == end
@@ -0,0 +1,171 @@
+"""
+日记目录布局：日记文件可以平铺在根目录，也可以按年或按年/月分片存放
+- flat：  BASE_DIR/20261018.md
+- year：  BASE_DIR/2026/20261018.md
+- month： BASE_DIR/2026/10/20261018.md
+布局记录在 .mdjournal/layout.json 中（由 migrate_layout.py 写入，没有该文件时为 flat），
+所有写日记的入口（diary_gui、obsidian_daily、batch_import、/save_diary）都经 entry_path 得到同一个路径
+扫描时总是同时读取根目录和分片目录（四位数字的年目录、两位数字的月目录），迁移到一半的目录也能正确读取；
+只关心某几年时只列出这些年的分片，其他年份的目录不会被访问
+"""
+
+import json
+import os
+import pathlib
+import re
+from datetime import date, datetime
+
+LAYOUTS = ("flat", "year", "month")
+DEFAULT_LAYOUT = "flat"
+LAYOUT_FILENAME = "layout.json"
+_YEAR_DIR = re.compile(r"\d{4}")
+_MONTH_DIR = re.compile(r"0[1-9]|1[0-2]")
+_DATE_STEM = re.compile(r"\d{8}")
+
+
+def _layout_file(base_dir):
+    from metadata_index import INDEX_DIRNAME
+    return pathlib.Path(base_dir) / INDEX_DIRNAME / LAYOUT_FILENAME
+
+
+def read_layout(base_dir: pathlib.Path):
+    """目录当前的布局；没有记录或记录无法识别时为 flat"""
+    try:
+        layout = json.loads(_layout_file(base_dir).read_text(encoding="utf-8")).get("layout")
+    except (OSError, ValueError, AttributeError):
+        return DEFAULT_LAYOUT
+    return layout if layout in LAYOUTS else DEFAULT_LAYOUT
+
+
+def write_layout(base_dir: pathlib.Path, layout):
+    if layout not in LAYOUTS:
+        raise ValueError(f"未知的目录布局: {layout}，可选 {', '.join(LAYOUTS)}")
+    # atomic_write 依赖 metadata_index，而 metadata_index 又导入本模块，这里延迟导入
+    from atomic_write import atomic_write
+    atomic_write(_layout_file(base_dir), json.dumps({"layout": layout}) + "\n", newline="\n")
+
+
+def is_entry_file(name: str):
+    return name.endswith(".md") and not name.startswith(".")
+
+
+def layout_path(base_dir: pathlib.Path, day: date, layout=DEFAULT_LAYOUT):
+    """按 layout 布局时 day 这一天的日记应在的位置"""
+    base_dir = pathlib.Path(base_dir)
+    name = day.strftime("%Y%m%d") + ".md"
+    if layout == "year":
+        return base_dir / f"{day.year:04d}" / name
+    if layout == "month":
+        return base_dir / f"{day.year:04d}" / f"{day.month:02d}" / name
+    return base_dir / name
+
+
+def entry_path(base_dir: pathlib.Path, day: date):
+    """写日记时使用的路径：这一天的文件已存在（任何布局下）时返回它，否则按目录当前的布局返回新位置"""
+    if isinstance(day, datetime):
+        day = day.date()
+    layout = read_layout(base_dir)
+    preferred = layout_path(base_dir, day, layout)
+    for candidate in [preferred] + [layout_path(base_dir, day, other) for other in LAYOUTS if other != layout]:
+        if candidate.exists():
+            return candidate
+    return preferred
+
+
+def date_from_name(name: str):
+    """YYYYMMDD.md 形式的文件名对应的日期；不是这种形式时返回 None"""
+    stem = pathlib.PurePosixPath(name).stem
+    if not _DATE_STEM.fullmatch(stem):
+        return None
+    try:
+        return datetime.strptime(stem, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def entry_name(base_dir: pathlib.Path, path: pathlib.Path):
+    """索引中使用的名称：相对日记目录的 POSIX 路径（平铺的文件就是文件名本身）"""
+    base_dir = pathlib.Path(base_dir)
+    path = pathlib.Path(path)
+    for base, target in ((base_dir, path), (base_dir.resolve(), path.resolve())):
+        try:
+            return target.relative_to(base).as_posix()
+        except ValueError:
+            continue
+    return path.name
+
+
+def entry_year(name: str):
+    """索引名称所在的年分片；根目录下的文件返回 None"""
+    first, sep, _ = name.partition("/")
+    return int(first) if sep and _YEAR_DIR.fullmatch(first) else None
+
+
+def _scan_dir(directory, prefix, out, subdirs=None):
+    """把 directory 中的日记文件以 (prefix + 文件名, 路径) 加入 out；subdirs 不为 None 时收集子目录名"""
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if is_entry_file(entry.name):
+                    if entry.is_file():
+                        out.append((prefix + entry.name, pathlib.Path(entry.path)))
+                elif subdirs is not None and entry.is_dir():
+                    subdirs.append(entry.name)
+    except OSError:
+        # 与 pathlib.glob 一样，目录不存在或无法读取时视为空
+        pass
+
+
+def list_entries(base_dir: pathlib.Path, years=None):
+    """目录中所有日记文件的 [(索引名称, 路径)]，按名称排序
+
+    根目录下的文件总是包含在内；years 不为 None 时只列出这些年的分片目录
+    """
+    base_dir = pathlib.Path(base_dir)
+    out = []
+    subdirs = []
+    _scan_dir(base_dir, "", out, subdirs)
+    wanted = None if years is None else {f"{y:04d}" for y in years}
+    for year_dir in subdirs:
+        if not _YEAR_DIR.fullmatch(year_dir) or (wanted is not None and year_dir not in wanted):
+            continue
+        months = []
+        _scan_dir(base_dir / year_dir, f"{year_dir}/", out, months)
+        for month_dir in months:
+            if _MONTH_DIR.fullmatch(month_dir):
+                _scan_dir(base_dir / year_dir / month_dir, f"{year_dir}/{month_dir}/", out)
+    out.sort()
+    return out
+
+
+def _subdirs(directory, pattern):
+    try:
+        with os.scandir(directory) as it:
+            return sorted(e.name for e in it if pattern.fullmatch(e.name) and e.is_dir())
+    except OSError:
+        return []
+
+
+def shard_dirs(base_dir: pathlib.Path):
+    """已存在的分片目录（相对名称），如 ["2025", "2025/12", "2026"]"""
+    base_dir = pathlib.Path(base_dir)
+    result = []
+    for year in _subdirs(base_dir, _YEAR_DIR):
+        result.append(year)
+        result.extend(f"{year}/{month}" for month in _subdirs(base_dir / year, _MONTH_DIR))
+    return result
+
+
+def is_shard_dir(relative: str):
+    parts = relative.split("/")
+    return (bool(_YEAR_DIR.fullmatch(parts[0])) and len(parts) <= 2
+            and (len(parts) == 1 or bool(_MONTH_DIR.fullmatch(parts[1]))))
+
+
+def years_between(start: date = None, end: date = None):
+    """[start, end] 涉及的年份；任一端未指定时返回 None（需要扫描全部分片）"""
+    if start is None or end is None:
+        return None
+    return range(start.year, end.year + 1)
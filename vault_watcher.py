@@ -0,0 +1,251 @@
+"""
+日记目录监视器
+- Linux 上用 inotify（通过 ctypes 调用 libc，无额外依赖），其他平台或 inotify 不可用时回落到定时轮询
+- 一段时间内的连续事件会合并（debounce），之后只重新解析变化过的文件
+- 运行期间 MetadataIndex.sync() 不再扫描目录，get_history 和热力图生成直接读取已更新的索引
+- 按年/月分片的目录（见 vault_layout）中的文件也会被监视；新建的分片目录会自动加入
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import pathlib
+import select
+import struct
+import sys
+import threading
+import time
+
+from metadata_index import get_index
+from vault_layout import is_entry_file, is_shard_dir, list_entries, shard_dirs
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyBackend:
+    """基于 inotify 的事件源，监视日记目录本身和其中的年/月分片目录（不监视其他子目录）"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._prefixes = {}  # watch descriptor -> 相对日记目录的前缀，如 "" / "2026/" / "2026/10/"
+        try:
+            self._watch("")
+            for relative in shard_dirs(self.path):
+                self._watch(relative + "/")
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch(self, prefix):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(self.path / prefix)), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._prefixes[wd] = prefix
+        return wd
+
+    def poll(self, timeout):
+        """最多等待 timeout 秒，返回 (变化的文件相对路径集合, 是否需要全量刷新)"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set(), False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set(), False
+        names = set()
+        overflow = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_IGNORED:
+                self._prefixes.pop(wd, None)
+                continue
+            if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF):
+                # 日记目录本身或某个分片目录被删除/移走：全量刷新
+                overflow = True
+                continue
+            prefix = self._prefixes.get(wd)
+            if prefix is None:
+                continue
+            name = os.fsdecode(raw_name)
+            if mask & IN_ISDIR:
+                relative = prefix + name
+                if is_shard_dir(relative):
+                    # 新建或移入的分片目录：加入监视，并全量刷新以收录监视生效前已经写入的文件
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self._watch(relative + "/")
+                            for sub in shard_dirs(self.path):
+                                if sub.startswith(relative + "/"):
+                                    self._watch(sub + "/")
+                        except OSError as e:
+                            logging.warning(f"无法监视 {relative}：{e}")
+                    overflow = True
+                continue
+            if is_entry_file(name):
+                names.add(prefix + name)
+        return names, overflow
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingBackend:
+    """定时比较目录快照（mtime/size），用于没有 inotify 的平台"""
+
+    def __init__(self, path: pathlib.Path, interval=2.0):
+        self.path = pathlib.Path(path)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        for name, path in list_entries(self.path):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            snapshot[name] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self, timeout):
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set(), False
+        if wait > 0:
+            time.sleep(wait)
+        self._next = time.monotonic() + self.interval
+        snapshot = self._scan()
+        old = self._snapshot
+        self._snapshot = snapshot
+        changed = {n for n in snapshot.keys() | old.keys() if snapshot.get(n) != old.get(n)}
+        return changed, False
+
+    def close(self):
+        pass
+
+
+class VaultWatcher:
+    """监视日记目录并把变化同步到 MetadataIndex
+
+    debounce: 最后一个事件之后安静多久再处理；max_delay: 持续有事件时最多积压多久
+    on_change: 每次处理完一批变化后调用，参数为变化的路径列表（全量刷新时为 None）
+    """
+
+    def __init__(self, base_dir: pathlib.Path, debounce=0.5, max_delay=5.0, poll_interval=2.0,
+                 use_inotify=None, on_change=None):
+        self.base_dir = pathlib.Path(base_dir)
+        self.index = get_index(self.base_dir)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self.on_change = on_change
+        self._stop = threading.Event()
+        self._thread = None
+        self._backend = None
+
+    def _make_backend(self):
+        if self.use_inotify:
+            try:
+                return InotifyBackend(self.base_dir)
+            except (OSError, AttributeError) as e:
+                logging.warning(f"inotify 不可用，改用轮询：{e}")
+        return PollingBackend(self.base_dir, self.poll_interval)
+
+    def start(self):
+        """先全量同步一次索引，然后在后台线程中监视"""
+        self._backend = self._make_backend()
+        self.index.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vault-watcher", daemon=True)
+        self._thread.start()
+        self.index.watcher = self
+        logging.info(f"开始监视 {self.base_dir}（{type(self._backend).__name__}）")
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.index.watcher is self:
+            self.index.watcher = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _flush(self, names, full):
+        try:
+            if full:
+                self.index.refresh()
+                paths = None
+            else:
+                paths = [self.base_dir / name for name in sorted(names)]
+                for path in paths:
+                    self.index.update_file(path)
+            if self.on_change:
+                self.on_change(paths)
+        except Exception as e:
+            logging.error(f"同步索引失败：{e}")
+
+    def _run(self):
+        pending = set()
+        full = False
+        first_event = last_event = None
+        try:
+            while not self._stop.is_set():
+                names, overflow = self._backend.poll(min(self.debounce, 0.5) or 0.1)
+                now = time.monotonic()
+                if names or overflow:
+                    pending |= names
+                    full = full or overflow
+                    last_event = now
+                    if first_event is None:
+                        first_event = now
+                if first_event is None:
+                    continue
+                if now - last_event >= self.debounce or now - first_event >= self.max_delay:
+                    self._flush(pending, full)
+                    pending = set()
+                    full = False
+                    first_event = last_event = None
+        finally:
+            self._backend.close()
+            if self.index.watcher is self:
+                self.index.watcher = None
+
+
+def start_watcher(base_dir: pathlib.Path, **kwargs) -> VaultWatcher:
+    """为 base_dir 启动监视器；同一目录已有运行中的监视器时直接返回它"""
+    index = get_index(base_dir)
+    if index.watcher is not None and index.watcher.is_alive():
+        return index.watcher
+    return VaultWatcher(base_dir, **kwargs).start()
@@ -0,0 +1,80 @@
+"""
+多日记目录（vault）路由：一个进程为多个日记目录提供服务
+- VaultRegistry：vault id -> 日记目录；id 只允许字母、数字、- 和 _，请求中的内容不会被拼进文件路径
+- 默认 vault 挂在根路径（与单目录时的 URL 相同），其余 vault 挂在 /v/<vault>/ 下，同一个 Blueprint 注册两次
+- 元数据索引、渲染缓存清单和热力图都在各自目录的 .mdjournal / heatmaps 下；
+  内存中的缓存（memory_cache）按目录隔离，所有 vault 共用一个内存预算
+"""
+
+import pathlib
+import re
+import threading
+
+DEFAULT_VAULT = "default"
+VAULT_PREFIX = "/v/<vault>"
+_VAULT_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class VaultRegistry:
+    def __init__(self, vaults=None):
+        self._lock = threading.Lock()
+        self._vaults = {}
+        for vault_id, path in (vaults or {}).items():
+            self.add(vault_id, path)
+
+    def add(self, vault_id, path):
+        if not _VAULT_ID.fullmatch(vault_id):
+            raise ValueError(f"vault id 只能包含字母、数字、- 和 _：{vault_id!r}")
+        with self._lock:
+            self._vaults[vault_id] = pathlib.Path(path)
+
+    def get(self, vault_id):
+        """vault id 对应的目录；未知的 id 返回 None"""
+        with self._lock:
+            return self._vaults.get(vault_id)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._vaults.items())
+
+
+def load_registry(config, default_dir=None):
+    """由 config.BASE_DIR（默认 vault）和可选的 config.VAULTS = {id: 目录} 构建"""
+    registry = VaultRegistry()
+    base_dir = getattr(config, "BASE_DIR", None) or default_dir
+    if base_dir is not None:
+        registry.add(DEFAULT_VAULT, base_dir)
+    for vault_id, path in (getattr(config, "VAULTS", None) or {}).items():
+        registry.add(vault_id, path)
+    return registry
+
+
+def register_vault_blueprint(app, blueprint, registry):
+    """把 blueprint 同时挂在根路径（默认 vault）和 /v/<vault>/ 下
+
+    请求处理函数中用 current_vault() 取得目录；url_for(".endpoint") 会自动带上当前的 vault
+    """
+    from flask import abort, g
+
+    @blueprint.url_value_preprocessor
+    def _resolve_vault(endpoint, values):
+        vault_id = values.pop("vault", DEFAULT_VAULT) if values else DEFAULT_VAULT
+        path = registry.get(vault_id)
+        if path is None:
+            abort(404)
+        g.vault_id = vault_id
+        g.vault_dir = path
+
+    @blueprint.url_defaults
+    def _add_vault(endpoint, values):
+        if "vault" not in values and app.url_map.is_endpoint_expecting(endpoint, "vault"):
+            values["vault"] = g.get("vault_id", DEFAULT_VAULT)
+
+    app.register_blueprint(blueprint)
+    app.register_blueprint(blueprint, url_prefix=VAULT_PREFIX, name=f"{blueprint.name}_vault")
+
+
+def current_vault() -> pathlib.Path:
+    """当前请求的日记目录"""
+    from flask import g
+    return g.vault_dir